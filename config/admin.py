@@ -0,0 +1,55 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_ms', 'user')
+    list_filter = ('method', 'status_code', 'profiler')
+    search_fields = ('path',)
+    date_hierarchy = 'created'
+    fields = ('created', 'user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_ms',
+              'download', 'middleware_table', 'queries_table', 'summary')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='config_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        if not profile.file:
+            raise Http404
+        return FileResponse(profile.file.open('rb'), as_attachment=True, filename=profile.file.name.split('/')[-1])
+
+    @admin.display(description='Profile')
+    def download(self, obj):
+        if not obj.file:
+            return '-'
+        return format_html('<a href="{}">{} ({})</a>', reverse('admin:config_requestprofile_download', args=[obj.id]),
+                           obj.file.name.split('/')[-1], obj.profiler)
+
+    @admin.display(description='Middleware (ms, own time)')
+    def middleware_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td></tr>', ((m['name'], m['ms']) for m in obj.middleware))
+        return format_html('<table>{}</table>', rows)
+
+    @admin.display(description='Queries (slowest first)')
+    def queries_table(self, obj):
+        queries = sorted(obj.queries, key=lambda q: q['ms'], reverse=True)
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td><td>{}</td></tr>',
+                                ((q['ms'], q['db'], q['sql'], q['origin']) for q in queries))
+        return format_html('<table><tr><th>ms</th><th>db</th><th>SQL</th><th>from</th></tr>{}</table>', rows)
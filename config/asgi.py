@@ -0,0 +1,24 @@
+# ruff: noqa
+"""
+ASGI config for LearnMusic project.
+
+Used by gunicorn's uvicorn workers (see config/gunicorn.py) and any other ASGI server. The
+practice endpoints are async views, so under ASGI a worker can serve other requests while
+they wait on the database. It exposes a module-level variable named ``application``; Django
+discovers it via the ``ASGI_APPLICATION`` setting.
+
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from django.core.asgi import get_asgi_application
+
+# This allows easy placement of apps within the interior
+# learnmusic directory.
+BASE_DIR = Path(__file__).resolve(strict=True).parent.parent
+sys.path.append(str(BASE_DIR / "learnmusic"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+application = get_asgi_application()
@@ -0,0 +1,25 @@
+"""
+gunicorn settings for the web process (`gunicorn -c config/gunicorn.py`).
+
+DJANGO_SERVER_MODE picks the deployment:
+    asgi (default) - config.asgi under uvicorn workers
+    wsgi           - config.wsgi under plain sync workers, as before
+`python manage.py benchmark_servers` compares the two at the same worker count.
+"""
+import os
+
+SERVER_MODES = {
+    "asgi": ("config.asgi:application", "uvicorn_worker.UvicornWorker"),
+    "wsgi": ("config.wsgi:application", "sync"),
+}
+
+server_mode = os.environ.get("DJANGO_SERVER_MODE", "asgi").lower()
+if server_mode not in SERVER_MODES:
+    raise RuntimeError(f"DJANGO_SERVER_MODE must be one of {', '.join(SERVER_MODES)}, not {server_mode!r}")
+
+wsgi_app, worker_class = SERVER_MODES[server_mode]
+
+# Heroku-style platforms set both of these
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+errorlog = "-"
@@ -0,0 +1,203 @@
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from config.gunicorn import SERVER_MODES
+from notes.models import LearningScenario, NoteRecordPackage
+
+GUNICORN_CONFIG = Path(__file__).resolve().parents[2] / "gunicorn.py"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"gunicorn exited with {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"gunicorn did not start within {timeout}s")
+
+
+def _host_header():
+    hosts = [host.lstrip(".") for host in settings.ALLOWED_HOSTS if host != "*"]
+    return hosts[0] if hosts else "localhost"
+
+
+def _client(port, requests, n_requests):
+    """One keep-alive connection issuing n_requests round-robin over requests, each
+    (method, path, body, headers).
+
+    Returns (latencies in seconds, number of error responses).
+    """
+    host = _host_header()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies = []
+    errors = 0
+    for i in range(n_requests):
+        method, path, body, headers = requests[i % len(requests)]
+        start = time.perf_counter()
+        conn.request(method, path, body=body, headers={"Host": host, **headers})
+        resp = conn.getresponse()
+        resp.read()
+        latencies.append(time.perf_counter() - start)
+        # a redirect here is the login page or an https redirect, not an answer
+        if resp.status >= 300:
+            errors += 1
+    conn.close()
+    return latencies, errors
+
+
+class _PracticeSession:
+    """A throwaway learner, logged in, with a scenario and a package to post answers to.
+
+    Deleted again (with everything posted) on exit.
+    """
+
+    def __enter__(self):
+        self.user = get_user_model().objects.create_user(
+            email=f"benchmark-{get_random_string(12).lower()}@example.invalid", password=None)
+        self.scenario = LearningScenario.objects.create(user=self.user, instrument_name="Trumpet",
+                                                        relative_key="Bb", notes=["C 0 4", "D 0 4", "E 0 4"])
+        self.package = NoteRecordPackage.objects.create(learningscenario=self.scenario)
+        self.client = Client()
+        self.client.force_login(self.user)
+        csrf = get_random_string(CSRF_SECRET_LENGTH)
+        self.headers = {
+            "Content-Type": "application/json",
+            "Cookie": f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}; "
+                      f"{settings.CSRF_COOKIE_NAME}={csrf}",
+            "X-CSRFToken": csrf,
+        }
+        return self
+
+    def __exit__(self, *exc):
+        self.client.logout()
+        self.user.delete()
+
+    def requests(self):
+        """What the practice page posts: one answer at a time, and a batch from the offline queue."""
+        now = int(timezone.now().timestamp() * 1000)
+        trials = [{"note": note, "octave": "4", "alter": "0", "correct": i % 3 != 0, "reaction_time": 600 + i * 10}
+                  for i, note in enumerate("CDECDE")]
+        batch = {"trials": [{**trial, "client_ts": now + i} for i, trial in enumerate(trials)]}
+        single = reverse("practice-data", kwargs={"package_id": self.package.id})
+        return [
+            *[("POST", single, json.dumps(trial), self.headers) for trial in trials],
+            ("POST", reverse("practice-data-batch", kwargs={"learningscenario_id": self.scenario.id}),
+             json.dumps(batch), self.headers),
+        ]
+
+
+class Command(BaseCommand):
+    help = ("Start gunicorn in each DJANGO_SERVER_MODE (see config/gunicorn.py) with the same worker count "
+            "and compare requests/sec on the async endpoints: reads (GETs) and writes (practice answers "
+            "posted by a throwaway learner, deleted afterwards).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn workers per deployment")
+        parser.add_argument("--concurrency", type=int, default=32, help="concurrent client connections")
+        parser.add_argument("--requests", type=int, default=2000, help="total requests per deployment")
+        parser.add_argument("--path", action="append", dest="paths",
+                            help="URL to request (repeatable); defaults to the service worker, a practice-try "
+                                 "manifest and, if a learning scenario exists, its progress data")
+        parser.add_argument("--mode", action="append", dest="modes", choices=list(SERVER_MODES),
+                            help="deployment(s) to run; defaults to all")
+        parser.add_argument("--no-writes", action="store_true",
+                            help="skip the practice-data / practice-data-batch POST workload")
+
+    def default_paths(self):
+        paths = [
+            reverse("service-worker"),
+            reverse("practice-try-manifest-sigs", kwargs={
+                "instrument": "trumpet", "clef": "treble", "key": "Bb", "level": "beginner",
+                "octave": 0, "signatures": "0"}),
+        ]
+        scenario = LearningScenario.objects.order_by("-id").first()
+        if scenario:
+            paths.append(reverse("progress_data", kwargs={"learningscenario_id": scenario.id}))
+        return paths
+
+    def run_mode(self, mode, workloads, options):
+        port = _free_port()
+        env = dict(os.environ,
+                   DJANGO_SERVER_MODE=mode,
+                   DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE),
+                   PORT=str(port),
+                   WEB_CONCURRENCY=str(options["workers"]))
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", str(GUNICORN_CONFIG), "--log-level", "warning"],
+            cwd=settings.BASE_DIR, env=env)
+        try:
+            _wait_until_up(port, process)
+            return {name: self.run_workload(port, requests, options) for name, requests in workloads.items()}
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    def run_workload(self, port, requests, options):
+        # warm up the workers (imports, lru caches, db connections) before timing
+        _client(port, requests, len(requests) * options["workers"] * 2)
+
+        concurrency = options["concurrency"]
+        per_client = max(1, options["requests"] // concurrency)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: _client(port, requests, per_client), range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for client_latencies, _errors in results for latency in client_latencies)
+        return {
+            "requests": len(latencies),
+            "errors": sum(errors for _latencies, errors in results),
+            "rps": len(latencies) / elapsed,
+            "p50": statistics.median(latencies) * 1000,
+            "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        }
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or self.default_paths()
+        modes = options["modes"] or list(SERVER_MODES)
+        if options["no_writes"]:
+            self.run(modes, {"reads": [("GET", path, None, {}) for path in paths]}, options)
+            return
+        with _PracticeSession() as session:
+            self.run(modes, {"reads": [("GET", path, None, {}) for path in paths],
+                             "writes": session.requests()}, options)
+
+    def run(self, modes, workloads, options):
+        self.stdout.write(f"{options['workers']} worker(s), {options['concurrency']} connections, "
+                          f"{options['requests']} requests per workload:")
+        for name, requests in workloads.items():
+            for path in dict.fromkeys(f"{method} {path}" for method, path, _body, _headers in requests):
+                self.stdout.write(f"  {name:>6}  {path}")
+
+        for mode in modes:
+            for name, stats in self.run_mode(mode, workloads, options).items():
+                self.stdout.write(
+                    f"{mode:>5} {name:>6}: {stats['rps']:8.1f} req/s  p50 {stats['p50']:6.1f}ms  "
+                    f"p99 {stats['p99']:6.1f}ms  ({stats['requests']} requests, {stats['errors']} errors)")
@@ -0,0 +1,349 @@
+"""
+Prometheus metrics, served as text at /metrics.
+
+A small in-process registry of counters, gauges and histograms, with nothing to install. Under
+gunicorn (several workers) and with the huey consumer as a separate process, set METRICS_DIR
+(PROMETHEUS_MULTIPROC_DIR in the environment) to a directory all of them can write to: each
+process then saves its values there every WRITE_SECONDS (and on exit), and a scrape adds up
+every process's file. Counters and histograms from processes that have gone are kept, as
+Prometheus expects; gauges are only taken from files written in the last GAUGE_MAX_AGE seconds.
+
+What's measured:
+
+* request latency per URL name, and SQL queries per request (MetricsMiddleware);
+* trials written to the database, or queued in the write-behind buffer, and batch sizes;
+* huey queue depth (read at scrape time) and task durations (config/tasks.py);
+* psycopg pool size, idle connections and waiting requests, per database;
+* cache hits and misses: the Django cache (cohort analytics) and our lru_caches.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.module_loading import import_string
+
+PREFIX = 'learnmusic_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+WRITE_SECONDS = 5
+GAUGE_MAX_AGE = 60
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+TASK_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+# functools.lru_cache'd functions whose hit ratio is worth watching
+LRU_CACHES = {
+    'fingering_index': 'notes.instrument_data.fingering_index',
+    'transposition_table': 'notes.transposition.transposition_table',
+    'practice_try_manifest': 'notes.views._build_practice_try_manifest',
+    'service_worker': 'config.service_worker.build_service_worker',
+}
+
+_lock = threading.RLock()
+_write_lock = threading.Lock()
+_metrics = {}
+_queries = ContextVar('request_queries', default=None)
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labels = labels
+        # {label values: value}
+        self.values = {}
+        with _lock:
+            _metrics[self.name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, total: float, **labels):
+        """For counts kept elsewhere in this process (e.g. lru_cache's cache_info)."""
+        with _lock:
+            self.values[self._key(labels)] = total
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [count per bucket (the last is +Inf)..., sum]
+            values = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0])
+            values[bisect_left(self.buckets, value)] += 1
+            values[-1] += value
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', "Request latency by URL name.",
+                            ('view', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_queries', "SQL queries per request by URL name.", ('view',),
+                            buckets=COUNT_BUCKETS)
+TRIALS = Counter('trials_ingested_total', "Trials written to the database (single, batch) or queued in the "
+                                          "write-behind buffer (buffered).", ('path',))
+TRIAL_BATCH_SIZE = Histogram('trial_batch_size', "Trials per ingestion call.", ('path',), buckets=COUNT_BUCKETS)
+HUEY_QUEUE_DEPTH = Gauge('huey_queue_depth', "Tasks waiting in the huey queue.")
+HUEY_TASK_DURATION = Histogram('huey_task_duration_seconds', "Huey task run time.", ('task', 'outcome'),
+                               buckets=TASK_BUCKETS)
+DB_POOL_SIZE = Gauge('db_pool_size', "Connections held by the psycopg pools.", ('db',))
+DB_POOL_AVAILABLE = Gauge('db_pool_available', "Idle connections in the psycopg pools.", ('db',))
+DB_POOL_WAITING = Gauge('db_pool_waiting', "Requests waiting for a pooled connection.", ('db',))
+CACHE_HITS = Counter('cache_hits_total', "Cache hits.", ('cache',))
+CACHE_MISSES = Counter('cache_misses_total', "Cache misses.", ('cache',))
+
+
+def record_trials(path: str, count: int):
+    TRIALS.inc(count, path=path)
+    TRIAL_BATCH_SIZE.observe(count, path=path)
+
+
+def record_cache(cache: str, hit: bool):
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache=cache)
+
+
+# collected when the values are written out or scraped
+# ------------------------------------------------------------------------------
+
+def _collect_lru_caches():
+    for name, path in LRU_CACHES.items():
+        try:
+            info = import_string(path).cache_info()
+        except (ImportError, AttributeError):
+            continue
+        CACHE_HITS.set_total(info.hits, cache=name)
+        CACHE_MISSES.set_total(info.misses, cache=name)
+
+
+def _collect_pools():
+    for alias in connections:
+        if not connections.settings[alias].get('OPTIONS', {}).get('pool'):
+            continue
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        DB_POOL_SIZE.set(stats.get('pool_size', 0), db=alias)
+        DB_POOL_AVAILABLE.set(stats.get('pool_available', 0), db=alias)
+        DB_POOL_WAITING.set(stats.get('requests_waiting', 0), db=alias)
+
+
+def _collect_huey():
+    from huey.contrib.djhuey import HUEY
+
+    try:
+        HUEY_QUEUE_DEPTH.set(HUEY.pending_count())
+    except Exception:  # broker unreachable: leave the gauge out rather than fail the scrape
+        HUEY_QUEUE_DEPTH.values.clear()
+
+
+def collect():
+    _collect_lru_caches()
+    _collect_pools()
+
+
+# multiprocess storage
+# ------------------------------------------------------------------------------
+
+_writer_started = False
+
+
+def _directory() -> Path | None:
+    return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+
+def snapshot() -> dict:
+    """{metric name: [[label values, value], ...]} for this process."""
+    with _lock:
+        return {name: [[list(key), list(value) if isinstance(value, list) else value]
+                       for key, value in metric.values.items()]
+                for name, metric in _metrics.items() if metric is not HUEY_QUEUE_DEPTH}
+
+
+def write_snapshot():
+    directory = _directory()
+    if directory is None:
+        return
+    collect()
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f'metrics-{os.getpid()}.json'
+    temporary = target.with_suffix('.tmp')
+    with _write_lock:
+        temporary.write_text(json.dumps(snapshot()))
+        os.replace(temporary, target)
+
+
+def _write_periodically():
+    while True:
+        time.sleep(WRITE_SECONDS)
+        write_snapshot()
+
+
+def start_writer():
+    """Save this process's values to METRICS_DIR in the background (no-op without it)."""
+    global _writer_started
+    with _lock:
+        if _writer_started or _directory() is None:
+            return
+        _writer_started = True
+    threading.Thread(target=_write_periodically, name='metrics-writer', daemon=True).start()
+    atexit.register(write_snapshot)
+
+
+def _merge(into: dict, name: str, rows: list):
+    metric = _metrics.get(name)
+    if metric is None:
+        return
+    values = into.setdefault(name, {})
+    for key, value in rows:
+        key = tuple(key)
+        if isinstance(value, list):
+            current = values.get(key)
+            values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            values[key] = values.get(key, 0) + value
+
+
+def gather() -> dict:
+    """{metric name: {label values: value}} over every process (or just this one)."""
+    directory = _directory()
+    if directory is None:
+        collect()
+        with _lock:
+            return {name: dict(metric.values) for name, metric in _metrics.items()}
+    write_snapshot()
+    merged = {}
+    now = time.time()
+    for path in directory.glob('metrics-*.json'):
+        try:
+            data = json.loads(path.read_text())
+            fresh = now - path.stat().st_mtime < GAUGE_MAX_AGE
+        except (OSError, ValueError):
+            continue  # a process writing its file for the first time, or gone meanwhile
+        for name, rows in data.items():
+            if fresh or _metrics.get(name, Gauge).kind != 'gauge':
+                _merge(merged, name, rows)
+    return merged
+
+
+# exposition
+# ------------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """Everything, in the Prometheus text format."""
+    _collect_huey()
+    values = gather()
+    values[HUEY_QUEUE_DEPTH.name] = dict(HUEY_QUEUE_DEPTH.values)
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(values.get(name, {}).items()):
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{_labels(metric.labels, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_labels(metric.labels, key, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric.labels, key)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(metric.labels, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# per request
+# ------------------------------------------------------------------------------
+
+def _count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """Latency and SQL query count of every request, labelled by URL name."""
+    start_writer()
+
+    def observe(request, response, started, queries):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, view=view, method=request.method,
+                                status=f'{response.status_code // 100}xx')
+        REQUEST_QUERIES.observe(queries[0], view=view)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started, queries = time.perf_counter(), [0]
+            token = _queries.set(queries)
+            try:
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(_count_query))
+                    response = await get_response(request)
+            finally:
+                _queries.reset(token)
+            return observe(request, response, started, queries)
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            started, queries = time.perf_counter(), [0]
+            token = _queries.set(queries)
+            try:
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(_count_query))
+                    response = get_response(request)
+            finally:
+                _queries.reset(token)
+            return observe(request, response, started, queries)
+    return middleware
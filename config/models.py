@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import models
+from model_utils.models import TimeStampedModel
+
+
+class RequestProfile(TimeStampedModel):
+    """A profile of one request, taken on demand for staff (see config.profiling)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.FloatField(default=0)
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    # [{sql, ms, db, origin}, ...] in the order they ran
+    queries = models.JSONField(default=list, blank=True)
+    # [{name, ms}, ...] outermost first; 'view' is URL resolving, the view and its response
+    middleware = models.JSONField(default=list, blank=True)
+    profiler = models.CharField(max_length=20)
+    summary = models.TextField(blank=True)
+    file = models.FileField(upload_to='profiles/%Y/%m/', blank=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
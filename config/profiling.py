@@ -0,0 +1,284 @@
+"""
+On-demand request profiling for staff.
+
+Add ?_profile=1 to a URL (or send an X-Profile header) while logged in as staff and
+ProfilingMiddleware, first in MIDDLEWARE, profiles that one request: a pyinstrument sampling
+profile if pyinstrument is installed, cProfile otherwise, plus every SQL query (with its
+timing and the line of our code that ran it) and the time spent in each middleware. The result
+is saved as a RequestProfile and browsed in the admin, where the profile file can be
+downloaded (pyinstrument HTML, or a .prof for snakeviz / pstats).
+
+Every other request pays for one dict lookup and one substring test. The timing hooks on the
+middleware chain are only installed the first time a profile is taken, and SQL is only
+wrapped for the profiled request. REQUEST_PROFILING = False takes the middleware out entirely.
+
+Under ASGI the profiled request runs in a worker thread (async parts via async_to_sync) so the
+profiler sees the sync views and ORM work, which is where the time goes.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from importlib import import_module
+
+from asgiref.sync import AsyncToSync, SyncToAsync, async_to_sync, iscoroutinefunction, markcoroutinefunction, \
+    sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model, load_backend
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+from config.querycheck import query_origin
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - exercised only where pyinstrument is installed
+    pyinstrument = None
+
+PROFILE_PARAM = '_profile'
+PROFILE_META = 'HTTP_X_PROFILE'
+VIEW = 'view'
+SAMPLE_INTERVAL = 0.001
+SUMMARY_LINES = 60
+
+_active = ContextVar('request_profile', default=None)
+_install_lock = threading.Lock()
+
+
+def wants_profile(request) -> bool:
+    return PROFILE_META in request.META or PROFILE_PARAM in request.META.get('QUERY_STRING', '')
+
+
+def _staff_user(request):
+    """The staff user the session cookie belongs to, if any.
+
+    Read-only: the session and user proper are loaded further down the stack, this only
+    decides whether to profile.
+    """
+    key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(key)
+    try:
+        user_id = get_user_model()._meta.pk.to_python(session[SESSION_KEY])
+        backend_path = session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return None
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    user = load_backend(backend_path).get_user(user_id)
+    if user is None or not user.is_staff:
+        return None
+    if not constant_time_compare(session.get(HASH_SESSION_KEY, ''), user.get_session_auth_hash()):
+        return None
+    return user
+
+
+class Capture:
+    """What's recorded while one request is profiled."""
+
+    def __init__(self):
+        self.queries = []
+        self.middleware = {}
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'ms': round((time.perf_counter() - started) * 1000, 3),
+                                 'db': context['connection'].alias, 'origin': query_origin()})
+
+    def middleware_timings(self, chain: list[str]) -> list[dict]:
+        """Time spent in each middleware itself (its inclusive time minus the next one's)."""
+        timings = []
+        for i, name in enumerate(chain):
+            if name not in self.middleware:
+                continue
+            inner = self.middleware.get(chain[i + 1], 0) if i + 1 < len(chain) else 0
+            timings.append({'name': name, 'ms': round((self.middleware[name] - inner) * 1000, 3)})
+        return timings
+
+
+def _timed(link, name: str):
+    """`link` (the get_response a middleware calls), timed while a profile is being taken."""
+    if iscoroutinefunction(link):
+        async def timed(request):
+            capture = _active.get()
+            if capture is None:
+                return await link(request)
+            started = time.perf_counter()
+            try:
+                return await link(request)
+            finally:
+                capture.middleware[name] = time.perf_counter() - started
+        markcoroutinefunction(timed)
+    else:
+        def timed(request):
+            capture = _active.get()
+            if capture is None:
+                return link(request)
+            started = time.perf_counter()
+            try:
+                return link(request)
+            finally:
+                capture.middleware[name] = time.perf_counter() - started
+    timed.__wrapped__ = link
+    return timed
+
+
+def _unwrap(link):
+    # through convert_exception_to_response and sync/async adapters to the middleware itself
+    while True:
+        if hasattr(link, '__wrapped__'):
+            link = link.__wrapped__
+        elif isinstance(link, AsyncToSync):
+            link = link.awaitable
+        elif isinstance(link, SyncToAsync):
+            link = link.func
+        else:
+            return link
+
+
+def _middleware_name(middleware) -> str:
+    if getattr(middleware, '__name__', '') in ('_get_response', '_get_response_async'):
+        return VIEW
+    if hasattr(middleware, '__code__'):
+        # function middleware: the factory's inner function
+        return f"{middleware.__module__}.{middleware.__qualname__.split('.<locals>')[0]}"
+    return f"{type(middleware).__module__}.{type(middleware).__qualname__}"
+
+
+def _get_response_slot(middleware):
+    """(get, set) for the get_response a middleware calls on to, or None (the view handler)."""
+    if not hasattr(middleware, '__code__') and 'get_response' in getattr(middleware, '__dict__', {}):
+        return (lambda: middleware.get_response), (lambda value: setattr(middleware, 'get_response', value))
+    code = getattr(middleware, '__code__', None)
+    if code is not None and 'get_response' in code.co_freevars:
+        cell = middleware.__closure__[code.co_freevars.index('get_response')]
+        return (lambda: cell.cell_contents), (lambda value: setattr(cell, 'cell_contents', value))
+    return None
+
+
+def instrument_chain(slot) -> list[str]:
+    """Wrap every link of the middleware chain below `slot` with `_timed`; returns their names in order."""
+    chain = []
+    while slot is not None:
+        get, set_ = slot
+        link = get()
+        middleware = _unwrap(link)
+        name = _middleware_name(middleware)
+        set_(_timed(link, name))
+        chain.append(name)
+        slot = None if name == VIEW else _get_response_slot(middleware)
+    return chain
+
+
+class _Profiler:
+    """pyinstrument if it's installed (sampling), cProfile if not."""
+
+    def __init__(self):
+        self.kind = 'pyinstrument' if pyinstrument is not None else 'cprofile'
+        if pyinstrument is not None:
+            self.profiler = pyinstrument.Profiler(interval=SAMPLE_INTERVAL, async_mode='disabled')
+        else:
+            self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if pyinstrument is not None:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if pyinstrument is not None:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def output(self) -> tuple[str, bytes, str]:
+        """(file extension, file contents, text summary)."""
+        if pyinstrument is not None:
+            return 'html', self.profiler.output_html().encode(), self.profiler.output_text(color=False)
+        summary = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return 'prof', marshal.dumps(stats.stats), summary.getvalue()
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.chain = None
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not wants_profile(request):
+            return self.get_response(request)
+        user = _staff_user(request)
+        if user is None:
+            return self.get_response(request)
+        return self.profile(request, user)
+
+    async def __acall__(self, request):
+        if not wants_profile(request):
+            return await self.get_response(request)
+        user = await sync_to_async(_staff_user)(request)
+        if user is None:
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, user)
+
+    def _instrument(self):
+        with _install_lock:
+            if self.chain is None:
+                slot = (lambda: self.get_response), (lambda value: setattr(self, 'get_response', value))
+                self.chain = instrument_chain(slot)
+
+    def profile(self, request, user):
+        from config.models import RequestProfile
+
+        self._instrument()
+        capture = Capture()
+        token = _active.set(capture)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(capture.record_query))
+                profiler = stack.enter_context(_Profiler())
+                if self.async_mode:
+                    response = async_to_sync(self.get_response)(request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            _active.reset(token)
+
+        extension, data, summary = profiler.output()
+        record = RequestProfile(
+            user=user, method=request.method, path=request.get_full_path()[:500],
+            status_code=response.status_code, duration_ms=round(duration * 1000, 3),
+            query_count=len(capture.queries), query_ms=round(sum(q['ms'] for q in capture.queries), 3),
+            queries=capture.queries, middleware=capture.middleware_timings(self.chain),
+            profiler=profiler.kind, summary=summary,
+        )
+        record.file.save(f"request-{time.strftime('%Y%m%d-%H%M%S')}.{extension}", ContentFile(data), save=False)
+        record.save()
+        response['X-Profile-Id'] = str(record.id)
+        return response
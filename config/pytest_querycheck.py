@@ -0,0 +1,42 @@
+"""
+pytest plugin for config.querycheck (loaded from the root conftest.py).
+
+A test fails if any request it makes goes over its view's QUERY_BUDGETS entry. N+1 patterns
+are reported as warnings. `@pytest.mark.query_budget('url-name', n)` sets a view's budget for one test.
+"""
+import warnings
+
+import pytest
+
+from config import querycheck
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(view, queries): a QUERY_BUDGETS entry for this test")
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    reports = []
+    querycheck.listeners.append(reports.append)
+    budgets = {marker.args[0]: marker.args[1] for marker in reversed(list(item.iter_markers('query_budget')))}
+    try:
+        result = yield
+    finally:
+        querycheck.listeners.remove(reports.append)
+
+    for report in reports:
+        for fingerprint, count, origin in report.n_plus_one():
+            warnings.warn(NPlusOneWarning(f"{report.view}: {count}x from {origin or '?'}: {fingerprint}"))
+    over = []
+    for report in reports:
+        budget = budgets.get(report.view, report.budget)
+        if budget is not None and len(report.queries) > budget:
+            over.append(report.describe(budget))
+    if over:
+        pytest.fail("Query budget exceeded:\n" + "\n".join(over), pytrace=False)
+    return result
@@ -0,0 +1,173 @@
+"""
+Query analysis for development, staging and CI (QUERYCHECK).
+
+QueryCheckMiddleware records every SQL query a request makes and logs, to the
+`config.querycheck` logger:
+
+* slow queries (over QUERYCHECK_SLOW_MS);
+* N+1 patterns: the same query, once its literals and parameters are taken out
+  (`fingerprint`), run QUERYCHECK_N_PLUS_ONE times or more in one request, with the template
+  line, or failing that the line of our code, that ran it; and
+* requests over their view's budget in QUERY_BUDGETS ({URL name: most queries}).
+
+In tests the pytest plugin (config/pytest_querycheck.py) fails any test that makes a request
+over budget, and turns N+1 patterns into warnings.
+"""
+import logging
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+# callables given every QueryReport (the pytest plugin listens here)
+listeners = []
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+# our own execute wrappers, which are never where a query comes from
+_WRAPPER_MODULES = {'config.querycheck', 'config.profiling', 'config.metrics'}
+
+
+def fingerprint(sql: str) -> str:
+    """The query with literals, parameters and IN lists replaced, so repeats look the same."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def query_origin() -> str:
+    """Where the current query comes from: the template line being rendered (and our code's line
+    under it, if any), or else our code's innermost line."""
+    base = str(settings.BASE_DIR)
+    code = ''
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            # django.template.base.Node.render_annotated: the innermost node being rendered
+            node = frame.f_locals.get('self')
+            token, origin = getattr(node, 'token', None), getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f"{origin.template_name}:{token.lineno}" + (f" via {code}" if code else "")
+        filename = frame.f_code.co_filename
+        if (not code and filename.startswith(base) and 'site-packages' not in filename
+                and frame.f_globals.get('__name__') not in _WRAPPER_MODULES):
+            code = f"{filename[len(base) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return code
+
+
+@dataclass
+class Query:
+    sql: str
+    ms: float
+    origin: str
+
+    @property
+    def fingerprint(self) -> str:
+        return fingerprint(self.sql)
+
+
+@dataclass
+class QueryReport:
+    view: str
+    path: str
+    queries: list[Query] = field(default_factory=list)
+
+    @property
+    def budget(self) -> int | None:
+        return settings.QUERY_BUDGETS.get(self.view)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and len(self.queries) > self.budget
+
+    def repeats(self) -> dict[str, list[Query]]:
+        groups = defaultdict(list)
+        for query in self.queries:
+            groups[query.fingerprint].append(query)
+        return {fp: queries for fp, queries in groups.items() if len(queries) > 1}
+
+    def n_plus_one(self) -> list[tuple[str, int, str]]:
+        """(fingerprint, times run, most common origin) for each query repeated N+1 style."""
+        found = []
+        for fp, queries in self.repeats().items():
+            if len(queries) >= settings.QUERYCHECK_N_PLUS_ONE:
+                origin = Counter(query.origin for query in queries).most_common(1)[0][0]
+                found.append((fp, len(queries), origin))
+        return sorted(found, key=lambda item: -item[1])
+
+    def slow(self) -> list[Query]:
+        return [query for query in self.queries if query.ms >= settings.QUERYCHECK_SLOW_MS]
+
+    def describe(self, budget: int | None = None) -> str:
+        budget = budget if budget is not None else self.budget
+        lines = [f"{self.view} ({self.path}): {len(self.queries)} queries"
+                 + (f", budget {budget}" if budget is not None else "")]
+        for fp, count, origin in self.n_plus_one():
+            lines.append(f"  N+1: {count}x from {origin or '?'}: {fp}")
+        for query in self.slow():
+            lines.append(f"  slow: {query.ms:.1f} ms from {query.origin or '?'}: {query.sql}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def recording(report: QueryReport):
+    """Record every query made on this thread's (or task's) connections into `report`."""
+    def record(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            report.queries.append(Query(sql, (time.perf_counter() - started) * 1000, query_origin()))
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record))
+        yield report
+
+
+def finish(report: QueryReport, request):
+    match = request.resolver_match
+    report.view = match.view_name if match else '<unresolved>'
+    if report.over_budget or report.n_plus_one() or report.slow():
+        logger.warning("%s", report.describe())
+    for listener in listeners:
+        listener(report)
+
+
+@sync_and_async_middleware
+def QueryCheckMiddleware(get_response):
+    if not settings.QUERYCHECK:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            report = QueryReport(view='', path=request.path)
+            with recording(report):
+                response = await get_response(request)
+            finish(report, request)
+            return response
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            report = QueryReport(view='', path=request.path)
+            with recording(report):
+                response = get_response(request)
+            finish(report, request)
+            return response
+    return middleware
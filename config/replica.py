@@ -0,0 +1,109 @@
+"""
+Read-replica routing.
+
+When settings.READ_REPLICA names a database alias (DATABASE_REPLICA_URL in the environment),
+reads made inside `reading_from_replica()` go to it; everything else, and every write, uses
+`default`. Views opt in with `@replica_view` (GET/HEAD only) and admin changelists with
+`ReplicaChangelistMixin`.
+
+Replicas lag a little, so after a POST (or any unsafe request) ReplicaMiddleware sets a short
+lived cookie and that browser reads from the primary until it expires: a learner always sees
+the answers they just sent.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_alias() -> str | None:
+    alias = getattr(settings, 'READ_REPLICA', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def pinned_to_primary(request) -> bool:
+    """True for a while after this browser wrote something (see ReplicaMiddleware)."""
+    return request is not None and PIN_COOKIE in request.COOKIES
+
+
+@contextmanager
+def reading_from_replica(request=None):
+    """Send reads to the replica (if there is one) for the duration of the block."""
+    use = replica_alias() is not None and not pinned_to_primary(request)
+    token = _use_replica.set(use)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_view(view):
+    """Serve a read-only view's GET (and HEAD) requests from the replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await view(request, *args, **kwargs)
+            with reading_from_replica(request):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            with reading_from_replica(request):
+                return view(request, *args, **kwargs)
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return replica_alias() if _use_replica.get() else None
+
+    def db_for_write(self, model, **hints):
+        # instances read from the replica are saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+@sync_and_async_middleware
+def ReplicaMiddleware(get_response):
+    """Pin a browser to the primary for REPLICA_STICKY_SECONDS after it writes."""
+    def pin(request, response):
+        if replica_alias() is not None and request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+                                samesite='Lax', secure=request.is_secure())
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return pin(request, await get_response(request))
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            return pin(request, get_response(request))
+    return middleware
+
+
+class ReplicaChangelistMixin:
+    """ModelAdmin mixin: changelist pages (not their bulk actions) read from the replica."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in SAFE_METHODS:
+            return super().changelist_view(request, extra_context)
+        with reading_from_replica(request):
+            return super().changelist_view(request, extra_context)
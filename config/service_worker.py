@@ -0,0 +1,116 @@
+"""
+Renders learnmusic/static/service-worker.js with hashed static URLs and a content-derived version.
+
+The source file carries placeholders instead of a hand-maintained VERSION and asset list. The
+rendered script is built once per process and kept in memory; the version (also used as the
+ETag) is a hash of the script source plus the bytes of every precached asset, so browsers only
+reinstall the worker, and re-download assets, when something actually changed.
+"""
+import functools
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+SOURCE = "service-worker.js"
+OFFLINE_PAGE = "offline.html"
+TRIAL_QUEUE = "js/trial_queue.js"
+
+# Pages (not static files) that are precached as-is
+PRECACHED_PAGES = ["/"]
+
+# Paths relative to STATIC_URL; these are resolved to hashed URLs when manifest storage is in use
+PRECACHED_STATIC = [
+    OFFLINE_PAGE,
+
+    # core UI
+    "css/project.css",
+    "css/sf.css",
+    "js/project.js",
+    "js/vexflow.js",
+    TRIAL_QUEUE,
+
+    # vendor dependencies (offline support)
+    "css/vendor/fontawesome.min.css",
+    "css/vendor/bootstrap.min.css",
+    "js/vendor/htmx.min.js",
+    "js/vendor/bootstrap.bundle.min.js",
+    "js/vendor/sweetalert2.min.js",
+
+    # webfonts (Font Awesome icons)
+    "css/webfonts/fa-brands-400.woff2",
+    "css/webfonts/fa-brands-400.ttf",
+    "css/webfonts/fa-solid-900.woff2",
+    "css/webfonts/fa-solid-900.ttf",
+    "css/webfonts/fa-regular-400.woff2",
+    "css/webfonts/fa-regular-400.ttf",
+
+    # instrument data (for practice pages)
+    "instruments/trumpet.json",
+    "instruments/trombone.json",
+    "instruments/tuba.json",
+    "instruments/tenor-horn.json",
+    "instruments/soprano_trombone.json",
+    "instruments/piccolo_trumpet.json",
+
+    # icons / manifest
+    "favicon/android-chrome-192x192.png",
+    "favicon/android-chrome-512x512.png",
+    "favicon/favicon-32x32.png",
+    "favicon/favicon-16x16.png",
+    "favicon/apple-touch-icon.png",
+    "favicon/site.webmanifest",
+]
+
+
+class ServiceWorkerNotFound(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ServiceWorkerBuild:
+    content: bytes
+    version: str
+    assets: tuple[str, ...]
+
+
+def _static_url(path: str) -> str:
+    try:
+        return staticfiles_storage.url(path)
+    except ValueError:
+        # Missing from the manifest (e.g. collectstatic not run yet); serve the unhashed URL
+        return staticfiles_storage.base_url + path
+
+
+def _read_static(path: str) -> bytes:
+    file_path = finders.find(path)
+    if not file_path:
+        if staticfiles_storage.exists(path):
+            with staticfiles_storage.open(path) as f:
+                return f.read()
+        return b""
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=1)
+def build_service_worker() -> ServiceWorkerBuild:
+    source = _read_static(SOURCE)
+    if not source:
+        raise ServiceWorkerNotFound(SOURCE)
+
+    digest = hashlib.sha256(source)
+    for path in PRECACHED_STATIC:
+        digest.update(path.encode())
+        digest.update(_read_static(path))
+    version = digest.hexdigest()[:16]
+
+    assets = tuple(PRECACHED_PAGES + [_static_url(path) for path in PRECACHED_STATIC])
+    content = (source.decode()
+               .replace('"__SW_VERSION__"', json.dumps(version))
+               .replace('"__SW_OFFLINE_URL__"', json.dumps(_static_url(OFFLINE_PAGE)))
+               .replace('"__SW_TRIAL_QUEUE_URL__"', json.dumps(_static_url(TRIAL_QUEUE)))
+               .replace("__SW_STATIC_ASSETS__", json.dumps(assets, indent=1)))
+    return ServiceWorkerBuild(content=content.encode(), version=version, assets=assets)
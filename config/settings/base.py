@@ -58,6 +58,41 @@ DATABASES = {
 
 DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)
 DATABASES["default"]["ATOMIC_REQUESTS"] = True
+# Optional read replica for heavy read-only views (see config/replica.py), e.g.
+# DATABASE_REPLICA_URL=sqlite:///db-replica.sqlite3 locally
+if env("DATABASE_REPLICA_URL", default=""):
+    DATABASES["replica"] = env.db("DATABASE_REPLICA_URL")
+    DATABASES["replica"]["CONN_MAX_AGE"] = DATABASES["default"]["CONN_MAX_AGE"]
+READ_REPLICA = "replica" if "replica" in DATABASES else None
+DATABASE_ROUTERS = ["config.replica.ReplicaRouter"]
+# how long a browser reads from the primary after writing something
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=10)
+# staff can profile a request with ?_profile=1 (see config/profiling.py). Off unless turned on
+# (REQUEST_PROFILING=True), as it is locally and in tests.
+REQUEST_PROFILING = env.bool("REQUEST_PROFILING", default=False)
+# Prometheus metrics at /metrics (see config/metrics.py): a directory shared by the gunicorn
+# workers and the huey consumer, and the bearer token scrapes send (without one, /metrics is
+# staff-only)
+METRICS_DIR = env("PROMETHEUS_MULTIPROC_DIR", default="")
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+# query analysis: slow queries, N+1 patterns and per-view query budgets (see config/querycheck.py).
+# On locally, in staging (QUERYCHECK=True) and in tests, where going over a budget fails the test.
+QUERYCHECK = env.bool("QUERYCHECK", default=False)
+QUERYCHECK_SLOW_MS = env.int("QUERYCHECK_SLOW_MS", default=100)
+# the same query this many times in one request is reported as N+1
+QUERYCHECK_N_PLUS_ONE = 5
+# {URL name: most queries a request may make}, counting session, user and savepoint queries
+QUERY_BUDGETS = {
+    "notes-home": 7,
+    "practice": 6,
+    "practice-data": 7,
+    "practice-data-batch": 10,
+    "progress_data": 3,
+    "cohort-analytics": 8,
+    "export-trials": 9,
+}
+# PostgreSQL only: partition NoteRecordPackage by month when migrating (see notes/partitions.py)
+PARTITION_NOTE_PACKAGES = env.bool("PARTITION_NOTE_PACKAGES", default=False)
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -67,6 +102,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ROOT_URLCONF = "config.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "config.wsgi.application"
+# https://docs.djangoproject.com/en/dev/ref/settings/#asgi-application
+ASGI_APPLICATION = "config.asgi.application"
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -153,6 +190,10 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    # first, so it can time everything below it (see config/profiling.py)
+    "config.profiling.ProfilingMiddleware",
+    "config.metrics.MetricsMiddleware",
+    "config.querycheck.QueryCheckMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -160,6 +201,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "config.replica.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
@@ -287,6 +329,10 @@ LOGGING = {
 
 REDIS_URL = env("REDIS_URL", default="redis://localhost:6379/0")
 REDIS_SSL = REDIS_URL.startswith("rediss://")
+# write-behind practice answers: buffered in Redis, flushed to the database by a Huey task
+# (see notes/trial_buffer.py)
+TRIAL_WRITE_BEHIND = env.bool("TRIAL_WRITE_BEHIND", default=False)
+TRIAL_BUFFER_URL = env("TRIAL_BUFFER_URL", default=REDIS_URL)
 
 # django-allauth  (≥ v65.8)
 # --------------------------------------------------------------------------
@@ -69,6 +69,10 @@ INSTALLED_APPS += ["django_extensions"]
 
 # Your stuff...
 # ------------------------------------------------------------------------------
+# log slow queries, N+1 patterns and views over their query budget (config/querycheck.py)
+QUERYCHECK = True
+# staff can profile a request with ?_profile=1 (config/profiling.py)
+REQUEST_PROFILING = env.bool("REQUEST_PROFILING", default=True)
 AXES_ENABLED = False
 
 # Huey configuration for local development
@@ -29,6 +29,11 @@ DATABASES["default"]["OPTIONS"] = {"pool":
         "max_idle": 300,  # Close idle connections after 5 minutes
     }
 }
+if env("DATABASE_REPLICA_URL", default=""):
+    DATABASES["replica"] = env.db("DATABASE_REPLICA_URL")
+    DATABASES["replica"]["CONN_MAX_AGE"] = DATABASES["default"]["CONN_MAX_AGE"]
+    DATABASES["replica"]["OPTIONS"] = {"pool": dict(DATABASES["default"]["OPTIONS"]["pool"])}
+READ_REPLICA = "replica" if "replica" in DATABASES else None
 
 # CACHES
 # ------------------------------------------------------------------------------
@@ -171,8 +176,6 @@ ROLLBAR = {
     'root': BASE_DIR,
 }
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
-
 # Huey configuration for production
 # ------------------------------------------------------------------------------
 if REDIS_SSL and REDIS_URL.startswith("redis://"):
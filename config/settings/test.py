@@ -3,6 +3,8 @@ With these settings, tests run faster.
 """
 
 from .base import *  # noqa: F403
+from .base import BASE_DIR
+from .base import DATABASES
 from .base import TEMPLATES
 from .base import env
 
@@ -36,6 +38,14 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore[index]
 MEDIA_URL = "http://media.testserver/"
 # Your stuff...
 # ------------------------------------------------------------------------------
+# A second SQLite database to stand in for the read replica (config/tests.py). Reads only go
+# there in tests that turn READ_REPLICA on.
+DATABASES["replica"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": BASE_DIR / "db-replica.sqlite3"}
+READ_REPLICA = None
+# a request over its view's QUERY_BUDGETS entry fails the test (config/pytest_querycheck.py)
+QUERYCHECK = True
+REQUEST_PROFILING = True
+
 AXES_ENABLED = False
 
 # Properly disable Django Axes for tests
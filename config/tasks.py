@@ -0,0 +1,22 @@
+import time
+
+from huey.contrib.djhuey import signal
+from huey.signals import SIGNAL_COMPLETE, SIGNAL_ERROR, SIGNAL_EXECUTING
+
+from config import metrics
+
+# huey autodiscovers `tasks` modules, so this is loaded by the consumer, which runs the tasks
+metrics.start_writer()
+
+_started = {}
+
+
+@signal(SIGNAL_EXECUTING, SIGNAL_COMPLETE, SIGNAL_ERROR)
+def time_tasks(signal_name, task, *args):
+    if signal_name == SIGNAL_EXECUTING:
+        _started[task.id] = time.perf_counter()
+        return
+    started = _started.pop(task.id, None)
+    if started is not None:
+        outcome = 'error' if signal_name == SIGNAL_ERROR else 'complete'
+        metrics.HUEY_TASK_DURATION.observe(time.perf_counter() - started, task=task.name, outcome=outcome)
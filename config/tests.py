@@ -1,5 +1,18 @@
-from django.test import TestCase
-from django.urls import reverse
+import json
+import os
+import tempfile
+import time
+
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from config import metrics, querycheck
+from config.models import RequestProfile
+from config.replica import PIN_COOKIE, reading_from_replica
+from notes import trial_buffer
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import LearningScenario, NoteRecordPackage, User
 
 
 class TestHomePage(TestCase):
@@ -15,3 +28,272 @@ class TestHomePage(TestCase):
         practice_url = response.context.get('practice_url', None)
         self.assertIsNotNone(instruments)
         self.assertIsNotNone(practice_url)
+
+
+class TestServiceWorker(TestCase):
+    def test_placeholders_are_rendered(self):
+        response = self.client.get(reverse('service-worker'))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertNotIn('__SW_', content)
+        self.assertIn('/static/offline.html', content)
+        self.assertIn('/static/instruments/trumpet.json', content)
+
+    def test_etag_revalidation(self):
+        response = self.client.get(reverse('service-worker'))
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(reverse('service-worker'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_is_content_derived(self):
+        from config.service_worker import build_service_worker
+
+        build = build_service_worker()
+        self.assertIn(f'const VERSION         = "{build.version}";', build.content.decode())
+        self.assertIn(build.version, self.client.get(reverse('service-worker'))['ETag'])
+
+    async def test_served_over_asgi(self):
+        from config.service_worker import build_service_worker
+
+        response = await self.async_client.get(reverse('service-worker'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{build_service_worker().version}"')
+
+
+@override_settings(READ_REPLICA='replica')
+class TestReplicaRouting(TestCase):
+    """The test settings' second SQLite database plays the replica; it starts out empty."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.scenario = LearningScenarioFactory(user=self.user)
+        NoteRecordPackage.objects.create(learningscenario=self.scenario, log=[
+            {'note': 'C', 'octave': '4', 'alter': '0', 'correct': [True], 'reaction_time_log': [500], 'n': 1}])
+        self.progress_url = reverse('progress_data', kwargs={'learningscenario_id': self.scenario.id})
+
+    def test_reads_go_to_the_replica_only_when_asked(self):
+        self.assertEqual(LearningScenario.objects.count(), 1)
+        with reading_from_replica():
+            self.assertEqual(LearningScenario.objects.count(), 0)
+        with override_settings(READ_REPLICA=None), reading_from_replica():
+            self.assertEqual(LearningScenario.objects.count(), 1)
+
+    def test_writes_always_go_to_the_primary(self):
+        replica_user = UserFactory.build(id=self.user.id, email='replica@example.com')
+        replica_user.save(using='replica')
+        with reading_from_replica():
+            user = User.objects.get(id=self.user.id)
+            self.assertEqual(user._state.db, 'replica')
+            user.name = 'Primary'
+            user.save()
+        self.assertEqual(User.objects.get(id=self.user.id).name, 'Primary')
+        self.assertEqual(User.objects.using('replica').get(id=self.user.id).name, '')
+
+    def test_read_only_views_use_the_replica(self):
+        self.assertEqual(self.client.get(self.progress_url).json()['by_note']['labels'], [])
+
+    def test_writes_pin_the_browser_to_the_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('practice-data-batch', kwargs={'learningscenario_id': self.scenario.id}),
+                                    content_type='application/json', data={'trials': [
+                                        {'note': 'D', 'octave': '4', 'alter': '0', 'correct': True,
+                                         'client_ts': int(time.time() * 1000)}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # the test client keeps the cookie, so the next read sees the primary
+        self.assertEqual(self.client.get(self.progress_url).json()['by_note']['labels'], ['C4', 'D4'])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestRequestProfiling(TestCase):
+    def setUp(self):
+        self.staff = UserFactory(is_staff=True)
+        self.scenario = LearningScenarioFactory(user=self.staff)
+        self.url = reverse('progress_data', kwargs={'learningscenario_id': self.scenario.id})
+
+    def test_staff_can_profile_a_request(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url + '?_profile=1')
+
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(id=response['X-Profile-Id'])
+        self.assertEqual((profile.user, profile.method, profile.status_code), (self.staff, 'GET', 200))
+        self.assertTrue(any('notes_noterecordpackage' in q['sql'] for q in profile.queries))
+        self.assertTrue(any(q['origin'].startswith('notes/') for q in profile.queries))
+        names = [m['name'] for m in profile.middleware]
+        self.assertEqual(names[0], 'config.metrics.MetricsMiddleware')
+        self.assertIn('django.middleware.security.SecurityMiddleware', names)
+        self.assertIn('config.replica.ReplicaMiddleware', names)
+        self.assertEqual(names[-1], 'view')
+        self.assertTrue(profile.file.name.startswith('profiles/'))
+        # pyinstrument's text report, or pstats' (sorted by cumulative time)
+        self.assertIn('Recorded:' if profile.profiler == 'pyinstrument' else 'cumulative', profile.summary)
+
+    async def test_staff_can_profile_over_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(self.url, headers={'X-Profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        profile = await RequestProfile.objects.aget(id=response['X-Profile-Id'])
+        self.assertTrue(any('notes_noterecordpackage' in q['sql'] for q in profile.queries))
+        self.assertEqual([m['name'] for m in profile.middleware][-1], 'view')
+
+    def test_only_staff_requests_are_profiled(self):
+        self.client.force_login(UserFactory())
+        self.client.get(self.url + '?_profile=1')
+        self.client.logout()
+        self.client.get(self.url + '?_profile=1')
+        self.client.force_login(self.staff)
+        self.client.get(self.url)
+
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_admin_shows_and_serves_profiles(self):
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.client.force_login(self.staff)
+        profile_id = self.client.get(self.url + '?_profile=1')['X-Profile-Id']
+
+        page = self.client.get(reverse('admin:config_requestprofile_change', args=[profile_id]))
+        self.assertContains(page, 'notes_noterecordpackage')
+        download = self.client.get(reverse('admin:config_requestprofile_download', args=[profile_id]))
+        self.assertEqual(download.status_code, 200)
+
+
+def scrape(client, **headers) -> dict:
+    """{'name{labels}': value} from /metrics."""
+    response = client.get(reverse('metrics'), headers=headers)
+    assert response['Content-Type'] == metrics.CONTENT_TYPE
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if line and not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+    return samples
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.user = UserFactory(is_staff=True)
+        self.scenario = LearningScenarioFactory(user=self.user)
+        self.client.force_login(self.user)
+
+    def test_local_scrape(self):
+        before = scrape(self.client)
+        self.client.get(reverse('progress_data', kwargs={'learningscenario_id': self.scenario.id}))
+        self.client.post(reverse('practice-data-batch', kwargs={'learningscenario_id': self.scenario.id}),
+                         content_type='application/json', data={'trials': [
+                             {'note': 'C', 'octave': '4', 'alter': '0', 'correct': True,
+                              'client_ts': int(time.time() * 1000) - i} for i in range(3)]})
+        after = scrape(self.client)
+
+        def grew(sample, by=1):
+            self.assertEqual(after[sample] - before.get(sample, 0), by, sample)
+
+        grew('learnmusic_http_request_duration_seconds_count{view="progress_data",method="GET",status="2xx"}')
+        grew('learnmusic_http_request_duration_seconds_bucket{view="progress_data",method="GET",status="2xx",'
+             'le="+Inf"}')
+        grew('learnmusic_http_request_queries_count{view="progress_data"}')
+        self.assertGreater(after['learnmusic_http_request_queries_sum{view="progress_data"}'],
+                           before.get('learnmusic_http_request_queries_sum{view="progress_data"}', 0))
+        grew('learnmusic_trials_ingested_total{path="batch"}', by=3)
+        grew('learnmusic_trial_batch_size_count{path="batch"}')
+        self.assertIn('learnmusic_cache_hits_total{cache="transposition_table"}', after)
+        # no broker in tests: the queue depth is left out, not an error
+        self.assertNotIn('learnmusic_huey_queue_depth', after)
+
+    def test_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            mine = scrape(self.client).get('learnmusic_trials_ingested_total{path="single"}', 0)
+            other = os.path.join(directory, 'metrics-1.json')
+            with open(other, 'w') as f:
+                json.dump({'learnmusic_trials_ingested_total': [[['single'], 5]],
+                           'learnmusic_db_pool_size': [[['default'], 4]]}, f)
+            self.assertEqual(scrape(self.client)['learnmusic_db_pool_size{db="default"}'], 4)
+
+            # a process that has gone: its counters stay, its gauges don't
+            os.utime(other, (time.time() - 3600, time.time() - 3600))
+            samples = scrape(self.client)
+            self.assertEqual(samples['learnmusic_trials_ingested_total{path="single"}'], mine + 5)
+            self.assertNotIn('learnmusic_db_pool_size{db="default"}', samples)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+        self.assertContains(response, '# TYPE learnmusic_trials_ingested_total counter')
+
+    @override_settings(METRICS_TOKEN='')
+    def test_staff_only_without_a_token(self):
+        self.client.force_login(UserFactory())
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+
+    def test_flushed_trials_are_only_counted_once(self):
+        # they were counted as path="buffered" when they were queued
+        before = scrape(self.client)
+        entries = [({'note': 'C', 'octave': '4', 'alter': '0', 'correct': True, 'reaction_time': 500,
+                     'client_ts': int(time.time() * 1000)}, None)]
+        trial_buffer.ingest_entries(self.scenario, entries)
+        after = scrape(self.client)
+        self.assertEqual(after.get('learnmusic_trials_ingested_total{path="batch"}', 0),
+                         before.get('learnmusic_trials_ingested_total{path="batch"}', 0))
+
+
+class TestQueryCheck(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.scenarios = [LearningScenarioFactory(user=self.user) for _ in range(6)]
+        for scenario in self.scenarios:
+            NoteRecordPackage.objects.create(learningscenario=scenario, log=[])
+
+    def test_fingerprint(self):
+        self.assertEqual(querycheck.fingerprint('SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s, %s, %s) AND x = \'it\'\'s\''),
+                         'SELECT "a"."id" FROM "a" WHERE "a"."id" IN (...) AND x = ?')
+        self.assertEqual(querycheck.fingerprint('SELECT * FROM t1 WHERE id = 12 LIMIT 21'),
+                         querycheck.fingerprint('SELECT * FROM t1  WHERE id = 7 LIMIT 1'))
+
+    def test_n_plus_one_is_traced_to_the_template_line(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        report = querycheck.QueryReport(view='notes-home', path='/')
+        with querycheck.recording(report):
+            # without add_history, every scenario asks for its own last practice date
+            render_to_string('notes/learning_home.html', {'learningscenarios': self.scenarios}, request)
+
+        (fingerprint, count, origin), = report.n_plus_one()
+        self.assertEqual(count, 6)
+        self.assertIn('"notes_noterecordpackage"."learningscenario_id" = ?', fingerprint)
+        self.assertRegex(origin, r'^notes/learning_home.html:\d+ via notes/models.py:\d+ in last_practiced$')
+
+    def test_notes_home_queries_do_not_grow_with_scenarios(self):
+        reports = []
+        querycheck.listeners.append(reports.append)
+        self.addCleanup(querycheck.listeners.remove, reports.append)
+        self.client.force_login(self.user)
+        self.client.get(reverse('notes-home'))
+        LearningScenarioFactory.create_batch(4, user=self.user)
+        self.client.get(reverse('notes-home'))
+
+        first, second = reports
+        self.assertEqual(len(first.queries), len(second.queries))
+        self.assertEqual(first.n_plus_one(), [])
+        self.assertFalse(second.over_budget)
+
+    @override_settings(QUERY_BUDGETS={'notes-home': 1})
+    def test_over_budget_is_logged(self):
+        request = RequestFactory().get(reverse('notes-home'))
+        request.resolver_match = resolve(request.path)
+        report = querycheck.QueryReport(view='', path=request.path)
+        with querycheck.recording(report):
+            LearningScenario.objects.count()
+            LearningScenario.objects.count()
+        with self.assertLogs('config.querycheck', 'WARNING') as logs:
+            querycheck.finish(report, request)
+        self.assertIn('notes-home (/practice/): 2 queries, budget 1', logs.output[0])
@@ -12,6 +12,7 @@ from config import views
 urlpatterns = [
     path("", views.home, name="home"),
     path("service-worker.js", views.service_worker, name="service-worker"),
+    path("metrics", views.metrics, name="metrics"),
     path(
         "about/",
         TemplateView.as_view(template_name="pages/about.html"),
@@ -3,7 +3,14 @@ from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
 from django.conf import settings
+from django.db import transaction
 from django.contrib.staticfiles.storage import staticfiles_storage
+from django.views.decorators.cache import cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import condition
+
+from config import metrics as config_metrics
+from config.service_worker import ServiceWorkerNotFound, build_service_worker
 
 from notes.instrument_data import instruments, instrument_infos
 
@@ -41,14 +48,42 @@ def test_rollbar(request):
     return HttpResponse("Hello, world. You're at the pollapp index.")
 
 
-def service_worker(request):
+def _service_worker_etag(request):
+    if settings.DEBUG:
+        # pick up edits to the worker or its assets without restarting runserver
+        build_service_worker.cache_clear()
+    try:
+        return build_service_worker().version
+    except ServiceWorkerNotFound:
+        return None
+
+
+@transaction.non_atomic_requests
+@condition(etag_func=_service_worker_etag)
+@cache_control(no_cache=True)
+async def service_worker(request):
     """Serve the service worker at the site root so its scope is '/'.
     This makes pages like /practice-try/... installable (required by PWA install criteria).
+
+    The rendered worker lives in memory (see config.service_worker); browsers revalidate it with
+    the strong ETag and get a 304 until the worker or one of its precached assets changes.
     """
-    from django.contrib.staticfiles import finders
-    file_path = finders.find("js/service-worker.js") or finders.find("service-worker.js")
-    if not file_path:
+    try:
+        build = build_service_worker()
+    except ServiceWorkerNotFound:
         return HttpResponse("// service worker not found", content_type="application/javascript", status=404)
-    with open(file_path, "rb") as f:
-        content = f.read()
-    return HttpResponse(content, content_type="application/javascript")
+    return HttpResponse(build.content, content_type="application/javascript")
+
+
+@transaction.non_atomic_requests
+@cache_control(no_store=True)
+def metrics(request):
+    """Prometheus scrape target (see config.metrics). Scrapes send METRICS_TOKEN as a bearer token;
+    without one set, only logged-in staff can read it."""
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}')
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(config_metrics.render(), content_type=config_metrics.CONTENT_TYPE)
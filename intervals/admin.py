@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import IntervalTrial
+
+
+@admin.register(IntervalTrial)
+class IntervalTrialAdmin(admin.ModelAdmin):
+    list_display = ('created', 'user', 'instrument', 'interval_name', 'direction', 'correct', 'reaction_time')
+    list_filter = ('instrument', 'correct')
+    search_fields = ('user__email',)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:02
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntervalTrial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('instrument', models.CharField(max_length=100)),
+                ('low', models.SmallIntegerField()),
+                ('semitones', models.PositiveSmallIntegerField()),
+                ('direction', models.SmallIntegerField(choices=[(1, 'Ascending'), (-1, 'Descending')], default=1)),
+                ('answer', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('correct', models.BooleanField(default=False)),
+                ('reaction_time', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interval_trials', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'instrument', 'created'], name='intervals_i_user_id_b86fa4_idx')],
+            },
+        ),
+    ]
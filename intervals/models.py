@@ -1,3 +1,40 @@
+from django.contrib.auth import get_user_model
 from django.db import models
+from model_utils.models import TimeStampedModel
 
-# Create your models here.
+from intervals.table import DOWN, INTERVAL_NAMES, UP
+
+User = get_user_model()
+
+
+class Direction(models.IntegerChoices):
+    UP = UP, 'Ascending'
+    DOWN = DOWN, 'Descending'
+
+
+class IntervalTrial(TimeStampedModel):
+    """One answer in an interval drill. Trials are only ever added, never edited."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interval_trials')
+    instrument = models.CharField(max_length=100)
+    # the pair as integer pitches (notes.pitch): low and low + semitones
+    low = models.SmallIntegerField()
+    semitones = models.PositiveSmallIntegerField()
+    direction = models.SmallIntegerField(choices=Direction.choices, default=Direction.UP)
+    answer = models.PositiveSmallIntegerField(null=True, blank=True)
+    correct = models.BooleanField(default=False)
+    reaction_time = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'instrument', 'created'])]
+
+    def __str__(self):
+        return f"{self.user} {self.interval_name} {'ok' if self.correct else 'wrong'}"
+
+    @property
+    def interval_name(self):
+        return INTERVAL_NAMES[self.semitones]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Interval trials are append-only")
+        super().save(*args, **kwargs)
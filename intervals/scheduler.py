@@ -0,0 +1,48 @@
+"""
+Choose what to drill next: the interval classes the learner gets wrong most often.
+
+Weakness is the smoothed error rate (wrong + 1) / (answered + 2) over recent trials, so an interval
+that has never been tried counts as 50% and gets tried soon. The FOCUS_CLASSES weakest classes
+share FOCUS_SHARE of the questions in proportion to their weakness; every other class the
+instrument can play shares the rest, so nothing goes unrevised for long.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils.timezone import now
+
+from intervals.models import IntervalTrial
+
+RECENT_DAYS = 30
+FOCUS_CLASSES = 3
+FOCUS_SHARE = 0.8
+
+
+def class_stats(user, instrument: str, days: int = RECENT_DAYS) -> dict[int, tuple[int, int]]:
+    """semitones -> (answered, correct) over the last `days` days."""
+    rows = (IntervalTrial.objects
+            .filter(user=user, instrument=instrument, created__gte=now() - timedelta(days=days))
+            .values('semitones')
+            .annotate(answered=Count('id'), right=Count('id', filter=Q(correct=True))))
+    return {row['semitones']: (row['answered'], row['right']) for row in rows}
+
+
+def weakness(answered: int, correct: int) -> float:
+    return (answered - correct + 1) / (answered + 2)
+
+
+def weakest_classes(stats: dict, classes, count: int = FOCUS_CLASSES) -> list[int]:
+    scored = sorted(classes, key=lambda s: (-weakness(*stats.get(s, (0, 0))), s))
+    return scored[:count]
+
+
+def drill_weights(stats: dict, classes) -> dict[int, float]:
+    classes = list(classes)
+    focus = weakest_classes(stats, classes)
+    rest = [s for s in classes if s not in focus]
+    focus_weakness = {s: weakness(*stats.get(s, (0, 0))) for s in focus}
+    total = sum(focus_weakness.values())
+    focus_share = FOCUS_SHARE if rest else 1.0
+    weights = {s: focus_share * w / total for s, w in focus_weakness.items()}
+    weights.update({s: (1 - focus_share) / len(rest) for s in rest})
+    return weights
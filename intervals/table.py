@@ -0,0 +1,90 @@
+"""
+Precomputed interval pairs per instrument, using the integer pitches from notes.pitch.
+
+`interval_table(instrument)` lists every (lower, upper) pair of playable written pitches, sorted
+by interval size, once per process. A drill is then just random rows from the slices of the
+classes being practised; nothing is enumerated per request.
+"""
+import functools
+from dataclasses import dataclass
+
+import numpy as np
+
+from notes.instrument_data import fingering_index, resolve_instrument
+from notes.pitch import pitch_name
+
+INTERVAL_NAMES = ('P1', 'm2', 'M2', 'm3', 'M3', 'P4', 'TT', 'P5', 'm6', 'M6', 'm7', 'M7', 'P8')
+# drilled interval classes: minor second up to the octave
+INTERVAL_CLASSES = tuple(range(1, len(INTERVAL_NAMES)))
+UP, DOWN = 1, -1
+
+
+@dataclass(frozen=True)
+class IntervalTable:
+    """Rows starts[s]:starts[s+1] of `low` are the lower pitches of every s-semitone pair."""
+    instrument: str
+    low: np.ndarray
+    starts: np.ndarray
+
+    def count(self, semitones: int) -> int:
+        return int(self.starts[semitones + 1] - self.starts[semitones])
+
+    def lows(self, semitones: int) -> np.ndarray:
+        return self.low[self.starts[semitones]:self.starts[semitones + 1]]
+
+    def has_pair(self, low: int, semitones: int) -> bool:
+        if semitones not in INTERVAL_CLASSES:
+            return False
+        lows = self.lows(semitones)
+        i = np.searchsorted(lows, low)
+        return i < len(lows) and lows[i] == low
+
+    @property
+    def classes(self) -> tuple[int, ...]:
+        return tuple(s for s in INTERVAL_CLASSES if self.count(s))
+
+
+def interval_table(instrument: str) -> IntervalTable | None:
+    """The shared (read-only) table for an instrument name or slug; None without fingering data."""
+    canonical = resolve_instrument(instrument)
+    return _interval_table(canonical) if canonical else None
+
+
+@functools.lru_cache(maxsize=None)
+def _interval_table(instrument: str) -> IntervalTable | None:
+    index = fingering_index(instrument)
+    if index is None:
+        return None
+    playable = np.array([index.lowest + i for i, f in enumerate(index.fingerings) if f], dtype=np.int16)
+    lows = [playable[np.isin(playable + s, playable)] if s in INTERVAL_CLASSES else playable[:0]
+            for s in range(len(INTERVAL_NAMES))]
+    starts = np.concatenate([[0], np.cumsum([len(lo) for lo in lows])])
+    low = np.concatenate(lows)
+    low.flags.writeable = False
+    starts.flags.writeable = False
+    return IntervalTable(instrument=instrument, low=low, starts=starts)
+
+
+def build_drill(table: IntervalTable, weights: dict[int, float], size: int, seed: int) -> list[dict]:
+    """`size` questions, with interval classes drawn in proportion to `weights` (semitones -> weight)."""
+    classes = np.array([s for s in table.classes if weights.get(s, 0) > 0])
+    if not len(classes):
+        return []
+    p = np.array([weights[s] for s in classes], dtype=float)
+    rng = np.random.default_rng(seed)
+    semitones = rng.choice(classes, size=size, p=p / p.sum())
+    counts = table.starts[semitones + 1] - table.starts[semitones]
+    rows = table.starts[semitones] + (rng.random(size) * counts).astype(int)
+    directions = rng.choice((UP, DOWN), size=size)
+
+    questions = []
+    for low, s, direction in zip(table.low[rows].tolist(), semitones.tolist(), directions.tolist()):
+        first, second = (low, low + s) if direction == UP else (low + s, low)
+        questions.append({
+            'low': low,
+            'semitones': s,
+            'direction': direction,
+            'name': INTERVAL_NAMES[s],
+            'notes': [pitch_name(first), pitch_name(second)],
+        })
+    return questions
@@ -1,3 +1,87 @@
+import json
+
 from django.test import TestCase
+from django.urls import reverse
+
+from intervals import scheduler
+from intervals.models import IntervalTrial
+from intervals.table import INTERVAL_CLASSES, build_drill, interval_table
+from notes.factories import UserFactory
+from notes.instrument_data import fingering_index
+
+
+class TestIntervalTable(TestCase):
+    def test_every_pair_is_playable(self):
+        table = interval_table('Trumpet')
+        index = fingering_index('Trumpet')
+        playable = {index.lowest + i for i, f in enumerate(index.fingerings) if f}
+        for s in INTERVAL_CLASSES:
+            expected = sorted(p for p in playable if p + s in playable)
+            self.assertEqual(table.lows(s).tolist(), expected)
+        self.assertIs(interval_table('trumpet'), table)
+
+    def test_drill_follows_weights(self):
+        table = interval_table('Trumpet')
+        questions = build_drill(table, {3: 1.0, 7: 1.0}, 100, seed=4)
+        self.assertEqual({q['name'] for q in questions}, {'m3', 'P5'})
+        self.assertEqual(questions, build_drill(table, {3: 1.0, 7: 1.0}, 100, seed=4))
+        for q in questions:
+            self.assertTrue(table.has_pair(q['low'], q['semitones']))
+
+    def test_unknown_instrument(self):
+        self.assertIsNone(interval_table('Kazoo'))
+
+
+class TestScheduler(TestCase):
+    def test_weakest_classes_come_first(self):
+        stats = {1: (10, 10), 2: (10, 2), 3: (10, 6)}
+        self.assertEqual(scheduler.weakest_classes(stats, [1, 2, 3], count=2), [2, 3])
+        # never tried counts as 50% wrong
+        self.assertEqual(scheduler.weakest_classes(stats, [1, 2, 3, 4], count=2), [2, 4])
+
+    def test_weights(self):
+        weights = scheduler.drill_weights({}, INTERVAL_CLASSES)
+        self.assertAlmostEqual(sum(weights.values()), 1)
+        focus = scheduler.weakest_classes({}, INTERVAL_CLASSES)
+        self.assertAlmostEqual(sum(weights[s] for s in focus), scheduler.FOCUS_SHARE)
+
+
+class TestIntervalViews(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+
+    def _post(self, trials):
+        return self.client.post(reverse('interval-trials', args=['trumpet']), data=json.dumps({'trials': trials}),
+                                content_type='application/json')
+
+    def test_trials_then_drill_focuses_on_mistakes(self):
+        table = interval_table('Trumpet')
+        low = int(table.lows(6)[0])
+        response = self._post([{'low': low, 'semitones': 6, 'answer': 7, 'reaction_time': 900}] * 5 +
+                              [{'low': low, 'semitones': 12, 'answer': 12, 'reaction_time': 400}])
+        self.assertEqual(response.json(), {'success': True, 'received': 6})
+        self.assertEqual(IntervalTrial.objects.filter(correct=False).count(), 5)
+
+        data = self.client.get(reverse('interval-drill', args=['trumpet']), {'size': 50, 'seed': 1}).json()
+        self.assertEqual(data['focus'][0], 'TT')
+        self.assertEqual(len(data['questions']), 50)
+
+        progress = self.client.get(reverse('interval-progress', args=['trumpet'])).json()
+        self.assertEqual(progress['by_interval']['labels'], ['TT', 'P8'])
+        self.assertEqual(progress['by_interval']['accuracy'], [0, 100])
+        self.assertEqual(progress['over_time']['accuracy'], [16.7])
+
+    def test_rejects_pairs_outside_the_table(self):
+        self.assertEqual(self._post([{'low': 0, 'semitones': 3, 'answer': 3}]).status_code, 400)
+        self.assertEqual(self._post([{'low': 60, 'semitones': 'x'}]).status_code, 400)
+        self.assertFalse(IntervalTrial.objects.exists())
+
+    def test_trials_are_append_only(self):
+        self._post([{'low': 60, 'semitones': 4, 'answer': 4}])
+        trial = IntervalTrial.objects.get()
+        with self.assertRaises(ValueError):
+            trial.save()
 
-# Create your tests here.
+    def test_unknown_instrument_404(self):
+        self.assertEqual(self.client.get(reverse('interval-drill', args=['kazoo'])).status_code, 404)
@@ -7,6 +7,9 @@ from . import views
 urlpatterns = [
     # Test JS URL
     # path('test-js/', TemplateView.as_view(template_name='notes/test_js.html'), name='test-js'),
+    path('intervals/<str:instrument>/drill/', views.drill, name='interval-drill'),
+    path('intervals/<str:instrument>/trials/', views.trials, name='interval-trials'),
+    path('intervals/<str:instrument>/progress/', views.progress, name='interval-progress'),
 
 
 
@@ -1,3 +1,113 @@
-from django.shortcuts import render
+import secrets
+from datetime import timedelta
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.utils.timezone import now
+from django.views.decorators.http import require_POST
+
+from intervals import scheduler
+from intervals.models import IntervalTrial
+from intervals.table import INTERVAL_NAMES, build_drill, interval_table
+from notes.rollup import DailyRollup
+from notes.serialisation import MAX_BATCH_SIZE, FastJsonResponse, PayloadError, loads
+
+DEFAULT_DRILL_SIZE = 20
+MAX_DRILL_SIZE = 200
+MAX_SEED = 2 ** 32
+
+
+def _table_or_404(instrument):
+    table = interval_table(instrument)
+    if table is None:
+        raise Http404(f"No fingering data for {instrument}")
+    return table
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        return None
+    return value if 0 <= value < maximum else None
+
+
+@login_required
+def drill(request, instrument: str):
+    """A set of interval questions, weighted towards the learner's weakest interval classes."""
+    table = _table_or_404(instrument)
+    size = _int_param(request, 'size', DEFAULT_DRILL_SIZE, MAX_DRILL_SIZE + 1)
+    seed = _int_param(request, 'seed', secrets.randbelow(MAX_SEED), MAX_SEED)
+    if size is None or seed is None:
+        return FastJsonResponse({'success': False, 'error': 'Invalid size or seed'}, status=400)
+
+    stats = scheduler.class_stats(request.user, table.instrument)
+    weights = scheduler.drill_weights(stats, table.classes)
+    return FastJsonResponse({
+        'instrument': table.instrument,
+        'seed': seed,
+        'focus': [INTERVAL_NAMES[s] for s in scheduler.weakest_classes(stats, table.classes)],
+        'questions': build_drill(table, weights, size, seed),
+    })
+
+
+def _decode_trials(body, table, user):
+    data = loads(body)
+    trials = data.get('trials') if isinstance(data, dict) else None
+    if not isinstance(trials, list):
+        raise PayloadError('Expected {"trials": [...]}')
+    if len(trials) > MAX_BATCH_SIZE:
+        raise PayloadError(f'At most {MAX_BATCH_SIZE} trials per batch')
+
+    decoded = []
+    for trial in trials:
+        if not isinstance(trial, dict):
+            raise PayloadError('Trial must be a JSON object')
+        fields = {key: trial.get(key) for key in ('low', 'semitones', 'direction', 'answer', 'reaction_time')}
+        fields['direction'] = fields['direction'] or 1
+        fields['reaction_time'] = fields['reaction_time'] or 0
+        if any(isinstance(v, bool) or not isinstance(v, (int, type(None))) for v in fields.values()):
+            raise PayloadError('Trial fields must be integers')
+        if fields['low'] is None or not table.has_pair(fields['low'], fields['semitones']):
+            raise PayloadError(f"Not an interval on this instrument: {fields['low']}+{fields['semitones']}")
+        if fields['direction'] not in (1, -1) or fields['reaction_time'] < 0:
+            raise PayloadError('Invalid direction or reaction_time')
+        if fields['answer'] is not None and not 0 <= fields['answer'] < len(INTERVAL_NAMES):
+            raise PayloadError(f"Invalid answer: {fields['answer']}")
+        decoded.append(IntervalTrial(user=user, instrument=table.instrument,
+                                     correct=fields['answer'] == fields['semitones'], **fields))
+    return decoded
+
+
+@login_required
+@require_POST
+def trials(request, instrument: str):
+    """Append answers: {"trials": [{"low", "semitones", "direction", "answer", "reaction_time"}, ...]}."""
+    table = _table_or_404(instrument)
+    try:
+        new_trials = _decode_trials(request.body, table, request.user)
+    except PayloadError as e:
+        return FastJsonResponse({'success': False, 'error': str(e)}, status=400)
+    IntervalTrial.objects.bulk_create(new_trials)
+    return FastJsonResponse({'success': True, 'received': len(new_trials)})
+
+
+def interval_rollup(rows) -> DailyRollup:
+    rollup = DailyRollup()
+    for created, semitones, correct, reaction_time in rows:
+        rollup.add(created.strftime("%Y-%m-%d"), INTERVAL_NAMES[semitones], correct, reaction_time)
+    return rollup
+
+
+@login_required
+def progress(request, instrument: str):
+    """Same payload as the notes progress chart, with intervals in place of notes."""
+    table = _table_or_404(instrument)
+    rows = (IntervalTrial.objects
+            .filter(user=request.user, instrument=table.instrument, created__gte=now() - timedelta(days=30))
+            .values_list('created', 'semitones', 'correct', 'reaction_time')
+            .iterator(chunk_size=2000))
+    order = {name: i for i, name in enumerate(INTERVAL_NAMES)}
+    data = interval_rollup(rows).chart_data(
+        'by_interval', sort_items=lambda items: dict(sorted(items.items(), key=lambda kv: order[kv[0]])))
+    return FastJsonResponse(data)
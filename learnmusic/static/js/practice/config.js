@@ -0,0 +1,16 @@
+// Per-page settings for the practice managers, rendered by the view as a JSON block
+// (see notes.views.practice_config) so these files can be served as static, cached assets.
+const practice_config = (function () {
+    const el = document.getElementById("practice-config");
+    return Object.assign({
+        key: "",
+        absolute_pitch: "",
+        clef: "treble",
+        octave: 0,
+        level: "",
+        response_count: 30,
+    }, el ? JSON.parse(el.textContent) : {});
+})();
+
+
+if (typeof module !== 'undefined') module.exports = practice_config;
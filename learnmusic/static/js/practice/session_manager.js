@@ -1,7 +1,7 @@
 const session_manager = (function () {
     let api = {};
 
-    const level = '{{ level }}';
+    const level = practice_config.level;
 
     api.current_note = undefined;
 
@@ -1,3 +1,11 @@
+// --- transposition -----------------------------------------------------------
+// Written note -> [shown, drawn (after the octave shift), stem direction], precomputed by
+// notes.transposition for this page's key, absolute pitch, octave and clef.
+const transposition_table = (function () {
+    const el = document.getElementById("transposition-table");
+    return el ? JSON.parse(el.textContent).notes : {};
+})();
+
 // --- key_adjust.js -----------------------------------------------------------
 const keyAdjust = (function () {
     const KEY_TO_SEMITONES = {
@@ -41,12 +49,14 @@ const keyAdjust = (function () {
         return `${INT_TO_SHARP[pitchInt]}/${octave}`;
     }
 
-    // NB: these two placeholders are replaced by Django in the template
-    const relativeKey = "{{ key }}";        // e.g. "Bb"
-    const currentToKey = "{{ absolute_pitch }}"; // e.g. "Bb" or empty
+    const relativeKey = practice_config.key;              // e.g. "Bb"
+    const currentToKey = practice_config.absolute_pitch;  // e.g. "Bb" or empty
 
     return function (noteStr) {
-        if ("{{ clef }}" === "bass") return noteStr;
+        const entry = transposition_table[noteStr];
+        if (entry) return entry[0];
+        // not in the table (outside the instrument range): work it out
+        if (practice_config.clef === "bass") return noteStr;
         if (!currentToKey || relativeKey === currentToKey) return noteStr;
         const shift = getSemitoneShift(relativeKey, currentToKey);
         return adjustNoteString(noteStr, shift);
@@ -64,7 +74,7 @@ const stave_manager = (function () {
     let scaleFactor = 1.0;
     const minScaleFactor = 0.5;
     const maxScaleFactor = 2.0;
-    const my_clef = "{{ clef }}";
+    const my_clef = practice_config.clef;
 
     // --------------------------------------------------------------------------------
     // We *recreate* renderer + context every time we zoom.  Therefore we keep them in
@@ -146,13 +156,20 @@ const stave_manager = (function () {
         const noteStartWithSigX = stave.getNoteStartX();
         const signatureLeftShift = Math.max(0, noteStartWithSigX - baseNoteStartX);
 
-        let transposed = keyAdjust(noteStr);
-        const stemDir = calcStemDirection(transposed);
-
-        const octave_mod = Number('{{ octave|default:0 }}');
-        if (octave_mod !== 0) {
-            const current_octave = parseInt(transposed.split('/')[1]);
-            transposed = transposed.replace(/\/\d+/, `/${current_octave + octave_mod}`);
+        let transposed, stemDir;
+        const entry = transposition_table[noteStr];
+        if (entry) {
+            transposed = entry[1];
+            stemDir = entry[2];
+        } else {
+            transposed = keyAdjust(noteStr);
+            stemDir = calcStemDirection(transposed);
+
+            const octave_mod = Number(practice_config.octave) || 0;
+            if (octave_mod !== 0) {
+                const current_octave = parseInt(transposed.split('/')[1]);
+                transposed = transposed.replace(/\/\d+/, `/${current_octave + octave_mod}`);
+            }
         }
 
         // 1. build the note with centre-alignment
@@ -0,0 +1,104 @@
+/*  Practice-history heatmap (notes home)
+    Each scenario's history arrives as a bitset from notes.models.LearningScenario.add_history: one
+    bit per day since the scenario was created, oldest first (day i is bit i % 8 of byte i / 8),
+    base64 encoded in the canvas's data-bits. The squares are drawn here, wrapping to the card's
+    width, so the page stays the same size however many days a scenario has been going.
+*/
+const practice_heatmap = (function () {
+    let api = {};
+
+    const SQUARE = 12;
+    const GAP = 3;
+    const RADIUS = 2;
+    const PRACTISED = '#2cba00';
+    const MISSED = '#ebedf0';
+    const DAY_MS = 24 * 60 * 60 * 1000;
+
+    // base64 bitset -> [practised?] for each of `days` days
+    api.decode = function (bits, days) {
+        const bytes = atob(bits);
+        const practised = new Array(days);
+        for (let day = 0; day < days; day++) {
+            practised[day] = ((bytes.charCodeAt(day >> 3) >> (day & 7)) & 1) === 1;
+        }
+        return practised;
+    };
+
+    // 'YYYY-MM-DD' of the day `day` days after `start` (dates are UTC, as on the server)
+    api.dateOf = function (start, day) {
+        return new Date(Date.parse(start + 'T00:00:00Z') + day * DAY_MS).toISOString().slice(0, 10);
+    };
+
+    // squares per row and rows for `days` squares in `width` CSS pixels
+    api.layout = function (days, width) {
+        const perRow = Math.max(1, Math.min(days, Math.floor((width + GAP) / (SQUARE + GAP))));
+        return {perRow: perRow, rows: Math.ceil(days / perRow)};
+    };
+
+    api.draw = function (canvas) {
+        const days = parseInt(canvas.dataset.days, 10) || 0;
+        const practised = api.decode(canvas.dataset.bits || '', days);
+        const grid = api.layout(days, canvas.parentElement.clientWidth);
+        const ratio = window.devicePixelRatio || 1;
+        const width = grid.perRow * (SQUARE + GAP) - GAP;
+        const height = Math.max(0, grid.rows * (SQUARE + GAP) - GAP);
+
+        canvas.style.width = width + 'px';
+        canvas.style.height = height + 'px';
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        canvas._heatmap = {practised: practised, perRow: grid.perRow};
+
+        const ctx = canvas.getContext('2d');
+        if (!ctx) return;
+        ctx.scale(ratio, ratio);
+        for (let day = 0; day < days; day++) {
+            const x = (day % grid.perRow) * (SQUARE + GAP);
+            const y = Math.floor(day / grid.perRow) * (SQUARE + GAP);
+            ctx.fillStyle = practised[day] ? PRACTISED : MISSED;
+            ctx.beginPath();
+            if (ctx.roundRect) ctx.roundRect(x, y, SQUARE, SQUARE, RADIUS);
+            else ctx.rect(x, y, SQUARE, SQUARE);
+            ctx.fill();
+        }
+    };
+
+    // the square under the pointer gets the tooltip the old per-day elements had
+    function showDay(event) {
+        const canvas = event.target;
+        const heatmap = canvas._heatmap;
+        if (!heatmap) return;
+        const rect = canvas.getBoundingClientRect();
+        const column = Math.floor((event.clientX - rect.left) / (SQUARE + GAP));
+        const row = Math.floor((event.clientY - rect.top) / (SQUARE + GAP));
+        const day = row * heatmap.perRow + column;
+        if (column >= heatmap.perRow || day < 0 || day >= heatmap.practised.length) {
+            canvas.removeAttribute('title');
+            return;
+        }
+        canvas.title = api.dateOf(canvas.dataset.start, day) + ': '
+            + (heatmap.practised[day] ? 'Practiced' : 'No practice');
+    }
+
+    api.drawAll = function () {
+        document.querySelectorAll('canvas.practice-heatmap').forEach(api.draw);
+    };
+
+    if (typeof document !== 'undefined' && typeof window !== 'undefined') {
+        document.addEventListener('DOMContentLoaded', function () {
+            api.drawAll();
+            document.querySelectorAll('canvas.practice-heatmap').forEach(function (canvas) {
+                canvas.addEventListener('mousemove', showDay);
+            });
+        });
+        let resizing = null;
+        window.addEventListener('resize', function () {
+            clearTimeout(resizing);
+            resizing = setTimeout(api.drawAll, 100);
+        });
+    }
+
+    return api;
+}());
+
+if (typeof module !== 'undefined') module.exports = practice_heatmap;
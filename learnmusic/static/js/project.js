@@ -38,6 +38,41 @@ function getInstrumentFullData(instrument, callback) {
         });
 }
 
+// Fetch the fingering index for the current instrument/key (notes.instrument_data.fingering_index).
+// Its URL is content-hashed, so the browser only ever downloads it once.
+function getFingeringIndex(url, callback, onError) {
+    fetch(url)
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok ' + response.statusText);
+            }
+            return response.json();
+        })
+        .then((data) => {
+            callback(data);
+        })
+        .catch((error) => {
+            console.error('Error fetching fingering index:', error);
+            if (onError) onError(error);
+        });
+}
+
+// 'C/4' -> 60, 'C#/4' -> 61, 'Bbb/3' -> 57 (same numbering as notes/pitch.py)
+function noteToPitch(noteString) {
+    const match = noteString.match(/^([A-Ga-g])(#{0,2}|b{0,2})\/?(-?\d+)$/);
+    if (!match) return null;
+    const letters = {C: 0, D: 2, E: 4, F: 5, G: 7, A: 9, B: 11};
+    const accidental = match[2].startsWith('#') ? match[2].length : -match[2].length;
+    return (parseInt(match[3], 10) + 1) * 12 + letters[match[1].toUpperCase()] + accidental;
+}
+
+// Fingerings for a written note, looked up by the pitch it is displayed at; null if unknown
+function lookupFingerings(index, noteString) {
+    const pitch = noteToPitch(noteString);
+    if (!index || pitch === null) return null;
+    return index.fingerings[pitch + index.shift - index.lowest] || null;
+}
+
 function fade_in(element, duration) {
     // Apply the fade-in effect
     element.style.opacity = '0'; // Start with opacity 0
@@ -2,7 +2,7 @@
  * Comprehensive tests for learning_manager.js
  */
 
-const learning_manager = require('../../../../notes/templates/js/learning_manager.js');
+const learning_manager = require('../practice/learning_manager.js');
 
 // Mock Math.random for deterministic tests
 const mockMath = Object.create(global.Math);
@@ -0,0 +1,46 @@
+/**
+ * Tests for tuning/static/tuning/js/pitch-worklet.js
+ */
+
+// the worklet runs in an AudioWorkletGlobalScope; stand in for the bits of it the file touches
+let PitchProcessor;
+global.AudioWorkletProcessor = class {
+  constructor() {
+    this.port = {postMessage: () => {}};
+  }
+};
+global.registerProcessor = (name, processor) => {
+  PitchProcessor = processor;
+};
+require('../../../../tuning/static/tuning/js/pitch-worklet.js');
+
+function sine(freq, fs, n) {
+  const x = new Float32Array(n);
+  for (let i = 0; i < n; i++) x[i] = Math.sin(2 * Math.PI * freq * i / fs);
+  return x;
+}
+
+function cents(freq, reference) {
+  return 1200 * Math.log2(freq / reference);
+}
+
+describe('PitchProcessor.mpm', () => {
+  const fs = 48000;
+  const worklet = () => new PitchProcessor({processorOptions: {sampleRate: fs}});
+
+  // low notes, so only one period fits in the lag range and the global maximum is the fundamental
+  test('interpolates between lags towards the true period', () => {
+    for (const freq of [58.27, 69.3, 87.31]) {
+      const {freq: found} = worklet().mpm(sine(freq, fs, 4096), fs);
+      expect(Math.abs(cents(found, freq))).toBeLessThan(1);
+    }
+  });
+
+  test('moves the lag the right way from the NSDF peak', () => {
+    // period 685.7 samples: the peak is at lag 686 and the true period is below it
+    const freq = fs / 685.7;
+    const {freq: found} = worklet().mpm(sine(freq, fs, 4096), fs);
+    expect(found).toBeGreaterThan(fs / 686);
+    expect(Math.abs(cents(found, freq))).toBeLessThan(1);
+  });
+});
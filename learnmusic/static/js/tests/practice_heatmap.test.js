@@ -0,0 +1,43 @@
+/**
+ * Tests for practice_heatmap.js
+ * @jest-environment jsdom
+ */
+
+const practice_heatmap = require('../practice_heatmap.js');
+
+describe('practice_heatmap', () => {
+  describe('decode', () => {
+    test('reads one bit per day, lowest bit first', () => {
+      // days 0, 2 and 9 practised: bytes 0b00000101, 0b00000010
+      const bits = btoa(String.fromCharCode(5, 2));
+      const practised = practice_heatmap.decode(bits, 10);
+      expect(practised).toEqual([true, false, true, false, false, false, false, false, false, true]);
+    });
+
+    test('ignores the padding bits of the last byte', () => {
+      expect(practice_heatmap.decode(btoa(String.fromCharCode(255)), 3)).toEqual([true, true, true]);
+    });
+  });
+
+  describe('dateOf', () => {
+    test('counts days from the start date', () => {
+      expect(practice_heatmap.dateOf('2024-02-27', 0)).toBe('2024-02-27');
+      expect(practice_heatmap.dateOf('2024-02-27', 3)).toBe('2024-03-01');
+    });
+  });
+
+  describe('layout', () => {
+    test('wraps to the width available', () => {
+      // 15px per square (12 + 3 gap), the last gap not needed
+      expect(practice_heatmap.layout(100, 297)).toEqual({perRow: 20, rows: 5});
+    });
+
+    test('a young scenario takes one short row', () => {
+      expect(practice_heatmap.layout(3, 297)).toEqual({perRow: 3, rows: 1});
+    });
+
+    test('always at least one square per row', () => {
+      expect(practice_heatmap.layout(4, 0)).toEqual({perRow: 1, rows: 4});
+    });
+  });
+});
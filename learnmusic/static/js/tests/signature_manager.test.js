@@ -10,7 +10,7 @@ const originalMath = global.Math;
 // Utility to load a fresh copy of the module each test
 function freshRequire() {
   jest.resetModules();
-  return require('../../../../notes/templates/js/signature_manager.js');
+  return require('../practice/signature_manager.js');
 }
 
 describe('signature_manager', () => {
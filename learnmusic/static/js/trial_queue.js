@@ -0,0 +1,167 @@
+/*  Offline trial queue
+    Answers are written to IndexedDB first and then posted in batches to the bulk-ingest endpoint
+    (notes.views.practice_data_batch). When the network is down they simply stay queued:
+      • pages controlled by the service worker register a Background Sync ("trial-queue") and the
+        worker replays the queue when connectivity returns;
+      • elsewhere the page flushes on load and on the 'online' event.
+    Each record keeps the CSRF token of the page that queued it; the practice page rewrites them
+    with its own (useCsrfToken) so records from before a login or logout can still be sent. A
+    group still refused after that (401, 403 or a bounce to the login page) is retried
+    MAX_ATTEMPTS times and then dropped, so stuck records can't block the ones behind them for
+    ever. Trials the server rejects as invalid are listed in its reply and dropped.
+    Loaded by the practice page and, via importScripts, by the service worker.
+*/
+const trial_queue = (function () {
+    let api = {};
+
+    const DB_NAME = 'tootology-trials';
+    const STORE = 'trials';
+    const BATCH_SIZE = 200;
+    const MAX_ATTEMPTS = 10;
+    api.SYNC_TAG = 'trial-queue';
+
+    let flushing = null;
+    let tokensRewritten = Promise.resolve();
+
+    function openDb() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore(STORE, {keyPath: 'id', autoIncrement: true});
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    // run `fn(store, setResult)` in one transaction; resolves with the result once it commits
+    function withStore(mode, fn) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const tx = db.transaction(STORE, mode);
+            let result;
+            fn(tx.objectStore(STORE), value => {
+                result = value;
+            });
+            tx.oncomplete = () => {
+                db.close();
+                resolve(result);
+            };
+            tx.onerror = tx.onabort = () => {
+                db.close();
+                reject(tx.error);
+            };
+        }));
+    }
+
+    function backgroundSyncAvailable() {
+        return typeof window !== 'undefined' && 'serviceWorker' in navigator &&
+            !!navigator.serviceWorker.controller && 'SyncManager' in window;
+    }
+
+    function readBatch() {
+        return withStore('readonly', (store, setResult) => {
+            const request = store.getAll(undefined, BATCH_SIZE);
+            request.onsuccess = () => setResult(request.result);
+        });
+    }
+
+    function removeRecords(group) {
+        return withStore('readwrite', store => group.forEach(record => store.delete(record.id)));
+    }
+
+    // count a failed attempt against each record, dropping those that have had MAX_ATTEMPTS
+    function recordAttempt(group) {
+        return withStore('readwrite', store => group.forEach(record => {
+            record.attempts = (record.attempts || 0) + 1;
+            if (record.attempts >= MAX_ATTEMPTS) store.delete(record.id);
+            else store.put(record);
+        }));
+    }
+
+    function postGroup(group) {
+        const latest = group[group.length - 1];
+        return fetch(latest.url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': latest.csrf},
+            body: JSON.stringify({trials: group.map(record => record.trial)}),
+        }).then(resp => {
+            // A redirect means we were bounced to the login page, so keep the trials for later.
+            // Other 4xx responses can never succeed; drop them rather than replaying forever.
+            // 401, 403 and login redirects count towards MAX_ATTEMPTS; server errors don't.
+            const stored = resp.ok && !resp.redirected;
+            const refused = resp.redirected || [401, 403].includes(resp.status);
+            const rejected = resp.status >= 400 && resp.status < 500 && !refused;
+            if (!stored && !rejected) {
+                const error = new Error(`trial batch not accepted (${resp.status})`);
+                if (!refused) throw error;
+                return recordAttempt(group).then(() => {
+                    throw error;
+                });
+            }
+            if (stored) {
+                resp.json().then(reply => {
+                    if (reply.rejected && reply.rejected.length) {
+                        console.log('[trial_queue] invalid trials dropped:', reply.rejected);
+                    }
+                }).catch(() => {});
+            }
+            return removeRecords(group).then(() => group.length);
+        });
+    }
+
+    function drain() {
+        return tokensRewritten.then(readBatch).then(records => {
+            if (!records.length) return;
+            // one POST per endpoint (i.e. per learning scenario)
+            const groups = {};
+            records.forEach(record => (groups[record.url] = groups[record.url] || []).push(record));
+            return Promise.all(Object.values(groups).map(postGroup)).then(() => {
+                if (records.length === BATCH_SIZE) return drain();
+            });
+        });
+    }
+
+    api.flush = function () {
+        if (!flushing) {
+            flushing = drain().finally(() => {
+                flushing = null;
+            });
+        }
+        return flushing;
+    };
+
+    // give every queued record this page's CSRF token, replacing ones a login or logout has invalidated
+    api.useCsrfToken = function (csrfToken) {
+        tokensRewritten = withStore('readwrite', store => {
+            const request = store.openCursor();
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (!cursor) return;
+                if (cursor.value.csrf !== csrfToken) cursor.update(Object.assign(cursor.value, {csrf: csrfToken}));
+                cursor.continue();
+            };
+        }).catch(err => console.log('[trial_queue] could not update queued tokens:', err));
+        return tokensRewritten;
+    };
+
+    api.enqueue = function (url, csrfToken, trial) {
+        const record = {url: url, csrf: csrfToken, trial: trial};
+        return withStore('readwrite', store => store.add(record))
+            .then(() => {
+                if (backgroundSyncAvailable()) {
+                    return navigator.serviceWorker.ready.then(reg => reg.sync.register(api.SYNC_TAG));
+                }
+                return api.flush();
+            })
+            .catch(err => console.log('[trial_queue] trials kept for later:', err));
+    };
+
+    if (typeof window !== 'undefined') {
+        const flushQuietly = () => api.flush().catch(() => {});
+        window.addEventListener('online', flushQuietly);
+        document.addEventListener('DOMContentLoaded', flushQuietly);
+    }
+
+    return api;
+}());
+
+if (typeof module !== 'undefined') module.exports = trial_queue;
@@ -5,59 +5,39 @@
                • push notifications = Notifications API
 */
 
-const VERSION         = "v10";
+/*  VERSION, OFFLINE_URL, STATIC_ASSETS and the importScripts URL below are filled in by
+    config.service_worker when the worker is served: asset URLs are the hashed ones from the
+    static manifest and VERSION is a hash of this file plus every precached asset. Add new
+    precached files there, not here. */
+const VERSION         = "__SW_VERSION__";
+const OFFLINE_URL     = "__SW_OFFLINE_URL__";
 const STATIC_CACHE    = `tootology-static-${VERSION}`;
 const DYNAMIC_CACHE   = `tootology-dynamic-${VERSION}`;
 
-const STATIC_ASSETS = [
-	"/",
-	"/static/offline.html",
-
-	/* core UI */
-	"/static/css/project.css",
-	"/static/css/sf.css",
-	"/static/js/project.js",
-	"/static/js/vexflow.js",
-
-	/* vendor dependencies (offline support) */
-	"/static/css/vendor/fontawesome.min.css",
-	"/static/css/vendor/bootstrap.min.css",
-	"/static/js/vendor/htmx.min.js",
-	"/static/js/vendor/bootstrap.bundle.min.js",
-	"/static/js/vendor/sweetalert2.min.js",
-
-	/* webfonts (Font Awesome icons) */
-	"/static/css/webfonts/fa-brands-400.woff2",
-	"/static/css/webfonts/fa-brands-400.ttf",
-	"/static/css/webfonts/fa-solid-900.woff2",
-	"/static/css/webfonts/fa-solid-900.ttf",
-	"/static/css/webfonts/fa-regular-400.woff2",
-	"/static/css/webfonts/fa-regular-400.ttf",
-
-	/* instrument data (for practice pages) */
-	"/static/instruments/trumpet.json",
-	"/static/instruments/trombone.json",
-	"/static/instruments/tuba.json",
-	"/static/instruments/tenor-horn.json",
-	"/static/instruments/soprano_trombone.json",
-	"/static/instruments/piccolo_trumpet.json",
-
-	/* icons / manifest */
-	"/static/favicon/android-chrome-192x192.png",
-	"/static/favicon/android-chrome-512x512.png",
-	"/static/favicon/favicon-32x32.png",
-	"/static/favicon/favicon-16x16.png",
-	"/static/favicon/apple-touch-icon.png",
-	"/static/favicon/site.webmanifest"
-];
+const STATIC_ASSETS = __SW_STATIC_ASSETS__;
+
+/* offline answer queue shared with the practice page (defines `trial_queue`) */
+importScripts("__SW_TRIAL_QUEUE_URL__");
 
 /* ---------- install ----------------------------------------------------- */
+/* Hashed URLs are immutable, so anything already held by an older cache is copied across
+   rather than downloaded again. Unhashed entries ("/" and any file missing from the static
+   manifest) are always refetched. */
+const isHashed = url => /\.[0-9a-f]{12}\.[^./]+$/.test(url);
+
+async function precache() {
+	const cache = await caches.open(STATIC_CACHE);
+	const toFetch = [];
+	for (const url of STATIC_ASSETS) {
+		const previous = isHashed(url) ? await caches.match(url) : undefined;
+		if (previous) await cache.put(url, previous);
+		else toFetch.push(url);
+	}
+	await cache.addAll(toFetch);
+}
+
 self.addEventListener("install", event => {
-	event.waitUntil(
-		caches.open(STATIC_CACHE)
-			.then(cache => cache.addAll(STATIC_ASSETS))
-			.then(() => self.skipWaiting())
-	);
+	event.waitUntil(precache().then(() => self.skipWaiting()));
 });
 
 /* ---------- activate ---------------------------------------------------- */
@@ -105,7 +85,7 @@ self.addEventListener("fetch", event => {
           })
           .catch((err) => {
             console.log('[SW] Network failed for HTML:', request.url, err);
-            return cached || caches.match("/static/offline.html");
+            return cached || caches.match(OFFLINE_URL);
           });
 
         // Return cached immediately if available, otherwise wait for network
@@ -139,6 +119,12 @@ self.addEventListener("fetch", event => {
 });
 
 
+/* ---------- background sync ---------------------------------------------- */
+/* Practice answers queued in IndexedDB while offline; a rejected promise makes the browser retry */
+self.addEventListener("sync", event => {
+	if (event.tag === trial_queue.SYNC_TAG) event.waitUntil(trial_queue.flush());
+});
+
 /* ---------- push -------------------------------------------------------- */
 self.addEventListener("push", event => {
 	let data = {};
@@ -1,12 +1,15 @@
 from django import forms
 from django.contrib import admin
+from django.db.models import Max, OuterRef, Subquery
 from django.utils.text import Truncator
 
-from .models import LearningScenario, NoteRecordPackage, validate_signatures_array
+from config.replica import ReplicaChangelistMixin
+
+from .models import Cohort, LearningScenario, NoteRecordPackage, PackageArchive, validate_signatures_array
 
 
 @admin.register(NoteRecordPackage)
-class NoteRecordPackageAdmin(admin.ModelAdmin):
+class NoteRecordPackageAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     # note that user and instrument are functions within NoteRecordPackage
     list_display = ('modified', 'short_log', 'user', 'learningscenario',)  # Key fields for overview
     search_fields = ('learningscenario__user__username',)  # Search for users/scenarios
@@ -18,11 +21,20 @@ class NoteRecordPackageAdmin(admin.ModelAdmin):
 
 # Custom Admin for LearningScenario
 @admin.register(LearningScenario)
-class LearningScenarioAdmin(admin.ModelAdmin):
+class LearningScenarioAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'clef', 'last_practiced', 'preview_signatures')  # Key fields for Learning Scenarios
     list_filter = ('clef', )  # Filters for related fields
     readonly_fields = ('last_practiced', 'days_old')  # Read-only computed fields
 
+    def get_queryset(self, request):
+        # last_practiced for the whole page in the one query, falling back to the newest archived
+        # month (notes.archive) for scenarios with nothing left in the package table
+        return super().get_queryset(request).annotate(
+            last_practiced_at=Max('noterecordpackage__created'),
+            last_archive_summary=Subquery(PackageArchive.objects.filter(learningscenario=OuterRef('pk'))
+                                          .order_by('-month').values('summary')[:1]),
+        )
+
     def preview_signatures(self, obj):
         # e.g. “0, 1♯, 2♭  →  C, G, Bb”
         def fmt(n):
@@ -53,3 +65,16 @@ class LearningScenarioForm(forms.ModelForm):
         data = sorted(set(int(v) for v in data))
         validate_signatures_array(data)
         return data
+
+
+@admin.register(Cohort)
+class CohortAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'created')
+    search_fields = ('name', 'owner__email')
+    filter_horizontal = ('members',)
+
+
+@admin.register(PackageArchive)
+class PackageArchiveAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ('learningscenario', 'month', 'packages', 'answers')
+    readonly_fields = ('summary',)
@@ -0,0 +1,138 @@
+"""
+Cold storage for old NoteRecordPackages.
+
+`archive_packages()` (run nightly by notes.tasks.archive_old_packages) does two things:
+
+* deletes packages that never received an answer once their 24h window has passed; and
+* moves every package from complete months older than ARCHIVE_AFTER_DAYS into one
+  PackageArchive per scenario and month: a gzipped JSON Lines file (on the default, local file
+  storage) with the packages as they were, plus the DailyRollup summary of them.
+
+Where the package table is partitioned by month (notes.partitions), the partitions those months
+leave empty are then dropped.
+
+The progress chart only looks at the last 30 days, so it never needs the archive. The notes home
+(practice heatmap, streak, last practised) reads the practised days from each archive's summary;
+exports and cohort analytics read the archived packages back with `iter_archived_packages`.
+"""
+import gzip
+import io
+from dataclasses import dataclass
+from datetime import date, timedelta, timezone as dt_timezone
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from notes import partitions, serialisation, tools
+from notes.models import PACKAGE_WINDOW_HOURS, NoteRecordPackage, PackageArchive
+from notes.rollup import rollup_packages
+
+ARCHIVE_AFTER_DAYS = 90
+
+
+@dataclass
+class ArchiveReport:
+    empty_deleted: int = 0
+    archived_packages: int = 0
+    archives: int = 0
+
+
+def _next_month(month_start):
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def archive_cutoff(now=None, days: int = ARCHIVE_AFTER_DAYS):
+    """Start of the month containing `now - days`; everything before it is archived."""
+    now = now or timezone.now()
+    return (now - timedelta(days=days)).astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0,
+                                                                          microsecond=0)
+
+
+def empty_packages(now=None):
+    """Packages whose window has closed without a single answer."""
+    now = now or timezone.now()
+    return NoteRecordPackage.objects.filter(
+        Q(log__isnull=True) | Q(log=[]),
+        created__lt=now - timedelta(hours=PACKAGE_WINDOW_HOURS),
+    )
+
+
+def _encode(packages) -> bytes:
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as f:
+        for package in packages:
+            f.write(serialisation.dumps({'id': package.id, 'created': package.created, 'log': package.log}) + b'\n')
+    return buffer.getvalue()
+
+
+def iter_archived_packages(archive: PackageArchive):
+    """The archived packages as (unsaved) NoteRecordPackage instances, oldest first."""
+    if not archive.blob:
+        return
+    with archive.blob.open('rb') as raw, gzip.GzipFile(fileobj=raw) as f:
+        for line in f:
+            data = serialisation.loads(line)
+            yield NoteRecordPackage(id=data['id'], learningscenario_id=archive.learningscenario_id,
+                                    created=parse_datetime(data['created']), log=data['log'])
+
+
+def summarise(packages) -> dict:
+    rollup = rollup_packages(packages)
+    summary = rollup.chart_data('by_note', sort_items=tools.sort_notes)
+    summary['answers'] = sum(bucket['sum_total'] for bucket in rollup.by_date.values())
+    return summary
+
+
+@transaction.atomic
+def _archive_month(scenario_id: int, month: date, packages: list) -> int:
+    archive = PackageArchive.objects.select_for_update().filter(learningscenario_id=scenario_id, month=month).first()
+    if archive is None:
+        archive = PackageArchive(learningscenario_id=scenario_id, month=month)
+    else:
+        # late arrivals for a month that was already archived: fold them in
+        packages = sorted(list(iter_archived_packages(archive)) + packages, key=lambda p: p.created)
+        # the new blob gets its own name; the old one goes only once this is committed
+        storage, old_blob = archive.blob.storage, archive.blob.name
+        transaction.on_commit(lambda: storage.delete(old_blob))
+
+    summary = summarise(packages)
+    archive.packages = len(packages)
+    archive.answers = summary['answers']
+    archive.summary = summary
+    archive.blob.save(f'scenario-{scenario_id}-{month:%Y-%m}.jsonl.gz', ContentFile(_encode(packages)), save=False)
+    archive.save()
+    # only delete rows that are still live (late arrivals were read back from the blob)
+    NoteRecordPackage.objects.filter(id__in=[p.id for p in packages]).delete()
+    return len(packages)
+
+
+def archive_packages(now=None, days: int = ARCHIVE_AFTER_DAYS, dry_run: bool = False) -> ArchiveReport:
+    report = ArchiveReport()
+    now = now or timezone.now()
+
+    empty = empty_packages(now)
+    if dry_run:
+        report.empty_deleted = empty.count()
+    else:
+        report.empty_deleted, _ = empty.delete()
+
+    old = NoteRecordPackage.objects.filter(created__lt=archive_cutoff(now, days))
+    months = (old.annotate(month=TruncMonth('created', tzinfo=dt_timezone.utc))
+              .values_list('learningscenario_id', 'month')
+              .distinct()
+              .order_by('learningscenario_id', 'month'))
+    # one scenario-month in memory at a time
+    for scenario_id, month_start in months:
+        packages = list(old.filter(learningscenario_id=scenario_id, created__gte=month_start,
+                                   created__lt=_next_month(month_start)).order_by('created'))
+        report.archives += 1
+        report.archived_packages += len(packages) if dry_run else _archive_month(scenario_id, month_start.date(),
+                                                                                  packages)
+    if not dry_run:
+        # archived months leave empty partitions behind (when the table is partitioned)
+        partitions.drop_empty_partitions(before=archive_cutoff(now, days).date())
+    return report
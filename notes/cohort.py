@@ -0,0 +1,183 @@
+"""
+Analytics across a cohort of learners: how hard each note is, median reaction times and how
+accuracy improves with practice (mastery curve).
+
+Packages (archived months read back from their blobs) are streamed into a CohortAggregate
+whose size depends only on the number of distinct notes and practice days, never on the number
+of answers: reaction times go into fixed log-spaced histogram bins instead of lists, so medians
+are approximate (within one bin, about 5%). Aggregates merge, so per-learner results can be
+combined in any order. The finished payload is cached per cohort per day.
+"""
+import hashlib
+import heapq
+from datetime import date
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from config import metrics
+from notes import tools
+from notes.archive import iter_archived_packages
+from notes.models import NoteRecordPackage, PackageArchive
+from notes.rollup import iter_log
+
+PACKAGE_CHUNK_SIZE = 500
+# Reaction time histogram: 96 log-spaced bins from 100ms to 60s (anything outside is clamped)
+RT_EDGES = np.geomspace(100, 60_000, 97)
+# Mastery curves stop after this many practice days
+MAX_PRACTICE_DAYS = 60
+CACHE_SECONDS = 24 * 60 * 60
+
+
+def _rt_bin(reaction_time) -> int:
+    return int(np.clip(np.searchsorted(RT_EDGES, reaction_time or 0, side='right') - 1, 0, len(RT_EDGES) - 2))
+
+
+def histogram_median(counts) -> float:
+    """Median of a reaction time histogram, interpolated (geometrically) within its bin."""
+    counts = np.asarray(counts)
+    total = counts.sum()
+    if not total:
+        return 0
+    cumulative = np.cumsum(counts)
+    i = int(np.searchsorted(cumulative, total / 2))
+    before = cumulative[i] - counts[i]
+    fraction = (total / 2 - before) / counts[i]
+    return float(RT_EDGES[i] * (RT_EDGES[i + 1] / RT_EDGES[i]) ** fraction)
+
+
+class _Counts:
+    __slots__ = ('correct', 'total', 'rt')
+
+    def __init__(self):
+        self.correct = 0
+        self.total = 0
+        self.rt = np.zeros(len(RT_EDGES) - 1, dtype=np.int64)
+
+    def add(self, correct, reaction_time):
+        self.total += 1
+        if correct:
+            self.correct += 1
+        self.rt[_rt_bin(reaction_time)] += 1
+
+    def merge(self, other):
+        self.correct += other.correct
+        self.total += other.total
+        self.rt += other.rt
+
+    @property
+    def accuracy(self):
+        return round(self.correct / self.total * 100, 1) if self.total else 0
+
+
+class CohortAggregate:
+    """Mergeable per-note and per-practice-day counts for any number of learners."""
+
+    def __init__(self):
+        self.by_note = {}
+        self.by_day = {}  # 1-based practice day of the scenario -> counts
+        self.learners = set()
+        self.packages = 0
+
+    def add_package(self, package, practice_day: int, learner):
+        self.packages += 1
+        self.learners.add(learner)
+        day = self.by_day.setdefault(min(practice_day, MAX_PRACTICE_DAYS), _Counts())
+        for note_name, answers in iter_log(package.log):
+            note = self.by_note.setdefault(note_name, _Counts())
+            for correct, reaction_time in answers:
+                note.add(correct, reaction_time)
+                day.add(correct, reaction_time)
+
+    def merge(self, other: 'CohortAggregate'):
+        for mine, theirs in ((self.by_note, other.by_note), (self.by_day, other.by_day)):
+            for key, counts in theirs.items():
+                mine.setdefault(key, _Counts()).merge(counts)
+        self.learners |= other.learners
+        self.packages += other.packages
+        return self
+
+    def as_dict(self) -> dict:
+        notes = tools.sort_notes(self.by_note)
+        days = sorted(self.by_day)
+        return {
+            'learners': len(self.learners),
+            'packages': self.packages,
+            'by_note': {
+                'labels': list(notes),
+                'answers': [notes[n].total for n in notes],
+                # share of wrong answers: 0 = always right, 100 = always wrong
+                'difficulty': [round(100 - notes[n].accuracy, 1) if notes[n].total else 0 for n in notes],
+                'reaction_time': [round(histogram_median(notes[n].rt)) for n in notes],
+            },
+            'mastery': {
+                'practice_day': days,
+                'accuracy': [self.by_day[d].accuracy for d in days],
+                'reaction_time': [round(histogram_median(self.by_day[d].rt)) for d in days],
+            },
+        }
+
+
+def aggregate_packages(packages) -> CohortAggregate:
+    """Fold packages, ordered by (learningscenario, created), into one aggregate.
+
+    A scenario's practice day counts the distinct days it has packages on, so day 1 is the
+    first day each learner practised it.
+    """
+    aggregate = CohortAggregate()
+    scenario = last_day = None
+    practice_day = 0
+    for package in packages:
+        if package.learningscenario_id != scenario:
+            scenario, last_day, practice_day = package.learningscenario_id, None, 0
+        day = package.created.date()
+        if day != last_day:
+            last_day = day
+            practice_day += 1
+        aggregate.add_package(package, practice_day, package.learningscenario.user_id)
+    return aggregate
+
+
+def _archived_packages(archives):
+    for archive in archives:
+        for package in iter_archived_packages(archive):
+            package.learningscenario = archive.learningscenario
+            yield package
+
+
+def cohort_packages(cohort):
+    """The cohort's packages, archived ones (read back one month at a time) included, ordered by
+    (learningscenario, created)."""
+    live = (NoteRecordPackage.objects
+            .filter(learningscenario__user__in=cohort.members.all())
+            .select_related('learningscenario')
+            .only('created', 'log', 'learningscenario__id', 'learningscenario__user_id')
+            .order_by('learningscenario_id', 'created')
+            .iterator(chunk_size=PACKAGE_CHUNK_SIZE))
+    archives = (PackageArchive.objects
+                .filter(learningscenario__user__in=cohort.members.all())
+                .select_related('learningscenario')
+                .only('blob', 'learningscenario__id', 'learningscenario__user_id')
+                .order_by('learningscenario_id', 'month')
+                .iterator(chunk_size=PACKAGE_CHUNK_SIZE))
+    return heapq.merge(_archived_packages(archives), live,
+                       key=lambda package: (package.learningscenario_id, package.created))
+
+
+def _cache_key(cohort, day: date) -> str:
+    members = ','.join(str(pk) for pk in cohort.members.order_by('pk').values_list('pk', flat=True))
+    digest = hashlib.sha1(members.encode()).hexdigest()[:12]
+    return f'cohort-analytics:{cohort.pk}:{day.isoformat()}:{digest}'
+
+
+def cohort_analytics(cohort, day: date | None = None) -> dict:
+    """The cohort's analytics payload, computed at most once per day (or when membership changes)."""
+    day = day or timezone.localdate()
+    key = _cache_key(cohort, day)
+    payload = cache.get(key)
+    metrics.record_cache('cohort_analytics', payload is not None)
+    if payload is None:
+        payload = aggregate_packages(cohort_packages(cohort)).as_dict()
+        cache.set(key, payload, CACHE_SECONDS)
+    return payload
@@ -0,0 +1,187 @@
+"""
+Export every answer in a learner's history, one row per trial, as CSV or Parquet.
+
+Packages are read `EXPORT_CHUNK_SIZE` at a time and rows are written as they are produced, so
+the full history is never in memory. CSV can be streamed straight into the response; Parquet
+(which needs pyarrow) is written to a temporary file in record batches. Under ASGI the response
+gets an async iterator (`aiter_sync`): given a sync one, Django would list() all of it before
+sending the first byte. Histories with more than INLINE_EXPORT_PACKAGES packages are built by a
+huey task (notes.tasks.build_trial_export) into a TrialExport the user downloads later.
+"""
+import csv
+import io
+import tempfile
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.files import File
+from django.db.models import Sum
+
+from notes.archive import iter_archived_packages
+from notes.models import ExportFormat, ExportStatus, NoteRecordPackage, PackageArchive, TrialExport
+from notes.rollup import iter_log
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - exercised only where pyarrow is missing
+    pyarrow = None
+
+EXPORT_CHUNK_SIZE = 200
+# CSV rows per piece of a streamed response
+CSV_BATCH_ROWS = 500
+FILE_BLOCK_SIZE = 64 * 1024
+# rows per Parquet record batch / row group
+PARQUET_BATCH_ROWS = 50_000
+INLINE_EXPORT_PACKAGES = 2000
+
+EXPORT_COLUMNS = ('learningscenario_id', 'instrument', 'package_id', 'package_created', 'note', 'alter', 'octave',
+                  'attempt', 'correct', 'reaction_time')
+CONTENT_TYPES = {ExportFormat.CSV: 'text/csv', ExportFormat.PARQUET: 'application/vnd.apache.parquet'}
+
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+
+def export_packages(user, learningscenario=None):
+    packages = NoteRecordPackage.objects.filter(learningscenario__user=user)
+    if learningscenario is not None:
+        packages = packages.filter(learningscenario=learningscenario)
+    return packages.order_by('learningscenario_id', 'created')
+
+
+def export_archives(user, learningscenario=None):
+    archives = PackageArchive.objects.filter(learningscenario__user=user)
+    if learningscenario is not None:
+        archives = archives.filter(learningscenario=learningscenario)
+    return archives
+
+
+def history_size(user, learningscenario=None) -> int:
+    """Number of packages (live and archived) an export would read."""
+    archived = export_archives(user, learningscenario).aggregate(total=Sum('packages'))['total'] or 0
+    return export_packages(user, learningscenario).count() + archived
+
+
+def _package_rows(scenario_id, instrument, package_id, created, log):
+    for item, (_label, answers) in zip(log or [], iter_log(log)):
+        for attempt, (correct, reaction_time) in enumerate(answers, start=1):
+            yield (scenario_id, instrument or '', package_id, created, item.get('note', ''),
+                   item.get('alter', ''), item.get('octave', ''), attempt,
+                   None if correct is None else bool(correct), int(reaction_time or 0))
+
+
+def iter_rows(packages):
+    """One tuple (see EXPORT_COLUMNS) per answer, reading packages in chunks."""
+    rows = packages.values_list('learningscenario_id', 'learningscenario__instrument_name', 'id', 'created', 'log')
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield from _package_rows(*row)
+
+
+def iter_archived_rows(user, learningscenario=None):
+    """Rows for packages that notes.archive has moved to cold storage, one archive file at a time."""
+    archives = export_archives(user, learningscenario).select_related('learningscenario')
+    for archive in archives.order_by('learningscenario_id', 'month').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        for package in iter_archived_packages(archive):
+            yield from _package_rows(archive.learningscenario_id, archive.learningscenario.instrument_name,
+                                     package.id, package.created, package.log)
+
+
+def history_rows(user, learningscenario=None):
+    """Every answer: archived months first, then the live packages."""
+    yield from iter_archived_rows(user, learningscenario)
+    yield from iter_rows(export_packages(user, learningscenario))
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """CSV for StreamingHttpResponse, CSV_BATCH_ROWS lines at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    rows = iter(rows)
+    while batch := list(islice(rows, CSV_BATCH_ROWS)):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def iter_file(file):
+    """A (temporary) file's contents in blocks, closing it at the end."""
+    with file:
+        while block := file.read(FILE_BLOCK_SIZE):
+            yield block
+
+
+async def aiter_sync(iterator):
+    """An async iterator over a sync one (ORM reads, file reads), each step run by sync_to_async."""
+    iterator = iter(iterator)
+    step = sync_to_async(next)
+    done = object()
+    try:
+        while (item := await step(iterator, done)) is not done:
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def write_csv(rows, file):
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ('learningscenario_id', pyarrow.int64()),
+        ('instrument', pyarrow.string()),
+        ('package_id', pyarrow.int64()),
+        ('package_created', pyarrow.timestamp('us', tz='UTC')),
+        ('note', pyarrow.string()),
+        ('alter', pyarrow.string()),
+        ('octave', pyarrow.string()),
+        ('attempt', pyarrow.int32()),
+        ('correct', pyarrow.bool_()),
+        ('reaction_time', pyarrow.int32()),
+    ])
+
+
+def write_parquet(rows, file):
+    if pyarrow is None:
+        raise RuntimeError('Parquet export needs pyarrow')
+    schema = _parquet_schema()
+    rows = iter(rows)
+    with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+        while batch := list(islice(rows, PARQUET_BATCH_ROWS)):
+            columns = dict(zip(EXPORT_COLUMNS, (list(column) for column in zip(*batch))))
+            writer.write_batch(pyarrow.RecordBatch.from_pydict(columns, schema=schema))
+
+
+def export_to_tempfile(rows, export_format):
+    """The export written to a temporary file (rewound), for FileResponse or saving."""
+    file = tempfile.TemporaryFile(mode='w+b')
+    if export_format == ExportFormat.CSV:
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        write_csv(rows, text)
+        text.detach()
+    else:
+        write_parquet(rows, file)
+    file.seek(0)
+    return file
+
+
+def build_trial_export(export: TrialExport):
+    """Write a queued export's file and mark it done (or failed)."""
+    try:
+        with export_to_tempfile(history_rows(export.user, export.learningscenario), export.format) as file:
+            export.file.save(export.filename(), File(file), save=False)
+        export.status = ExportStatus.DONE
+    except Exception as e:
+        export.status = ExportStatus.FAILED
+        export.error = str(e)[:200]
+        raise
+    finally:
+        export.save()
@@ -0,0 +1,193 @@
+"""
+Bulk import of trial history (JSON Lines or CSV) into a learning scenario.
+
+Each row is one answer: note, alter, octave, correct, reaction_time and a time, given as
+`client_ts` (ms since the epoch), `timestamp` or `package_created` (ISO 8601). CSV files written
+by notes.export can be imported as they are. Rows are validated a chunk at a time against the
+precomputed NOTE_VOCABULARY; bad rows are skipped and reported. Valid rows are grouped into one
+NoteRecordPackage per (UTC) day, dated at that day's first answer. Each chunk is written before
+the next is read (bulk_create for new days, bulk_update for days an earlier chunk already wrote),
+so memory depends on the chunk size rather than the file's; the whole import is one transaction.
+Days are not merged into packages the scenario already had before the import.
+"""
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from notes.models import NoteRecordPackage
+from notes.serialisation import NOTE_VOCABULARY, PayloadError, TrialPost, loads
+
+VALIDATE_CHUNK_ROWS = 5000
+# uploads are imported in the request, so keep them to a size that finishes in one
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+BULK_CREATE_BATCH = 500
+MAX_REPORTED_ERRORS = 20
+FORMATS = ('jsonl', 'csv')
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    packages: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def error(self, line: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+    def as_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'packages': self.packages,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second),
+            'errors': self.errors,
+        }
+
+
+def guess_format(name: str, first_line: str) -> str:
+    if name.lower().endswith(('.jsonl', '.ndjson', '.json')) or first_line.lstrip().startswith('{'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(text_file, file_format: str):
+    """(line number, dict) for every row of a text file."""
+    if file_format == 'csv':
+        reader = csv.DictReader(text_file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(text_file, start=1):
+        if line.strip():
+            try:
+                yield line_number, loads(line)
+            except PayloadError as e:
+                yield line_number, e
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('', 'none', 'null'):
+            return None
+        if value in ('true', '1', 'yes'):
+            return True
+        if value in ('false', '0', 'no'):
+            return False
+    return value
+
+
+def _when(row) -> datetime:
+    client_ts = row.get('client_ts')
+    if client_ts not in (None, ''):
+        try:
+            return datetime.fromtimestamp(int(client_ts) / 1000, tz=dt_timezone.utc)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise PayloadError(f'Invalid client_ts: {client_ts!r}') from e
+    value = row.get('timestamp') or row.get('package_created')
+    when = parse_datetime(value) if isinstance(value, str) else None
+    if when is None:
+        raise PayloadError('Row needs a client_ts, timestamp or package_created')
+    return when.astimezone(dt_timezone.utc) if timezone.is_aware(when) else timezone.make_aware(when, dt_timezone.utc)
+
+
+def validate_row(row) -> tuple[datetime, dict]:
+    if not isinstance(row, dict):
+        raise PayloadError('Row must be an object')
+    trial = TrialPost.from_dict({
+        'note': row.get('note'),
+        'alter': row.get('alter') or '0',
+        'octave': row.get('octave'),
+        'correct': _parse_bool(row.get('correct', False)),
+        'reaction_time': row.get('reaction_time'),
+    })
+    if (trial.note, trial.alter, trial.octave) not in NOTE_VOCABULARY:
+        raise PayloadError(f'Note out of range: {trial.note}{trial.octave}')
+    return _when(row), trial.as_dict()
+
+
+def _write_chunk(learningscenario, valid, written: dict, report: ImportReport):
+    """One chunk's answers: new days are bulk-created, days an earlier chunk wrote are folded in."""
+    by_day = {}
+    for when, trial in valid:
+        by_day.setdefault(when.date(), []).append((when, trial))
+    earlier = NoteRecordPackage.objects.in_bulk([written[day] for day in by_day if day in written])
+
+    created, updated = [], []
+    for day, day_trials in by_day.items():
+        day_trials.sort(key=lambda pair: pair[0])
+        package = earlier.get(written.get(day))
+        if package is None:
+            package = NoteRecordPackage(learningscenario=learningscenario, created=day_trials[0][0], log=[])
+            created.append((day, package))
+        else:
+            package.created = min(package.created, day_trials[0][0])
+            updated.append(package)
+        for _, trial in day_trials:
+            package._apply_result(trial)
+        report.imported += len(day_trials)
+
+    NoteRecordPackage.objects.bulk_create([package for _, package in created], batch_size=BULK_CREATE_BATCH)
+    NoteRecordPackage.objects.bulk_update(updated, ['created', 'log'], batch_size=BULK_CREATE_BATCH)
+    for day, package in created:
+        written[day] = package.id
+
+
+def import_trials(learningscenario, rows, report: ImportReport | None = None) -> ImportReport:
+    """Validate (line, row) pairs chunk by chunk, writing each chunk's days as it goes."""
+    report = report or ImportReport()
+    started = time.perf_counter()
+    latest_allowed = timezone.now()
+    # {day: id of the package this import wrote for it}
+    written = {}
+    rows = iter(rows)
+    with transaction.atomic():
+        while chunk := list(islice(rows, VALIDATE_CHUNK_ROWS)):
+            report.rows += len(chunk)
+            valid = []
+            for line, row in chunk:
+                if isinstance(row, Exception):
+                    report.error(line, str(row))
+                    continue
+                try:
+                    when, trial = validate_row(row)
+                except PayloadError as e:
+                    report.error(line, str(e))
+                    continue
+                # never file an answer in the future
+                valid.append((min(when, latest_allowed), trial))
+            _write_chunk(learningscenario, valid, written, report)
+    report.packages = len(written)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def import_file(learningscenario, binary_file, name: str = '', file_format: str | None = None) -> ImportReport:
+    """Raises PayloadError (and imports nothing) if the file isn't UTF-8 text."""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        if file_format is None:
+            first_line = text.readline()
+            text.seek(0)
+            file_format = guess_format(name, first_line)
+        return import_trials(learningscenario, read_rows(text, file_format))
+    except UnicodeDecodeError as e:
+        raise PayloadError('File is not UTF-8 text (save it as UTF-8 CSV or JSON Lines).') from e
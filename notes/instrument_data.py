@@ -1,11 +1,17 @@
 """
 Module for loading and processing instrument data from JSON files.
 """
+import functools
+import hashlib
 import json
 import os
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
 from django.conf import settings
 
+from notes import pitch
+
 
 def _get_instruments_dir() -> str:
     """Resolve the directory where instrument JSON files live."""
@@ -106,16 +112,72 @@ def get_instrument_range(instrument: str, level: str):
     return level_data.get("lowest_note"), level_data.get("highest_note")
 
 
+_NO_FINGERINGS = MappingProxyType({})
+
+
 def get_fingerings(instrument: str):
-    """Get the fingerings for an instrument."""
+    """Get the fingerings for an instrument, as a read-only view of the loaded data (no copy)."""
     canonical = resolve_instrument(instrument)
     if not canonical:
-        return {}
+        return _NO_FINGERINGS
     instrument_data = INSTRUMENTS.get(canonical)
     if not instrument_data:
-        return {}
-    fingerings = instrument_data.get("fingerings", {})
-    return dict(fingerings)
+        return _NO_FINGERINGS
+    return MappingProxyType(instrument_data.get("fingerings", {}))
+
+
+@dataclass(frozen=True)
+class FingeringIndex:
+    """Fingerings by integer pitch (see notes.pitch) of the note as displayed after keyAdjust.
+
+    `fingerings[p - lowest]` holds the fingerings for displayed pitch p, or None where the
+    instrument has no entry. `content` is the JSON the practice page downloads and `digest`
+    (a hash of that content) goes in its URL, so the file can be cached forever.
+    """
+    instrument: str
+    slug: str
+    shift: int
+    lowest: int
+    fingerings: tuple[tuple[str, ...] | None, ...]
+    content: bytes
+    digest: str
+    by_pitch: MappingProxyType = field(repr=False)
+
+    def get(self, displayed_pitch: int):
+        return self.by_pitch.get(displayed_pitch)
+
+
+# instruments x keys x displayed pitches actually in use is a few hundred at most
+@functools.lru_cache(maxsize=512)
+def fingering_index(instrument: str, relative_key: str = "", absolute_pitch: str = "") -> FingeringIndex | None:
+    """Build (once per process) the fingering index for an instrument played in relative_key and
+    displayed at absolute_pitch. Enharmonic spellings collapse onto one pitch."""
+    canonical = resolve_instrument(instrument)
+    if not canonical:
+        return None
+
+    shift = pitch.key_shift(relative_key, absolute_pitch)
+    by_pitch = {}
+    for note, note_fingerings in INSTRUMENTS[canonical].get("fingerings", {}).items():
+        merged = by_pitch.setdefault(pitch.parse_pitch(note) + shift, [])
+        merged.extend(f for f in note_fingerings if f not in merged)
+    if not by_pitch:
+        return None
+
+    lowest, highest = min(by_pitch), max(by_pitch)
+    fingerings = tuple(tuple(by_pitch[p]) if p in by_pitch else None for p in range(lowest, highest + 1))
+    content = json.dumps({"instrument": canonical, "shift": shift, "lowest": lowest, "fingerings": fingerings},
+                         separators=(",", ":")).encode()
+    return FingeringIndex(
+        instrument=canonical,
+        slug=_instrument_slug(canonical),
+        shift=shift,
+        lowest=lowest,
+        fingerings=fingerings,
+        content=content,
+        digest=hashlib.sha256(content).hexdigest()[:12],
+        by_pitch=MappingProxyType({p: f for p, f in enumerate(fingerings, start=lowest) if f is not None}),
+    )
 
 
 # For backward compatibility with the existing code
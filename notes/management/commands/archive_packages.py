@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from notes.archive import ARCHIVE_AFTER_DAYS, archive_cutoff, archive_packages
+
+
+class Command(BaseCommand):
+    help = "Delete empty NoteRecordPackages and archive old ones into monthly PackageArchives"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help="Archive complete months older than this many days")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be done")
+
+    def handle(self, *args, **options):
+        report = archive_packages(days=options['days'], dry_run=options['dry_run'])
+        verb = "Would" if options['dry_run'] else "Did"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} delete {report.empty_deleted} empty packages and archive {report.archived_packages} packages "
+            f"from before {archive_cutoff(days=options['days']):%Y-%m-%d} into {report.archives} monthly archives"))
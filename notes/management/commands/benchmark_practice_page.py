@@ -0,0 +1,65 @@
+import gzip
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+INLINE_SCRIPT = re.compile(rb'<script(?![^>]*\bsrc=)[^>]*>(.*?)</script>', re.S)
+SCRIPT_SRC = re.compile(rb'<script[^>]*\bsrc="([^"]+)"')
+
+
+def page_stats(html: bytes) -> dict:
+    """Sizes (bytes) of a rendered page: raw, gzipped, inline <script> bodies and local static scripts."""
+    static = 0
+    for src in SCRIPT_SRC.findall(html):
+        src = src.decode()
+        if src.startswith(settings.STATIC_URL):
+            path = finders.find(src[len(settings.STATIC_URL):])
+            static += len(open(path, 'rb').read()) if path else 0
+    return {
+        'html': len(html),
+        'gzip': len(gzip.compress(html)),
+        'inline_js': sum(len(body) for body in INLINE_SCRIPT.findall(html)),
+        'static_js': static,
+    }
+
+
+class Command(BaseCommand):
+    help = ("Render the practice page (the no-login practice-try version) and report HTML size, inline and "
+            "static (cacheable) JavaScript and render time per level.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instrument', default='Trumpet')
+        parser.add_argument('--clef', default='treble')
+        parser.add_argument('--key', default='Bb')
+        parser.add_argument('--levels', default='beginner,intermediate,advanced', help="comma separated levels")
+        parser.add_argument('--iterations', type=int, default=20)
+
+    # RequestFactory requests come from 'testserver'
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        self.stdout.write(f"{'level':<14}{'html KB':>9}{'gzip KB':>9}{'inline JS KB':>14}{'static JS KB':>14}"
+                          f"{'render ms':>11}")
+        for level in [lv for lv in options['levels'].split(',') if lv]:
+            url = reverse('practice-try-sigs', kwargs={'instrument': options['instrument'], 'clef': options['clef'],
+                                                       'key': options['key'], 'level': level, 'octave': '0',
+                                                       'signatures': '0'})
+            match = resolve(url)
+            timings = []
+            for _ in range(max(options['iterations'], 1)):
+                request = factory.get(url)
+                request.user = AnonymousUser()
+                started = time.perf_counter()
+                response = match.func(request, *match.args, **match.kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            stats = page_stats(response.content)
+            self.stdout.write(f"{level:<14}{stats['html'] / 1024:>9.1f}{stats['gzip'] / 1024:>9.1f}"
+                              f"{stats['inline_js'] / 1024:>14.1f}{stats['static_js'] / 1024:>14.1f}"
+                              f"{statistics.median(timings):>11.1f}")
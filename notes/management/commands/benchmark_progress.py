@@ -0,0 +1,70 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from notes import progress
+from notes.models import LearningScenario, NoteRecordPackage, User
+
+NOTES = [(note, octave, alter) for octave in ('3', '4', '5') for note in 'CDEFGAB' for alter in ('-1', '0', '1')]
+
+
+def synthetic_log(rng: random.Random, notes: int, answers: int) -> list:
+    log = []
+    for note, octave, alter in rng.sample(NOTES, notes):
+        correct = [rng.random() < 0.8 for _ in range(answers)]
+        log.append({'note': note, 'octave': octave, 'alter': alter, 'correct': correct,
+                    'reaction_time_log': [rng.randint(300, 4000) for _ in range(answers)], 'n': answers})
+    return log
+
+
+class Command(BaseCommand):
+    help = ("Time the progress chart aggregation (notes.progress) in Python and, on PostgreSQL, in SQL over "
+            "synthetic packages, and check both give the same payload. Nothing is kept.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=1000)
+        parser.add_argument('--notes', type=int, default=20, help="notes per package")
+        parser.add_argument('--answers', type=int, default=10, help="answers per note")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not 0 < options['notes'] <= len(NOTES):
+            raise CommandError(f"--notes must be between 1 and {len(NOTES)}")
+        rng = random.Random(options['seed'])
+        backends = [b for b in progress.BACKENDS if b == 'python' or progress.sql_available()]
+
+        with transaction.atomic():
+            user = User.objects.create(email=f'benchmark-progress-{time.time_ns()}@example.com')
+            scenario = LearningScenario.objects.create(user=user, instrument_name='Trumpet')
+            start = timezone.now() - timedelta(days=30)
+            packages = [NoteRecordPackage(learningscenario=scenario, created=start + timedelta(hours=i * 0.7),
+                                          log=synthetic_log(rng, options['notes'], options['answers']))
+                        for i in range(options['packages'])]
+            NoteRecordPackage.objects.bulk_create(packages, batch_size=500)
+            queryset = NoteRecordPackage.objects.filter(learningscenario=scenario)
+
+            results = {}
+            for backend in backends:
+                timings = []
+                for _ in range(max(options['repeat'], 1)):
+                    started = time.perf_counter()
+                    results[backend] = progress.progress_chart_data(queryset, backend=backend)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(f"{backend:<8} median {statistics.median(timings):8.1f} ms   "
+                                  f"best {min(timings):8.1f} ms")
+            transaction.set_rollback(True)
+
+        answers = options['packages'] * options['notes'] * options['answers']
+        self.stdout.write(f"{options['packages']} packages, {answers} answers")
+        if len(results) > 1:
+            same = results['sql'] == results['python']
+            self.stdout.write(self.style.SUCCESS("identical payloads") if same else
+                              self.style.ERROR("payloads differ"))
+        else:
+            self.stdout.write("SQL backend needs PostgreSQL; timed Python only")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.importer import FORMATS, import_file
+from notes.models import LearningScenario
+from notes.serialisation import PayloadError
+
+
+class Command(BaseCommand):
+    help = "Import a JSON Lines or CSV file of trials into a LearningScenario, one package per day"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import (.jsonl or .csv, e.g. from /export/trials/)")
+        parser.add_argument('learningscenario_id', type=int)
+        parser.add_argument('--format', choices=FORMATS, help="Default: guessed from the file")
+
+    def handle(self, *args, **options):
+        learningscenario = LearningScenario.objects.filter(id=options['learningscenario_id']).first()
+        if learningscenario is None:
+            raise CommandError(f"No LearningScenario {options['learningscenario_id']}")
+        try:
+            with open(options['path'], 'rb') as f:
+                report = import_file(learningscenario, f, options['path'], options['format'])
+        except (OSError, PayloadError) as e:
+            raise CommandError(str(e)) from e
+
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.imported} of {report.rows} rows into {report.packages} packages "
+            f"in {report.seconds:.2f}s ({report.rows_per_second:,.0f} rows/s); skipped {report.skipped}"))
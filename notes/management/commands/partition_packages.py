@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from notes.partitions import PARTITIONS_AHEAD, ensure_partitions, is_partitioned, partition_table
+
+
+class Command(BaseCommand):
+    help = ("PostgreSQL: rebuild the NoteRecordPackage table partitioned by month (if it isn't already) "
+            "and create partitions for the coming months")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=PARTITIONS_AHEAD, help="Months of partitions to create ahead")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning needs PostgreSQL")
+        with transaction.atomic():
+            rebuilt = partition_table(ahead=options['ahead'])
+            created = ensure_partitions(ahead=options['ahead'])
+        if rebuilt:
+            self.stdout.write(self.style.SUCCESS("Rebuilt notes_noterecordpackage as a partitioned table"))
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        if is_partitioned() and not rebuilt and not created:
+            self.stdout.write("Already partitioned; nothing to do")
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:09
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0013_trialexport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('month', models.DateField(help_text='First day of the archived month')),
+                ('packages', models.PositiveIntegerField(default=0)),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('summary', models.JSONField(blank=True, default=dict)),
+                ('blob', models.FileField(blank=True, upload_to='archives/%Y/')),
+                ('learningscenario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='notes.learningscenario')),
+            ],
+            options={
+                'ordering': ['learningscenario', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('learningscenario', 'month'), name='unique_archive_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_packages(apps, schema_editor):
+    # opt in with PARTITION_NOTE_PACKAGES (PostgreSQL only); `manage.py partition_packages` does it later
+    if settings.PARTITION_NOTE_PACKAGES:
+        from notes.partitions import partition_table
+        partition_table(using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0014_packagearchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='noterecordpackage',
+            index=models.Index(fields=['learningscenario', 'created'], name='notes_package_scenario_created'),
+        ),
+        migrations.RunPython(partition_packages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def requested_by_owner(apps, schema_editor):
+    # exports made before this were all requested by the learner themselves, as far as we know
+    apps.get_model('notes', 'TrialExport').objects.filter(requested_by=None).update(requested_by=F('user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0015_package_partitions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trialexport',
+            name='requested_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='requested_trial_exports', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(requested_by_owner, migrations.RunPython.noop),
+    ]
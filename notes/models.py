@@ -1,20 +1,40 @@
+import base64
 import copy
-from datetime import timedelta
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 from typing import Any, List
 
 from django.contrib.auth import get_user_model
+from django.core import signing
 from django.utils import timezone
 from django.utils.timezone import now
 from model_utils.models import TimeStampedModel
 
-from notes import tools
+from config import metrics
+from notes import tools, trial_buffer
 from notes.instrument_data import instruments
 
 User = get_user_model()
 
-from django.db import models
+# A NoteRecordPackage collects every answer given within this many hours of its creation
+PACKAGE_WINDOW_HOURS = 24
+PACKAGE_TOKEN_SALT = 'notes.package-token'
+
+from django.db import connection, models, transaction
 from django.core.exceptions import ValidationError
 
+# SQLite can't lock rows (select_for_update is a no-op there), so read-modify-writes of a
+# package log take this lock instead. It covers the threads of one process, which is how
+# SQLite is run here (dev server, tests).
+_sqlite_write_lock = threading.RLock()
+
+
+def serialised_writes():
+    """Context manager serialising log read-modify-writes where the database has no row locks."""
+    return nullcontext() if connection.features.has_select_for_update else _sqlite_write_lock
+
 
 class ProgressWrapper(dict):
     """A dict that behaves like a list of notes for backward compatibility.
@@ -183,11 +203,23 @@ class LearningScenario(TimeStampedModel):
         return self.absolute_pitch
 
     def last_practiced(self):
-        try:
-            date_last_practiced = NoteRecordPackage.objects.filter(learningscenario=self).last().created
-            difference = timezone.now() - date_last_practiced
-        except AttributeError:
+        # add_history (or an annotation, as in the admin) may have fetched it with the rest of the page
+        if 'last_practiced_at' in self.__dict__:
+            date_last_practiced = self.last_practiced_at
+            if date_last_practiced is None and 'last_archive_summary' in self.__dict__:
+                # the admin annotates the newest archive's summary alongside the hot table's newest package
+                date_last_practiced = max(PackageArchive.practised_at(self.last_archive_summary or {}), default=None)
+        else:
+            # newest first with LIMIT 1: on a partitioned table only the latest partitions are read
+            date_last_practiced = (NoteRecordPackage.objects.filter(learningscenario=self)
+                                   .order_by('-created').values_list('created', flat=True).first())
+            if date_last_practiced is None:
+                # nothing in the hot table, but older months may have been archived (notes.archive)
+                summary = self.archives.order_by('-month').values_list('summary', flat=True).first()
+                date_last_practiced = max(PackageArchive.practised_at(summary or {}), default=None)
+        if date_last_practiced is None:
             return "Never"
+        difference = timezone.now() - date_last_practiced
         if difference.days == 0:
             return "Today"
         return difference.days
@@ -197,21 +229,37 @@ class LearningScenario(TimeStampedModel):
         return difference.days
 
     @staticmethod
-    def progress_latest_serialised(learningscenario_id: int):
+    def progress_latest_serialised(learningscenario_id: int, create: bool = True):
+        """The current package and the progress to practise from.
 
-        package: NoteRecordPackage = NoteRecordPackage.objects.filter(learningscenario_id=learningscenario_id).last()
-        progress_notes = package.log if package else None
+        When there is no package from the last PACKAGE_WINDOW_HOURS a new one is started: saved
+        straight away by default, or, with `create=False` (the practice page, which must not write
+        on GET), left unsaved for `ingest_trials` to materialise when the first answer arrives
+        (see `package_token`).
+        """
+        # only a package from the current window is ever reused
+        package: NoteRecordPackage = NoteRecordPackage.objects.filter(
+            learningscenario_id=learningscenario_id,
+            created__gt=timezone.now() - timedelta(hours=PACKAGE_WINDOW_HOURS),
+        ).order_by('created').last()
+
+        if package is None or package.older_than(hours=PACKAGE_WINDOW_HOURS):
+            package = NoteRecordPackage(learningscenario_id=learningscenario_id, created=timezone.now())
+            if create:
+                package.save()
+
+        # answers still waiting in the write-behind buffer count too (in memory only; the
+        # flush task writes them)
+        pending = trial_buffer.pending_trials(learningscenario_id)
+        if pending:
+            since = package.created if package.pk else timezone.now() - timedelta(hours=PACKAGE_WINDOW_HOURS)
+            trial_buffer.apply_pending(package, pending, since)
+
+        progress_notes = package.log
         # If stored progress is a wrapped dict, extract notes list
         if isinstance(progress_notes, dict):
             progress_notes = progress_notes.get('notes', [])
-
-        freshen_progress = False
-
-        if package is None or package.older_than(hours=24):
-            package = NoteRecordPackage.objects.create(learningscenario_id=learningscenario_id)
-            freshen_progress = True
-
-        if progress_notes is None or freshen_progress:
+        if progress_notes is None:
             progress_notes = []
 
         learningscenario: LearningScenario = LearningScenario.objects.get(id=learningscenario_id)
@@ -272,51 +320,127 @@ class LearningScenario(TimeStampedModel):
 
     @classmethod
     def add_history(cls, learningscenarios):
-        # For each learning scenario, get practice history from the date of creation
+        learningscenarios = list(learningscenarios)
+        if not learningscenarios:
+            return
+        # The dates of every practice session of all the scenarios in one query (bounded by the
+        # oldest scenario's creation so a partitioned table skips older months)
+        practised_by_scenario = defaultdict(list)
+        for scenario_id, created in NoteRecordPackage.objects.filter(
+            learningscenario__in=learningscenarios,
+            created__gte=min(scenario.created for scenario in learningscenarios) - timedelta(days=1),
+        ).values_list('learningscenario_id', 'created'):
+            practised_by_scenario[scenario_id].append(created)
+        # plus the days practised in months that have since been archived
+        for scenario_id, summary in PackageArchive.objects.filter(
+            learningscenario__in=learningscenarios,
+        ).values_list('learningscenario_id', 'summary'):
+            practised_by_scenario[scenario_id].extend(PackageArchive.practised_at(summary))
+
+        today = now().date()
         for scenario in learningscenarios:
-            # Initialize practice history dictionary
-            practice_history = {}
-
-            # Get the creation date of the learning scenario
-            creation_date = scenario.created.date()
-            today = now().date()
-            days_since_creation = (today - creation_date).days
-
-            # Get all practice sessions for this learning scenario
-            packages = NoteRecordPackage.objects.filter(
-                learningscenario=scenario
-            )
-
-            # Create a dictionary with dates as keys and practice status as values
-            for i in range(days_since_creation + 1):  # +1 to include today
-                date = today - timedelta(days=i)
-                date_str = date.strftime("%Y-%m-%d")
-                practice_history[date_str] = False
-
-            # Mark dates with practice sessions as True
-            for package in packages:
-                date_str = package.created.date().strftime("%Y-%m-%d")
-                practice_history[date_str] = True
-
-            # Calculate current streak
+            practised = practised_by_scenario[scenario.id]
+            scenario.last_practiced_at = max(practised, default=None)
+
+            # One bit per day from the scenario's creation to today, oldest first (day i is bit
+            # i % 8 of byte i // 8). The page gets a short base64 string however old the scenario
+            # is, and js/practice_heatmap.js draws the grid from it.
+            start = scenario.created.date()
+            days = (today - start).days + 1
+            bits = bytearray((days + 7) // 8)
+            for created in practised:
+                day = (created.date() - start).days
+                if 0 <= day < days:
+                    bits[day >> 3] |= 1 << (day & 7)
+
+            # Current streak: consecutive practised days, going back from today
             streak_count = 0
-            current_date = today
-
-            # Count consecutive days with practice, starting from today and going backwards
-            while True:
-                date_str = current_date.strftime("%Y-%m-%d")
-                if date_str in practice_history and practice_history[date_str]:
-                    streak_count += 1
-                    current_date = current_date - timedelta(days=1)
-                else:
-                    break
+            day = days - 1
+            while day >= 0 and bits[day >> 3] & (1 << (day & 7)):
+                streak_count += 1
+                day -= 1
+
+            scenario.practice_start = start
+            scenario.practice_days = days
+            scenario.practice_bits = base64.b64encode(bits).decode()
+            scenario.streak_count = streak_count
 
-            # Sort practice history by date (oldest first)
-            sorted_practice_history = {k: practice_history[k] for k in sorted(practice_history.keys())}
+    @property
+    def practice_history(self) -> dict[str, bool]:
+        """{'YYYY-MM-DD': practised}, oldest first, from the bitset add_history sets."""
+        bits = base64.b64decode(self.practice_bits)
+        return {(self.practice_start + timedelta(days=day)).isoformat(): bool(bits[day >> 3] & (1 << (day & 7)))
+                for day in range(self.practice_days)}
+
+    def package_token(self, opened: datetime) -> str:
+        """Signed stand-in for the package a practice page opened at `opened` will write to."""
+        return signing.dumps({'ls': self.id, 'opened': int(opened.timestamp() * 1000)}, salt=PACKAGE_TOKEN_SALT)
+
+    def read_package_token(self, token: str) -> datetime | None:
+        """When the page holding `token` was opened; None if the token is forged or for another scenario."""
+        try:
+            data = signing.loads(token, salt=PACKAGE_TOKEN_SALT)
+        except signing.BadSignature:
+            return None
+        if not isinstance(data, dict) or data.get('ls') != self.id or not isinstance(data.get('opened'), int):
+            return None
+        return datetime.fromtimestamp(data['opened'] / 1000, tz=dt_timezone.utc)
+
+    def ingest_trials(self, trials, opened: datetime | None = None, metrics_path: str | None = 'batch'):
+        """Merge timestamped trials (e.g. replayed from the offline queue) into the right packages.
+
+        Trials may arrive late and out of order. Each one goes to the package whose 24h window
+        (see `progress_latest_serialised`) contains its client timestamp; when no such package
+        exists one is created, dated at that trial, or at `opened` (from a package token) for
+        trials given within the window of the practice page they came from. Within a package,
+        trials are applied in timestamp order. Returns the packages that were written to.
+        Counted in the trials metric under `metrics_path` (None: already counted elsewhere).
+        """
+        with serialised_writes(), transaction.atomic():
+            packages = self._ingest_trials(trials, opened)
+        if metrics_path:
+            metrics.record_trials(metrics_path, len(trials))
+        return packages
+
+    def _ingest_trials(self, trials, opened):
+        # one writer per scenario at a time, so concurrent batches don't both create a package
+        LearningScenario.objects.select_for_update().only('id').get(id=self.id)
+
+        latest_allowed = timezone.now()
+        window = timedelta(hours=PACKAGE_WINDOW_HOURS)
+        timestamped = []
+        for trial in trials:
+            when = datetime.fromtimestamp(trial['client_ts'] / 1000, tz=dt_timezone.utc)
+            # client clocks drift; never file a trial in the future or before the scenario
+            # (or the page it was answered on) existed
+            when = min(max(when, opened or self.created, self.created), latest_allowed)
+            timestamped.append((when, trial))
+        timestamped.sort(key=lambda pair: pair[0])
+
+        packages = list(NoteRecordPackage.objects.select_for_update().filter(
+            learningscenario=self,
+            created__gt=timestamped[0][0] - window,
+            created__lte=timestamped[-1][0],
+        ).order_by('created'))
+
+        results_per_package = {}
+        for when, trial in timestamped:
+            package = None
+            for candidate in reversed(packages):
+                if candidate.created <= when:
+                    if when - candidate.created < window:
+                        package = candidate
+                    break
+            if package is None:
+                starts = opened if opened is not None and when - opened < window else when
+                package = NoteRecordPackage.objects.create(learningscenario=self, created=starts)
+                packages.append(package)
+                packages.sort(key=lambda p: p.created)
+            results_per_package.setdefault(package, []).append(trial)
 
-            # Add practice history and streak count to the learning scenario object
-            scenario.practice_history = sorted_practice_history
-            scenario.streak_count = streak_count
+        for package, results in results_per_package.items():
+            package.add_results(results)
+        return list(results_per_package)
 
 
 
@@ -326,6 +450,11 @@ class NoteRecordPackage(TimeStampedModel):
     learningscenario = models.ForeignKey(LearningScenario, on_delete=models.CASCADE)
     log = models.JSONField(null=True, blank=True)
 
+    class Meta:
+        # almost every query is one scenario's packages over a window of `created` (which is
+        # also the partition key when the table is partitioned, see notes.partitions)
+        indexes = [models.Index(fields=['learningscenario', 'created'], name='notes_package_scenario_created')]
+
     def older_than(self, hours: int):
         difference = timezone.now() - self.created
         difference_in_hours = difference.total_seconds() / 3600
@@ -341,6 +470,35 @@ class NoteRecordPackage(TimeStampedModel):
         return self.learningscenario.instrument
 
     def add_result(self, json_data):
+        """
+        Add a result to the log and save. See `_apply_result` for how the log is updated.
+
+        Args:
+            json_data (dict): Data containing alter, note, octave, correct, and reaction_time
+        """
+        self._apply_result(json_data)
+        self.save()
+
+    @classmethod
+    def append_results(cls, package_id: int, results):
+        """`add_results` for concurrent writers (several tabs or devices posting to one package).
+
+        The row is locked from read to save (select_for_update; `serialised_writes` on SQLite),
+        so one writer can't overwrite another's answers.
+        """
+        with serialised_writes(), transaction.atomic():
+            package = cls.objects.select_for_update().get(id=package_id)
+            package.add_results(results)
+        metrics.record_trials('single', len(results))
+        return package
+
+    def add_results(self, results):
+        """Add several results (in order) to the log with a single save."""
+        for json_data in results:
+            self._apply_result(json_data)
+        self.save()
+
+    def _apply_result(self, json_data):
         """
         Add a result to the log. If the combination of alter, note, and octave already exists in the log,
         update that element. Otherwise, add the entire json_data to the log.
@@ -394,9 +552,6 @@ class NoteRecordPackage(TimeStampedModel):
             }
             self.log.append(new_item)
 
-        # Save the updated log
-        self.save()
-
     def process_answers(self, json_data):
         self.log = json_data
         self.save()
@@ -405,3 +560,77 @@ class NoteRecordPackage(TimeStampedModel):
         if not isinstance(json_data, list):
             return
 
+
+
+class Cohort(TimeStampedModel):
+    """A group of learners (a class, a section) that a teacher follows; see notes.cohort."""
+    name = models.CharField(max_length=100)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_cohorts')
+    members = models.ManyToManyField(User, related_name='cohorts', blank=True)
+
+    def __str__(self):
+        return self.name
+
+    def visible_to(self, user):
+        return user.is_staff or user.pk == self.owner_id
+
+
+class ExportFormat(models.TextChoices):
+    CSV = 'csv', 'CSV'
+    PARQUET = 'parquet', 'Parquet'
+
+
+class ExportStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+class TrialExport(TimeStampedModel):
+    """A trial history export built in the background (see notes.export) for the user to download.
+
+    `user` is whose history it is; `requested_by` who asked for it (staff can export a learner's),
+    and only they (or staff) can see it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trial_exports')
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='requested_trial_exports')
+    learningscenario = models.ForeignKey(LearningScenario, on_delete=models.CASCADE, null=True, blank=True)
+    format = models.CharField(max_length=10, choices=ExportFormat.choices, default=ExportFormat.CSV)
+    status = models.CharField(max_length=10, choices=ExportStatus.choices, default=ExportStatus.PENDING)
+    file = models.FileField(upload_to='exports/', blank=True)
+    error = models.CharField(max_length=200, blank=True)
+
+    def __str__(self):
+        return f"{self.user} {self.format} export ({self.status})"
+
+    def filename(self):
+        scope = f"scenario-{self.learningscenario_id}" if self.learningscenario_id else "all"
+        return f"trials-{scope}-{self.created:%Y%m%d}.{self.format}"
+
+
+class PackageArchive(TimeStampedModel):
+    """One scenario's NoteRecordPackages for one month, moved out of the hot table (see notes.archive).
+
+    `summary` keeps the rollup (accuracy / median reaction time by day and by note) and `blob` the
+    packages themselves as gzipped JSON Lines, so nothing is lost.
+    """
+    learningscenario = models.ForeignKey(LearningScenario, on_delete=models.CASCADE, related_name='archives')
+    month = models.DateField(help_text="First day of the archived month")
+    packages = models.PositiveIntegerField(default=0)
+    answers = models.PositiveIntegerField(default=0)
+    summary = models.JSONField(default=dict, blank=True)
+    blob = models.FileField(upload_to='archives/%Y/', blank=True)
+
+    class Meta:
+        ordering = ['learningscenario', 'month']
+        constraints = [models.UniqueConstraint(fields=['learningscenario', 'month'], name='unique_archive_month')]
+
+    def __str__(self):
+        return f"{self.learningscenario} {self.month:%Y-%m}"
+
+    @staticmethod
+    def practised_at(summary: dict) -> list[datetime]:
+        """Midnight (UTC) of each day an archive's `summary` has answers for."""
+        return [datetime.combine(date.fromisoformat(day), time.min, tzinfo=dt_timezone.utc)
+                for day in summary.get('over_time', {}).get('labels', [])]
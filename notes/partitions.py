@@ -0,0 +1,148 @@
+"""
+Optional monthly range partitioning of the NoteRecordPackage table on `created` (PostgreSQL).
+
+Turned on with PARTITION_NOTE_PACKAGES (env) before migrating, or later with the
+`partition_packages` command. The table is rebuilt as a partitioned table with one partition
+per month, plus a default partition for anything outside them, and a primary key of (id,
+created) because PostgreSQL requires the partition key in every unique constraint. The ORM
+still treats `id` as the primary key; ids come from the identity column, so they stay unique.
+
+Once the table is partitioned:
+
+* notes.tasks.create_package_partitions keeps PARTITIONS_AHEAD months of partitions ready;
+* queries that bound `created` (progress_data_view, LearningScenario.add_history,
+  last_practiced) only touch the partitions they need; and
+* after notes.archive has moved a month into cold storage its partition is empty and is
+  dropped, which is far cheaper than deleting the rows from one big table.
+
+On SQLite (and unpartitioned PostgreSQL) every function here does nothing.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+TABLE = 'notes_noterecordpackage'
+INDEX = 'notes_package_scenario_created'
+PARTITIONS_AHEAD = 3
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{TABLE}_y{month:%Y}m{month:%m}'
+
+
+def _bound(month: date) -> str:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def is_partitioned(using: str = DEFAULT_DB_ALIAS) -> bool:
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def _partition_months(cursor, table: str = TABLE) -> set[date]:
+    cursor.execute("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+    """, [table])
+    months = set()
+    for (name,) in cursor.fetchall():
+        suffix = name[len(TABLE):]
+        if suffix.startswith('_y') and len(suffix) == 9:
+            months.add(date(int(suffix[2:6]), int(suffix[7:9]), 1))
+    return months
+
+
+def _create_partition(cursor, month: date, parent: str = TABLE):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} '
+        f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')")
+
+
+def ensure_partitions(now=None, ahead: int = PARTITIONS_AHEAD, using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """Create any missing partitions from this month to `ahead` months on; returns their names."""
+    if not is_partitioned(using):
+        return []
+    this_month = _month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    with connections[using].cursor() as cursor:
+        existing = _partition_months(cursor)
+        for i in range(ahead + 1):
+            month = _add_months(this_month, i)
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def drop_empty_partitions(before: date, using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """Drop partitions for months wholly before `before` that hold no rows (e.g. once archived)."""
+    if not is_partitioned(using):
+        return []
+    dropped = []
+    with connections[using].cursor() as cursor:
+        for month in sorted(_partition_months(cursor)):
+            if _add_months(month, 1) > _month_start(before):
+                continue
+            name = partition_name(month)
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {name})')
+            if not cursor.fetchone()[0]:
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+    return dropped
+
+
+def partition_table(now=None, ahead: int = PARTITIONS_AHEAD, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Rebuild the package table as a monthly partitioned table. False if there's nothing to do.
+
+    Copies every row, so run it in a quiet moment; it holds an exclusive lock on the table
+    until it commits.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or is_partitioned(using):
+        return False
+    building = f'{TABLE}_partitioned'
+    with connection.cursor() as cursor:
+        # run any deferred foreign key checks on rows written earlier in this transaction now:
+        # a table with pending trigger events can't be dropped
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT min(created) FROM {TABLE}')
+        oldest = cursor.fetchone()[0]
+        cursor.execute(f'CREATE TABLE {building} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                       f'PARTITION BY RANGE (created)')
+        cursor.execute(f'ALTER TABLE {building} ADD CONSTRAINT {building}_pkey PRIMARY KEY (id, created)')
+
+        this_month = _month_start(now or datetime.now(dt_timezone.utc))
+        month = _month_start(oldest) if oldest else this_month
+        while month <= _add_months(this_month, ahead):
+            _create_partition(cursor, month, parent=building)
+            month = _add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {building} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {building} SELECT * FROM {TABLE}')
+        cursor.execute(f'DROP TABLE {TABLE}')
+        cursor.execute(f'ALTER TABLE {building} RENAME TO {TABLE}')
+        cursor.execute(f'ALTER INDEX {building}_pkey RENAME TO {TABLE}_pkey')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_learningscenario_id_fk '
+                       f'FOREIGN KEY (learningscenario_id) REFERENCES notes_learningscenario (id) '
+                       f'DEFERRABLE INITIALLY DEFERRED')
+        cursor.execute(f'CREATE INDEX {INDEX} ON {TABLE} (learningscenario_id, created)')
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 0) + 1, false) "
+                       f'FROM {TABLE}')
+    return True
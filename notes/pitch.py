@@ -0,0 +1,58 @@
+"""
+Compact integer pitches (MIDI numbering: C/4 == 60) for note strings like 'C#/4', 'Bb3' or 'Fbb/5'.
+
+Mirrors the key arithmetic in js/stave_manager.js (keyAdjust) so that tables built here line up
+with what the practice page displays, except for spellings that cross an octave or use a double
+accidental (see `parse_pitch`).
+"""
+
+LETTER_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+ACCIDENTAL_SEMITONES = {'': 0, '#': 1, '##': 2, 'b': -1, 'bb': -2}
+
+# keyAdjust's KEY_TO_SEMITONES
+KEY_SEMITONES = {
+    'C': 0, 'C#': 1, 'Db': 1, 'D': 2, 'D#': 3, 'Eb': 3, 'E': 4, 'Fb': 4, 'E#': 5, 'F': 5,
+    'F#': 6, 'Gb': 6, 'G': 7, 'G#': 8, 'Ab': 8, 'A': 9, 'A#': 10, 'Bb': 10, 'B': 11, 'Cb': 11, 'B#': 0,
+}
+
+SHARP_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+
+def parse_pitch(note: str) -> int:
+    """'C/4' -> 60, 'C#4' -> 61, 'Bb/3' -> 58. Raises ValueError for anything else.
+
+    Accidentals move the pitch across octave boundaries: 'Cb/4' is B/3 (59), 'B#/4' is C/5 (72)
+    and 'Dbb/4' is C/4 (60). keyAdjust's adjustNoteString doesn't do this. It keeps the written
+    octave, so it reads Cb/4 as B/4 and B#/4 as C/4, and it reads any double-flat or double-sharp
+    spelling as C. That code is now only the fallback for notes outside the table.
+    """
+    name, _slash, octave = note.partition('/')
+    if not octave:
+        name = note.rstrip('-0123456789')
+        octave = note[len(name):]
+    letter, accidental = name[:1].upper(), name[1:]
+    if letter not in LETTER_SEMITONES or accidental not in ACCIDENTAL_SEMITONES:
+        raise ValueError(f'Not a note: {note!r}')
+    try:
+        octave = int(octave)
+    except ValueError as e:
+        raise ValueError(f'Not a note: {note!r}') from e
+    return (octave + 1) * 12 + LETTER_SEMITONES[letter] + ACCIDENTAL_SEMITONES[accidental]
+
+
+def pitch_name(pitch: int) -> str:
+    """60 -> 'C/4', 61 -> 'C#/4' (sharps, as keyAdjust spells transposed notes)."""
+    octave, semitone = divmod(pitch, 12)
+    return f'{SHARP_NAMES[semitone]}/{octave - 1}'
+
+
+def key_shift(relative_key: str, absolute_pitch: str) -> int:
+    """Semitones keyAdjust adds to written notes, in -6..6 (keyAdjust's getSemitoneShift)."""
+    if not absolute_pitch or relative_key == absolute_pitch:
+        return 0
+    diff = KEY_SEMITONES.get(relative_key, 0) - KEY_SEMITONES.get(absolute_pitch, 0)
+    if diff > 6:
+        diff -= 12
+    if diff < -6:
+        diff += 12
+    return diff
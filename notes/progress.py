@@ -0,0 +1,112 @@
+"""
+The progress chart (accuracy and median reaction time per day and per note) for a queryset of
+NoteRecordPackages.
+
+On PostgreSQL the logs are unpacked and aggregated in the database (jsonb_array_elements and
+percentile_cont), so only one row per day and per note comes back. Elsewhere (SQLite) the
+packages are loaded and rolled up in Python with notes.rollup. Both give the same payload: the
+SQL replicates `iter_log`'s pairing of answers with reaction times and the rounding is done in
+Python for both.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connections
+
+from notes import tools
+from notes.rollup import DailyRollup, note_label, rollup_packages
+
+BACKENDS = ('python', 'sql')
+
+# %(packages)s is the queryset's SELECT of (created, log)
+PROGRESS_SQL = """
+WITH packages AS (
+    SELECT to_char(p.created AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day,
+           CASE WHEN jsonb_typeof(p.log) = 'array' THEN p.log ELSE '[]'::jsonb END AS log
+    FROM (%(packages)s) p
+),
+items AS (
+    SELECT packages.day,
+           coalesce(item.value ->> 'note', '') || coalesce(item.value ->> 'octave', '') ||
+           CASE WHEN jsonb_typeof(item.value -> 'alter') <> 'string' THEN ''
+                WHEN item.value ->> 'alter' = '1' THEN '#'
+                WHEN item.value ->> 'alter' = '-1' THEN 'b'
+                ELSE '' END AS label,
+           CASE WHEN jsonb_typeof(item.value -> 'correct') = 'array'
+                THEN item.value -> 'correct' ELSE '[]'::jsonb END AS correct,
+           CASE WHEN jsonb_typeof(item.value -> 'reaction_time_log') = 'array'
+                THEN item.value -> 'reaction_time_log' ELSE '[]'::jsonb END AS rts
+    FROM packages CROSS JOIN LATERAL jsonb_array_elements(packages.log) AS item
+),
+answers AS (
+    SELECT items.day, items.label,
+           CASE jsonb_typeof(items.correct -> (rt.i - 1)::int)
+                WHEN 'boolean' THEN (items.correct -> (rt.i - 1)::int)::text = 'true'
+                WHEN 'number' THEN (items.correct ->> (rt.i - 1)::int)::numeric <> 0
+                WHEN 'string' THEN (items.correct ->> (rt.i - 1)::int) <> ''
+                ELSE false END AS correct,
+           coalesce(trunc((rt.value #>> '{}')::numeric), 0) AS reaction_time
+    FROM items CROSS JOIN LATERAL jsonb_array_elements(items.rts) WITH ORDINALITY AS rt(value, i)
+    -- only answers with both a result and a reaction time, as notes.rollup.iter_log
+    WHERE rt.i <= CASE WHEN jsonb_array_length(items.correct) > 0
+                       THEN least(jsonb_array_length(items.correct), jsonb_array_length(items.rts))
+                       ELSE jsonb_array_length(items.rts) END
+)
+SELECT 'date', days.day, count(answers.correct) FILTER (WHERE answers.correct), count(answers.reaction_time),
+       percentile_cont(0.5) WITHIN GROUP (ORDER BY answers.reaction_time::float8)
+FROM (SELECT DISTINCT day FROM packages) days LEFT JOIN answers ON answers.day = days.day
+GROUP BY days.day
+UNION ALL
+SELECT 'item', labels.label, count(answers.correct) FILTER (WHERE answers.correct), count(answers.reaction_time),
+       percentile_cont(0.5) WITHIN GROUP (ORDER BY answers.reaction_time::float8)
+FROM (SELECT DISTINCT label FROM items) labels LEFT JOIN answers ON answers.label = labels.label
+GROUP BY labels.label
+"""
+
+
+def sql_available(using: str = 'default') -> bool:
+    return connections[using].vendor == 'postgresql'
+
+
+def rollup_from_rows(rows) -> DailyRollup:
+    """A DailyRollup from (kind, key, correct, total, median) rows, as PROGRESS_SQL returns them."""
+    rollup = DailyRollup()
+    for kind, key, correct, total, median in rows:
+        bucket = rollup.touch_date(key) if kind == 'date' else rollup.touch_item(key)
+        bucket['sum_correct'] = correct
+        bucket['sum_total'] = total
+        if total:
+            # statistics.median gives the middle int for odd counts and a float mean otherwise
+            bucket['median'] = int(median) if total % 2 else float(median)
+    return rollup
+
+
+def sql_rollup(packages) -> DailyRollup:
+    query = packages.values_list('created', 'log').order_by()
+    using = query.db
+    sql, params = query.query.sql_with_params()
+    with connections[using].cursor() as cursor:
+        cursor.execute(PROGRESS_SQL % {'packages': sql}, params)
+        return rollup_from_rows(cursor.fetchall())
+
+
+def rollup_trials(trials, rollup: DailyRollup | None = None) -> DailyRollup:
+    """Feed trials that aren't in a package yet (see notes.trial_buffer) into a rollup, by answer day."""
+    rollup = rollup if rollup is not None else DailyRollup()
+    for trial in trials:
+        day = datetime.fromtimestamp(trial['client_ts'] / 1000, tz=dt_timezone.utc).strftime('%Y-%m-%d')
+        reaction_time = trial.get('reaction_time')
+        rollup.add(day, note_label(trial), trial.get('correct', False), int(reaction_time) if reaction_time else 0)
+    return rollup
+
+
+def progress_chart_data(packages, backend: str | None = None, pending=()) -> dict:
+    """Chart.js payload (over time / by note) for a NoteRecordPackage queryset, plus `pending` trials."""
+    if backend is None:
+        # medians from SQL can't take more answers, so unflushed trials mean doing it in Python
+        backend = 'sql' if sql_available(packages.db) and not pending else 'python'
+    if backend == 'sql':
+        rollup = sql_rollup(packages)
+    else:
+        rollup = rollup_packages(packages.only('created', 'log'))
+    rollup_trials(pending, rollup)
+    return rollup.chart_data('by_note', sort_items=tools.sort_notes)
@@ -0,0 +1,106 @@
+"""
+Daily rollups: accuracy and median reaction time per day and per item (note, interval, ...).
+
+Anything that records right/wrong answers with reaction times feeds a DailyRollup and gets the
+same Chart.js payload the progress page draws. `rollup_packages` does this for the notes app's
+NoteRecordPackage logs.
+"""
+from statistics import median
+
+
+def _bucket():
+    return {"sum_correct": 0, "sum_total": 0, "reaction_times": []}
+
+
+def _accuracy(bucket):
+    total = bucket["sum_total"]
+    return round(bucket["sum_correct"] / total * 100, 1) if total > 0 else 0
+
+
+def _median_reaction(bucket):
+    if "median" in bucket:
+        # aggregated elsewhere (see notes.progress), so only the median is known
+        return round(bucket["median"], 1)
+    reaction_times = bucket["reaction_times"]
+    return round(median(reaction_times), 1) if reaction_times else 0
+
+
+class DailyRollup:
+    def __init__(self):
+        self.by_date = {}
+        self.by_item = {}
+
+    def touch_date(self, date_key: str):
+        """Make sure a day shows up on the chart even if nothing was answered on it."""
+        return self.by_date.setdefault(date_key, _bucket())
+
+    def touch_item(self, item_key: str):
+        return self.by_item.setdefault(item_key, _bucket())
+
+    def add(self, date_key: str, item_key: str, correct, reaction_time):
+        for bucket in (self.touch_date(date_key), self.touch_item(item_key)):
+            bucket["sum_total"] += 1
+            if correct:
+                bucket["sum_correct"] += 1
+            bucket["reaction_times"].append(int(reaction_time) if reaction_time is not None else 0)
+
+    def merge(self, other: 'DailyRollup'):
+        for mine, theirs in ((self.by_date, other.by_date), (self.by_item, other.by_item)):
+            for key, bucket in theirs.items():
+                target = mine.setdefault(key, _bucket())
+                target["sum_correct"] += bucket["sum_correct"]
+                target["sum_total"] += bucket["sum_total"]
+                target["reaction_times"].extend(bucket["reaction_times"])
+        return self
+
+    def chart_data(self, items_label: str = "by_note", sort_items=None) -> dict:
+        """{"over_time": {...}, items_label: {...}} with labels, accuracy (%) and median reaction time."""
+        items = sort_items(self.by_item) if sort_items else self.by_item
+        dates = sorted(self.by_date)
+        return {
+            "over_time": {
+                "labels": dates,
+                "accuracy": [_accuracy(self.by_date[d]) for d in dates],
+                "reaction_time": [_median_reaction(self.by_date[d]) for d in dates],
+            },
+            items_label: {
+                "labels": list(items),
+                "accuracy": [_accuracy(items[k]) for k in items],
+                "reaction_time": [_median_reaction(items[k]) for k in items],
+            },
+        }
+
+
+def note_label(item):
+    note_name = f"{item.get('note', '')}{item.get('octave', '')}"
+    alter = item.get('alter')
+    if alter == '1':
+        note_name += '#'
+    elif alter == '-1':
+        note_name += 'b'
+    return note_name
+
+
+def iter_log(log):
+    """(note label, [(correct, reaction_time), ...]) for each item of a NoteRecordPackage log."""
+    if not isinstance(log, list):
+        return
+    for item in log:
+        correct_list = item.get('correct', []) or []
+        rt_list = item.get('reaction_time_log', []) or []
+        # Use paired data points only
+        n = min(len(correct_list), len(rt_list)) if (correct_list and rt_list) else len(rt_list)
+        yield note_label(item), [(i < len(correct_list) and correct_list[i], rt_list[i]) for i in range(n)]
+
+
+def rollup_packages(packages, rollup: DailyRollup | None = None) -> DailyRollup:
+    """Feed every answer in the packages' logs into a rollup (by day and by note)."""
+    rollup = rollup if rollup is not None else DailyRollup()
+    for package in packages:
+        date_key = package.created.strftime("%Y-%m-%d")
+        rollup.touch_date(date_key)
+        for note_name, answers in iter_log(package.log):
+            rollup.touch_item(note_name)
+            for correct, reaction_time in answers:
+                rollup.add(date_key, note_name, correct, reaction_time)
+    return rollup
@@ -0,0 +1,187 @@
+"""
+Fast JSON encode/decode for the practice payloads, plus the shapes those payloads must have.
+
+orjson is used when it is installed; otherwise we fall back to the standard library so that
+nothing breaks on a bare environment. All JSON leaving or entering the practice endpoints
+should go through here so that there is one place that decides how payloads look.
+"""
+import json
+from dataclasses import dataclass, asdict
+from typing import Any, TypedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only where orjson is missing
+    orjson = None
+
+NOTE_LETTERS = frozenset('ABCDEFG')
+ALTERS = frozenset({'-2', '-1', '0', '1', '2'})
+MAX_BATCH_SIZE = 1000
+MIN_OCTAVE, MAX_OCTAVE = 0, 8
+# every (note, alter, octave) an answer can be for, for O(1) validation of imported rows
+NOTE_VOCABULARY = frozenset((note, alter, str(octave)) for note in NOTE_LETTERS for alter in ALTERS
+                            for octave in range(MIN_OCTAVE, MAX_OCTAVE + 1))
+
+# Same escaping as django.utils.html.json_script, so the output is safe inside <script>
+_JSON_SCRIPT_ESCAPES = {
+    ord('>'): '\\u003E',
+    ord('<'): '\\u003C',
+    ord('&'): '\\u0026',
+}
+
+
+class PayloadError(ValueError):
+    """Raised when an incoming payload is not valid JSON or does not have the expected shape."""
+
+
+class ProgressNote(TypedDict):
+    note: str
+    octave: str
+    alter: str
+    reaction_time: str
+    n: int
+    reaction_time_log: list[int]
+    correct: list[bool | None]
+
+
+class SignaturesPayload(TypedDict):
+    fifths: list[int]
+    vexflow: list[str]
+
+
+class ProgressPayload(TypedDict):
+    notes: list[ProgressNote]
+    signatures: SignaturesPayload
+
+
+def _default(obj):
+    # orjson handles datetimes natively; anything else (lazy strings, Decimals...) goes via Django
+    return DjangoJSONEncoder().default(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def loads(data: bytes | str) -> Any:
+    try:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+    except ValueError as e:
+        raise PayloadError(f'Invalid JSON: {e}') from e
+
+
+def json_script(value: Any, element_id: str):
+    """Drop-in for Django's json_script filter using the fast encoder."""
+    json_str = dumps(value).decode().translate(_JSON_SCRIPT_ESCAPES)
+    return format_html('<script id="{}" type="application/json">{}</script>', element_id, mark_safe(json_str))
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse equivalent that serialises with `dumps`."""
+
+    def __init__(self, data: Any, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def _as_str(value, field: str) -> str:
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise PayloadError(f'{field} must be a string or integer')
+    return str(value)
+
+
+@dataclass(frozen=True, slots=True)
+class TrialPost:
+    """A single answer posted from the practice page.
+
+    Missing optional fields get the same defaults NoteRecordPackage.add_result has always used.
+    """
+    note: str
+    octave: str
+    alter: str = '0'
+    correct: bool | None = False
+    reaction_time: int = 0
+    # milliseconds since the epoch, set by the client when the answer was given (batched posts only)
+    client_ts: int | None = None
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'TrialPost':
+        if not isinstance(data, dict):
+            raise PayloadError('Trial must be a JSON object')
+
+        note = data.get('note')
+        if not isinstance(note, str) or note not in NOTE_LETTERS:
+            raise PayloadError(f'Unknown note: {note!r}')
+
+        octave = _as_str(data.get('octave'), 'octave')
+        if not octave.lstrip('-').isdigit():
+            raise PayloadError(f'Invalid octave: {octave!r}')
+
+        alter = _as_str(data.get('alter', '0'), 'alter')
+        if alter not in ALTERS:
+            raise PayloadError(f'Invalid alter: {alter!r}')
+
+        correct = data.get('correct', False)
+        if correct is not None and not isinstance(correct, bool):
+            raise PayloadError('correct must be true, false or null')
+
+        reaction_time = data.get('reaction_time', '')
+        if reaction_time in ('', None):
+            reaction_time = 0
+        try:
+            reaction_time = int(float(reaction_time))
+        except (TypeError, ValueError) as e:
+            raise PayloadError(f'Invalid reaction_time: {reaction_time!r}') from e
+        if reaction_time < 0:
+            raise PayloadError('reaction_time must not be negative')
+
+        client_ts = data.get('client_ts')
+        if client_ts is not None and (isinstance(client_ts, bool) or not isinstance(client_ts, int) or client_ts < 0):
+            raise PayloadError(f'Invalid client_ts: {client_ts!r}')
+
+        return cls(note=note, octave=octave, alter=alter, correct=correct, reaction_time=reaction_time,
+                   client_ts=client_ts)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def decode_trial(body: bytes | str) -> TrialPost:
+    return TrialPost.from_dict(loads(body))
+
+
+def decode_trial_batch(body: bytes | str) -> tuple[list[TrialPost], list[dict]]:
+    """Decode {"trials": [...]} as posted by the offline trial queue; every trial needs a client_ts.
+
+    One bad trial shouldn't cost the learner the rest of the batch (the queue drops whatever it
+    posted once the server has answered), so invalid trials are skipped and returned as
+    [{"index": <position in the batch>, "error": ...}]. PayloadError if none are valid.
+    """
+    data = loads(body)
+    trials = data.get('trials') if isinstance(data, dict) else None
+    if not isinstance(trials, list) or not trials:
+        raise PayloadError('Expected a non-empty "trials" list')
+    if len(trials) > MAX_BATCH_SIZE:
+        raise PayloadError(f'At most {MAX_BATCH_SIZE} trials per batch')
+    decoded, rejected = [], []
+    for index, trial in enumerate(trials):
+        try:
+            post = TrialPost.from_dict(trial)
+            if post.client_ts is None:
+                raise PayloadError('Every trial in a batch needs a client_ts')
+        except PayloadError as e:
+            rejected.append({'index': index, 'error': str(e)})
+        else:
+            decoded.append(post)
+    if not decoded:
+        raise PayloadError(f'No valid trials in the batch: {rejected[0]["error"]}')
+    return decoded, rejected
@@ -0,0 +1,34 @@
+from huey import crontab
+from huey.contrib.djhuey import db_periodic_task, db_task
+
+from notes import trial_buffer
+from notes.archive import archive_packages
+from notes.export import build_trial_export
+from notes.models import ExportStatus, TrialExport
+from notes.partitions import ensure_partitions
+
+
+@db_task()
+def build_export(export_id: int):
+    export = TrialExport.objects.filter(id=export_id, status=ExportStatus.PENDING).first()
+    if export is None:
+        return
+    build_trial_export(export)
+
+
+@db_periodic_task(crontab(hour='3', minute='30'))
+def archive_old_packages():
+    """Nightly: drop empty packages and move old months into PackageArchives."""
+    archive_packages()
+
+
+@db_periodic_task(crontab(day_of_week='1', hour='3', minute='0'))
+def create_package_partitions():
+    """Weekly: keep the next few months' NoteRecordPackage partitions ready (if partitioned)."""
+    ensure_partitions()
+
+
+@db_periodic_task(crontab(minute='*'))
+def flush_trial_buffer():
+    """Every minute: write answers queued by the write-behind buffer (if on) to the database."""
+    trial_buffer.flush_all()
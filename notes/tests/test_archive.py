@@ -0,0 +1,115 @@
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib import admin
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from notes import archive, export
+from notes.admin import LearningScenarioAdmin
+from notes.cohort import aggregate_packages, cohort_packages
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import Cohort, LearningScenario, NoteRecordPackage, PackageArchive
+
+NOW = datetime(2025, 6, 15, 12, tzinfo=dt_timezone.utc)
+
+
+def _package(scenario, created, log):
+    package = NoteRecordPackage.objects.create(learningscenario=scenario, log=log)
+    NoteRecordPackage.objects.filter(id=package.id).update(created=created)
+    return package
+
+
+def _log(correct):
+    return [{'note': 'C', 'alter': '0', 'octave': '4', 'correct': correct, 'reaction_time_log': [700] * len(correct),
+             'n': len(correct)}]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestArchive(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.scenario = LearningScenarioFactory(user=self.user)
+        # January: two answered days and an empty one; February: one; June (recent): one plus today's empty one
+        _package(self.scenario, datetime(2025, 1, 3, tzinfo=dt_timezone.utc), _log([True, False]))
+        _package(self.scenario, datetime(2025, 1, 20, tzinfo=dt_timezone.utc), _log([True]))
+        _package(self.scenario, datetime(2025, 1, 21, tzinfo=dt_timezone.utc), [])
+        _package(self.scenario, datetime(2025, 2, 2, tzinfo=dt_timezone.utc), _log([False]))
+        _package(self.scenario, NOW - timedelta(days=3), _log([True]))
+        _package(self.scenario, NOW - timedelta(hours=2), [])
+
+    def test_cutoff_is_a_month_start(self):
+        self.assertEqual(archive.archive_cutoff(NOW), datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+
+    def test_archives_old_months_and_drops_empty_packages(self):
+        report = archive.archive_packages(now=NOW)
+        self.assertEqual((report.empty_deleted, report.archived_packages, report.archives), (1, 3, 2))
+        # the open package and the recent one stay in the hot table
+        self.assertEqual(NoteRecordPackage.objects.count(), 2)
+
+        january = PackageArchive.objects.get(month='2025-01-01')
+        self.assertEqual((january.packages, january.answers), (2, 3))
+        self.assertEqual(january.summary['over_time']['labels'], ['2025-01-03', '2025-01-20'])
+        self.assertEqual(january.summary['by_note']['accuracy'], [66.7])
+        restored = list(archive.iter_archived_packages(january))
+        self.assertEqual([p.log for p in restored], [_log([True, False]), _log([True])])
+
+    def test_late_arrivals_are_folded_in(self):
+        archive.archive_packages(now=NOW)
+        old_blob = PackageArchive.objects.get(month='2025-01-01').blob
+        _package(self.scenario, datetime(2025, 1, 25, tzinfo=dt_timezone.utc), _log([True]))
+        with self.captureOnCommitCallbacks() as callbacks:
+            archive.archive_packages(now=NOW)
+            # kept until the new archive is committed
+            self.assertTrue(old_blob.storage.exists(old_blob.name))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(old_blob.storage.exists(old_blob.name))
+        january = PackageArchive.objects.get(month='2025-01-01')
+        self.assertEqual((january.packages, january.answers), (3, 4))
+        self.assertEqual(len(list(archive.iter_archived_packages(january))), 3)
+
+    def test_notes_home_still_shows_archived_practice(self):
+        LearningScenario.objects.filter(id=self.scenario.id).update(created=datetime(2024, 12, 1, tzinfo=dt_timezone.utc))
+        # everything, including last week's package, is now more than 90 days old
+        archive.archive_packages()
+        self.assertFalse(NoteRecordPackage.objects.exists())
+
+        self.client.force_login(self.user)
+        scenario = self.client.get(reverse('notes-home')).context['learningscenarios'][0]
+        history = scenario.practice_history
+        self.assertEqual([day for day, practised in history.items() if practised],
+                         ['2025-01-03', '2025-01-20', '2025-02-02', '2025-06-12'])
+        self.assertNotEqual(scenario.last_practiced(), "Never")
+        fresh = LearningScenario.objects.get(id=self.scenario.id)
+        self.assertEqual(fresh.last_practiced(), scenario.last_practiced())
+        # and the admin list, which annotates it
+        request = RequestFactory().get('/')
+        request.user = UserFactory(is_staff=True, is_superuser=True)
+        listed = LearningScenarioAdmin(LearningScenario, admin.site).get_queryset(request).get(id=self.scenario.id)
+        self.assertEqual(listed.last_practiced(), scenario.last_practiced())
+
+    def test_cohort_analytics_include_archived_packages(self):
+        cohort = Cohort.objects.create(name='Brass', owner=UserFactory())
+        cohort.members.add(self.user)
+        # (archiving drops empty packages, which would shift the practice days)
+        archive.empty_packages(NOW).delete()
+        before = aggregate_packages(cohort_packages(cohort)).as_dict()
+        archive.archive_packages(now=NOW)
+        after = aggregate_packages(cohort_packages(cohort)).as_dict()
+        self.assertEqual(after, before)
+
+    def test_export_includes_archived_history(self):
+        before = list(export.history_rows(self.user))
+        archive.archive_packages(now=NOW)
+        after = list(export.history_rows(self.user))
+        self.assertEqual(sorted(after, key=lambda row: row[3]), sorted(before, key=lambda row: row[3]))
+        self.assertEqual(export.history_size(self.user), 5)
+
+    def test_dry_run_command(self):
+        out = StringIO()
+        call_command('archive_packages', '--dry-run', '--days', '1', stdout=out)
+        self.assertIn('Would delete', out.getvalue())
+        self.assertEqual(NoteRecordPackage.objects.count(), 6)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from notes.cohort import CohortAggregate, aggregate_packages, cohort_analytics, cohort_packages, histogram_median
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import Cohort, NoteRecordPackage
+
+
+def _log(note, correct, reaction_times):
+    return [{'note': note, 'alter': '0', 'octave': '4', 'correct': correct, 'reaction_time_log': reaction_times,
+             'n': len(reaction_times)}]
+
+
+class TestCohortAnalytics(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = UserFactory()
+        self.cohort = Cohort.objects.create(name='Year 7 brass', owner=self.teacher)
+        today = timezone.now()
+        for i in range(3):
+            learner = UserFactory()
+            self.cohort.members.add(learner)
+            scenario = LearningScenarioFactory(user=learner)
+            for day, correct in ((2, [False, False]), (1, [True, False]), (0, [True, True])):
+                package = NoteRecordPackage.objects.create(learningscenario=scenario,
+                                                           log=_log('C', correct, [1000, 2000]))
+                NoteRecordPackage.objects.filter(id=package.id).update(created=today - timedelta(days=day))
+            NoteRecordPackage.objects.create(learningscenario=scenario, log=_log('G', [True], [500]))
+        # not in the cohort
+        NoteRecordPackage.objects.create(learningscenario=LearningScenarioFactory(), log=_log('D', [True], [500]))
+
+    def test_difficulty_and_mastery(self):
+        data = aggregate_packages(cohort_packages(self.cohort)).as_dict()
+        self.assertEqual(data['learners'], 3)
+        self.assertEqual(data['packages'], 12)
+        self.assertEqual(data['by_note']['labels'], ['C4', 'G4'])
+        self.assertEqual(data['by_note']['answers'], [18, 3])
+        self.assertEqual(data['by_note']['difficulty'], [50.0, 0.0])
+        self.assertEqual(data['mastery']['practice_day'], [1, 2, 3])
+        self.assertEqual(data['mastery']['accuracy'], [0, 50.0, 100.0])
+
+    def test_merge_matches_single_pass(self):
+        packages = list(cohort_packages(self.cohort))
+        half = len(packages) // 2
+        merged = aggregate_packages(packages[:half]).merge(aggregate_packages(packages[half:])).as_dict()
+        self.assertEqual(merged['by_note'], aggregate_packages(packages).as_dict()['by_note'])
+
+    def test_histogram_median_is_close(self):
+        rts = np.random.default_rng(0).lognormal(7, 0.5, 1000)
+        package = NoteRecordPackage(log=_log('C', [True] * len(rts), rts.tolist()))
+        aggregate = CohortAggregate()
+        aggregate.add_package(package, 1, learner=1)
+        self.assertAlmostEqual(histogram_median(aggregate.by_note['C4'].rt) / np.median(rts), 1, delta=0.05)
+
+    def test_cached_per_day(self):
+        cohort_analytics(self.cohort)
+        with self.assertNumQueries(1):  # membership only
+            cohort_analytics(self.cohort)
+
+    def test_view_is_for_the_owner(self):
+        url = reverse('cohort-analytics', args=[self.cohort.id])
+        self.client.force_login(self.teacher)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cohort'], 'Year 7 brass')
+        self.client.force_login(self.cohort.members.first())
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,68 @@
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from notes.factories import LearningScenarioFactory
+from notes.models import NoteRecordPackage
+
+THREADS = 8
+POSTS_PER_THREAD = 25
+
+
+class TestConcurrentIngest(TransactionTestCase):
+    """Many writers at once against one package: every answer must survive."""
+
+    def setUp(self):
+        self.scenario = LearningScenarioFactory()
+        self.scenario.created = timezone.now() - timedelta(days=1)
+        self.scenario.save()
+
+    def hammer(self, post):
+        errors = []
+        start = threading.Barrier(THREADS)
+
+        def worker(thread):
+            try:
+                start.wait()
+                for i in range(POSTS_PER_THREAD):
+                    post(thread, i)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def trial(self, thread, i, **extra):
+        # a few notes, so writers both update existing log items and add new ones
+        return {'note': 'CDEFG'[(thread + i) % 5], 'octave': '4', 'alter': '0', 'correct': True,
+                'reaction_time': thread * 1000 + i, **extra}
+
+    def answers(self, packages):
+        return sorted(rt for package in packages for item in package.log for rt in item['reaction_time_log'])
+
+    def test_append_results_loses_nothing(self):
+        package = NoteRecordPackage.objects.create(learningscenario=self.scenario)
+        self.hammer(lambda thread, i: NoteRecordPackage.append_results(package.id, [self.trial(thread, i)]))
+
+        package.refresh_from_db()
+        expected = sorted(t * 1000 + i for t in range(THREADS) for i in range(POSTS_PER_THREAD))
+        self.assertEqual(self.answers([package]), expected)
+        self.assertEqual(sum(item['n'] for item in package.log), THREADS * POSTS_PER_THREAD)
+
+    def test_ingest_trials_loses_nothing_and_creates_one_package(self):
+        opened = timezone.now() - timedelta(minutes=5)
+        self.hammer(lambda thread, i: self.scenario.ingest_trials(
+            [self.trial(thread, i, client_ts=int(timezone.now().timestamp() * 1000))], opened=opened))
+
+        packages = list(NoteRecordPackage.objects.filter(learningscenario=self.scenario))
+        self.assertEqual(len(packages), 1)
+        self.assertEqual(len(self.answers(packages)), THREADS * POSTS_PER_THREAD)
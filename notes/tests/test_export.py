@@ -0,0 +1,107 @@
+import csv
+import io
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from huey.contrib.djhuey import HUEY
+
+from notes import export
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import NoteRecordPackage, TrialExport
+
+
+def _log():
+    return [
+        {'note': 'C', 'alter': '0', 'octave': '4', 'correct': [True, False], 'reaction_time_log': [800, 1200], 'n': 2},
+        {'note': 'B', 'alter': '-1', 'octave': '3', 'correct': [True], 'reaction_time_log': [650], 'n': 1},
+    ]
+
+
+@override_settings(MEDIA_ROOT=tempfile.gettempdir())
+class TestTrialExport(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+        self.scenario = LearningScenarioFactory(user=self.user)
+        for _ in range(3):
+            NoteRecordPackage.objects.create(learningscenario=self.scenario, log=_log())
+        NoteRecordPackage.objects.create(learningscenario=LearningScenarioFactory(), log=_log())
+
+    def _csv_rows(self, content):
+        return list(csv.DictReader(io.StringIO(content.decode())))
+
+    def test_rows(self):
+        rows = list(export.iter_rows(export.export_packages(self.user)))
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[1][4:], ('C', '0', '4', 2, False, 1200))
+
+    def test_csv_is_streamed(self):
+        response = self.client.get(reverse('export-trials'), {'learningscenario': self.scenario.id})
+        self.assertTrue(response.streaming)
+        rows = self._csv_rows(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[2]['note'], 'B')
+        self.assertEqual(rows[2]['reaction_time'], '650')
+
+    async def test_csv_is_streamed_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        with patch.object(export, 'CSV_BATCH_ROWS', 2):
+            response = await self.async_client.get(reverse('export-trials'), {'learningscenario': self.scenario.id})
+            self.assertTrue(response.is_async)
+            pieces = [piece async for piece in response.streaming_content]
+        # the header, then two rows at a time
+        self.assertEqual(len(pieces), 6)
+        rows = self._csv_rows(b''.join(pieces))
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[2]['note'], 'B')
+
+    def test_other_users_are_staff_only(self):
+        other = NoteRecordPackage.objects.exclude(learningscenario__user=self.user).get().learningscenario.user
+        response = self.client.get(reverse('export-trials'), {'user': other.id})
+        rows = self._csv_rows(b''.join(response.streaming_content))
+        self.assertEqual({row['learningscenario_id'] for row in rows}, {str(self.scenario.id)})
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('export-trials'), {'user': other.id})
+        rows = self._csv_rows(b''.join(response.streaming_content))
+        self.assertNotEqual(rows[0]['learningscenario_id'], str(self.scenario.id))
+
+    def test_large_export_runs_as_task(self):
+        HUEY.immediate = True
+        self.addCleanup(setattr, HUEY, 'immediate', False)
+        with patch.object(export, 'INLINE_EXPORT_PACKAGES', 1), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('export-trials'))
+        self.assertEqual(response.status_code, 202)
+        status = self.client.get(response.json()['url']).json()
+        self.assertEqual(status['status'], 'done')
+        download = self.client.get(status['download'])
+        self.assertEqual(len(self._csv_rows(b''.join(download.streaming_content))), 9)
+        TrialExport.objects.get().file.delete()
+
+    def test_background_export_belongs_to_whoever_asked(self):
+        staff = UserFactory(is_staff=True)
+        self.client.force_login(staff)
+        with patch.object(export, 'INLINE_EXPORT_PACKAGES', 1):
+            response = self.client.get(reverse('export-trials'), {'user': self.user.id})
+        self.assertEqual(response.status_code, 202)
+        trial_export = TrialExport.objects.get()
+        self.assertEqual((trial_export.user, trial_export.requested_by), (self.user, staff))
+        self.assertEqual(self.client.get(response.json()['url']).json()['status'], 'pending')
+        # the learner never asked for it
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(response.json()['url']).status_code, 404)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export-trials'), {'format': 'xls'}).status_code, 400)
+
+    @skipUnless(export.parquet_available(), 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        response = self.client.get(reverse('export-trials'), {'format': 'parquet'})
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 9)
+        self.assertEqual(table.column('reaction_time').to_pylist()[:3], [800, 1200, 650])
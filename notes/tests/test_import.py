@@ -0,0 +1,111 @@
+import io
+import json
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from notes import export, importer
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import NoteRecordPackage
+
+DAY_1 = 1_700_000_000_000  # 2023-11-14T22:13:20Z
+HOUR = 60 * 60 * 1000
+
+
+def _jsonl(rows):
+    return '\n'.join(json.dumps(row) for row in rows).encode()
+
+
+class TestImportTrials(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.scenario = LearningScenarioFactory(user=self.user)
+
+    def test_groups_by_day_and_skips_bad_rows(self):
+        rows = [
+            {'note': 'C', 'alter': '0', 'octave': '4', 'correct': True, 'reaction_time': 900, 'client_ts': DAY_1},
+            {'note': 'C', 'alter': '0', 'octave': '4', 'correct': False, 'reaction_time': 1500,
+             'client_ts': DAY_1 + HOUR},
+            {'note': 'H', 'octave': '4', 'client_ts': DAY_1},
+            {'note': 'C', 'octave': '12', 'client_ts': DAY_1},
+            {'note': 'D', 'octave': '4', 'correct': True},
+            {'note': 'E', 'alter': '-1', 'octave': '4', 'correct': 'true', 'reaction_time': 700,
+             'timestamp': '2023-11-20T10:00:00+00:00'},
+        ]
+        report = importer.import_file(self.scenario, io.BytesIO(_jsonl(rows) + b'\n{broken'), 'history.jsonl')
+        self.assertEqual((report.rows, report.imported, report.skipped, report.packages), (7, 3, 4, 2))
+        self.assertEqual(len(report.errors), 4)
+
+        packages = NoteRecordPackage.objects.filter(learningscenario=self.scenario).order_by('created')
+        self.assertEqual([p.created.date().isoformat() for p in packages], ['2023-11-14', '2023-11-20'])
+        self.assertEqual(packages[0].log[0]['correct'], [True, False])
+        self.assertEqual(packages[1].log[0]['alter'], '-1')
+
+    def test_chunks_are_written_as_they_go(self):
+        # out of order, and each day spread over several chunks
+        rows = [{'note': 'C', 'octave': '4', 'correct': i % 3 == 0, 'reaction_time': 500 + i,
+                 'client_ts': DAY_1 + (i % 2) * 24 * HOUR + (20 - i) * 60_000} for i in range(20)]
+        whole = LearningScenarioFactory(user=self.user)
+        importer.import_file(whole, io.BytesIO(_jsonl(rows)), 'history.jsonl')
+
+        with patch.object(importer, 'VALIDATE_CHUNK_ROWS', 3), \
+                patch.object(NoteRecordPackage.objects, 'bulk_create',
+                             wraps=NoteRecordPackage.objects.bulk_create) as bulk_create:
+            report = importer.import_file(self.scenario, io.BytesIO(_jsonl(rows)), 'history.jsonl')
+
+        self.assertEqual((report.imported, report.packages), (20, 2))
+        self.assertGreater(bulk_create.call_count, 1)
+        chunked = NoteRecordPackage.objects.filter(learningscenario=self.scenario).order_by('created')
+        expected = NoteRecordPackage.objects.filter(learningscenario=whole).order_by('created')
+        self.assertEqual([p.created for p in chunked], [p.created for p in expected])
+        for package, other in zip(chunked, expected):
+            self.assertEqual(sorted(package.log[0]['reaction_time_log']), sorted(other.log[0]['reaction_time_log']))
+            self.assertEqual(package.log[0]['n'], other.log[0]['n'])
+
+    def test_export_round_trip(self):
+        source = LearningScenarioFactory(user=self.user)
+        log = [{'note': 'G', 'alter': '1', 'octave': '3', 'correct': [True, False], 'reaction_time_log': [500, 600],
+                'n': 2}]
+        NoteRecordPackage.objects.create(learningscenario=source, log=log)
+        with export.export_to_tempfile(export.iter_rows(export.export_packages(self.user, source)), 'csv') as f:
+            report = importer.import_file(self.scenario, f, 'trials.csv')
+        self.assertEqual(report.imported, 2)
+        self.assertEqual(NoteRecordPackage.objects.get(learningscenario=self.scenario).log, log)
+
+    def test_command_reports_throughput(self):
+        rows = [{'note': 'A', 'octave': '4', 'correct': True, 'reaction_time': 800, 'client_ts': DAY_1 + i * HOUR}
+                for i in range(100)]
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as f:
+            f.write(_jsonl(rows))
+            f.flush()
+            out = StringIO()
+            call_command('import_trials', f.name, str(self.scenario.id), stdout=out)
+        self.assertIn('Imported 100 of 100 rows into 6 packages', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('history.jsonl', _jsonl([{'note': 'B', 'octave': '4', 'client_ts': DAY_1}]))
+        response = self.client.post(reverse('import-trials', args=[self.scenario.id]), {'trials': upload})
+        self.assertEqual(response.json()['imported'], 1)
+        other = LearningScenarioFactory()
+        response = self.client.post(reverse('import-trials', args=[other.id]), {'trials': upload})
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_rejects_bad_files(self):
+        self.client.force_login(self.user)
+        url = reverse('import-trials', args=[self.scenario.id])
+        latin1 = SimpleUploadedFile('history.csv', 'note,octave,client_ts\nC,4,1\nCé,4,2\n'.encode('latin-1'))
+        response = self.client.post(url, {'trials': latin1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.json()['error'])
+
+        with patch.object(importer, 'MAX_UPLOAD_BYTES', 10):
+            upload = SimpleUploadedFile('history.jsonl', _jsonl([{'note': 'B', 'octave': '4', 'client_ts': DAY_1}]))
+            self.assertEqual(self.client.post(url, {'trials': upload}).status_code, 413)
+        self.assertFalse(NoteRecordPackage.objects.filter(learningscenario=self.scenario).exists())
@@ -3,9 +3,14 @@ Tests for the instrument_data module and JSON file format.
 """
 import json
 import os
+from types import MappingProxyType
+
 from django.test import TestCase
 from django.conf import settings
-from notes.instrument_data import load_instruments, get_instrument, get_instrument_range, get_fingerings
+from notes import pitch
+from notes.instrument_data import load_instruments, get_instrument, get_instrument_range, get_fingerings, \
+    fingering_index
+from notes.views import fingering_index_url
 
 
 class TestInstrumentDataModule(TestCase):
@@ -164,3 +169,74 @@ class TestInstrumentJSONFormat(TestCase):
                     for note, fingering_list in fingerings.items():
                         self.assertIsInstance(fingering_list, list,
                                             f"Fingering for {note} is not a list in {filename}")
+
+
+class TestFingeringIndex(TestCase):
+    def test_get_fingerings_is_read_only_and_not_copied(self):
+        fingerings = get_fingerings('Trumpet')
+        self.assertIsInstance(fingerings, MappingProxyType)
+        with self.assertRaises(TypeError):
+            fingerings['C/4'] = ['1']
+        self.assertIs(fingerings['C/4'], get_instrument('Trumpet')['fingerings']['C/4'])
+
+    def test_untransposed_index(self):
+        index = fingering_index('Trumpet', 'Bb', 'Bb')
+        self.assertEqual(index.shift, 0)
+        self.assertEqual(index.get(pitch.parse_pitch('C/4')), ('',))
+        self.assertEqual(index.get(pitch.parse_pitch('F#/3')), ('1+2+3',))
+        self.assertIs(index, fingering_index('Trumpet', 'Bb', 'Bb'))
+
+    def test_transposed_index_matches_key_adjust(self):
+        # Bb instrument displayed at concert Eb: keyAdjust shifts written notes down 5 semitones
+        index = fingering_index('Trumpet', 'Bb', 'Eb')
+        self.assertEqual(index.shift, -5)
+        self.assertEqual(index.get(pitch.parse_pitch('G/3')), ('',))  # written C/4
+
+    def test_enharmonic_spellings_are_merged(self):
+        fingerings = get_fingerings('Tenor Horn')
+        index = fingering_index('Tenor Horn')
+        expected = list(dict.fromkeys(fingerings['C#/3'] + fingerings['Db/3']))
+        self.assertEqual(list(index.get(pitch.parse_pitch('Db/3'))), expected)
+
+    def test_served_from_hashed_url(self):
+        url = fingering_index_url('Trumpet', 'treble', 'Bb', 'Eb')
+        index = fingering_index('Trumpet', 'Bb', 'Eb')
+        self.assertTrue(url.endswith(f'/{index.digest}.json'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.json()['shift'], -5)
+
+        stale = self.client.get(url.replace(index.digest, 'oldhash'))
+        self.assertEqual(stale.status_code, 302)
+        self.assertEqual(stale['Location'], url)
+
+    def test_unknown_keys_are_not_cached(self):
+        url = fingering_index_url('Trumpet', 'treble', 'Bb', 'Eb')
+        self.client.get(url)
+        cached = fingering_index.cache_info().currsize
+        for bogus in ('H', 'Bbb', 'x' * 50):
+            self.assertEqual(self.client.get(url.replace('/Bflat/', f'/{bogus}/')).status_code, 404)
+            self.assertEqual(self.client.get(url.replace('/Eflat/', f'/{bogus}/')).status_code, 404)
+        self.assertEqual(fingering_index.cache_info().currsize, cached)
+
+    def test_bass_clef_is_not_transposed(self):
+        self.assertEqual(fingering_index_url('Trombone', 'bass', 'Bb', 'C'),
+                         fingering_index_url('Trombone', 'bass', 'Bb', ''))
+
+
+class TestPitch(TestCase):
+    def test_parse_pitch(self):
+        self.assertEqual(pitch.parse_pitch('C/4'), 60)
+        self.assertEqual(pitch.parse_pitch('C#4'), 61)
+        self.assertEqual(pitch.parse_pitch('Bbb/3'), 57)
+        self.assertEqual(pitch.parse_pitch('Cb/4'), 59)
+        with self.assertRaises(ValueError):
+            pitch.parse_pitch('H/4')
+
+    def test_key_shift_matches_key_adjust(self):
+        self.assertEqual(pitch.key_shift('Bb', 'C'), -2)
+        self.assertEqual(pitch.key_shift('Bb', 'Eb'), -5)
+        self.assertEqual(pitch.key_shift('F', 'C'), 5)
+        self.assertEqual(pitch.key_shift('Bb', ''), 0)
+        self.assertEqual(pitch.pitch_name(61), 'C#/4')
@@ -0,0 +1,134 @@
+import json
+from datetime import timedelta
+from urllib.parse import quote
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import NoteRecordPackage
+
+
+def ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+class TestIngestTrials(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.scenario = LearningScenarioFactory(user=self.user)
+        self.scenario.created = timezone.now() - timedelta(days=10)
+        self.scenario.save()
+
+    def trial(self, when, note='C', correct=True, rt=500):
+        return {'note': note, 'octave': '4', 'alter': '0', 'correct': correct, 'reaction_time': rt,
+                'client_ts': ms(when)}
+
+    def test_out_of_order_trials_are_sorted_into_daily_packages(self):
+        now = timezone.now()
+        three_days_ago = now - timedelta(days=3)
+        trials = [
+            self.trial(now - timedelta(minutes=1), rt=300),
+            self.trial(three_days_ago + timedelta(minutes=5), rt=200),
+            self.trial(three_days_ago, rt=100),
+        ]
+        packages = self.scenario.ingest_trials(trials)
+
+        self.assertEqual(len(packages), 2)
+        old, recent = sorted(NoteRecordPackage.objects.filter(learningscenario=self.scenario),
+                             key=lambda p: p.created)
+        self.assertEqual(old.log[0]['reaction_time_log'], [100, 200])
+        self.assertEqual(recent.log[0]['reaction_time_log'], [300])
+
+    def test_trials_join_an_existing_package_within_its_window(self):
+        package = NoteRecordPackage.objects.create(learningscenario=self.scenario,
+                                                   created=timezone.now() - timedelta(hours=2))
+        self.scenario.ingest_trials([self.trial(timezone.now() - timedelta(hours=1))])
+
+        self.assertEqual(NoteRecordPackage.objects.filter(learningscenario=self.scenario).count(), 1)
+        package.refresh_from_db()
+        self.assertEqual(package.log[0]['n'], 1)
+
+    def test_future_timestamps_are_clamped(self):
+        self.scenario.ingest_trials([self.trial(timezone.now() + timedelta(days=2))])
+        package = NoteRecordPackage.objects.get(learningscenario=self.scenario)
+        self.assertLessEqual(package.created, timezone.now())
+
+    def test_package_token_dates_the_new_package_at_page_open(self):
+        opened = (timezone.now() - timedelta(minutes=10)).replace(microsecond=0)
+        token = self.scenario.package_token(opened)
+        self.assertEqual(self.scenario.read_package_token(token), opened)
+
+        self.scenario.ingest_trials([self.trial(opened + timedelta(minutes=2))], opened=opened)
+        # a later batch from the same page joins that package rather than starting another
+        self.scenario.ingest_trials([self.trial(opened + timedelta(minutes=5))], opened=opened)
+        package = NoteRecordPackage.objects.get(learningscenario=self.scenario)
+        self.assertEqual(package.created, opened)
+        self.assertEqual(package.log[0]['n'], 2)
+
+    def test_package_tokens_are_checked(self):
+        other = LearningScenarioFactory(user=self.user)
+        token = other.package_token(timezone.now())
+        self.assertIsNone(self.scenario.read_package_token(token))
+        self.assertIsNone(self.scenario.read_package_token(token[:-2] + 'xx'))
+
+
+class TestPracticeDataBatchView(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.scenario = LearningScenarioFactory(user=self.user)
+        self.url = reverse('practice-data-batch', kwargs={'learningscenario_id': self.scenario.id})
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        return self.client.post(self.url, data=json.dumps(payload), content_type='application/json')
+
+    def test_batch_is_stored(self):
+        now = ms(timezone.now())
+        resp = self.post({'trials': [
+            {'note': 'D', 'octave': '4', 'alter': '0', 'correct': False, 'reaction_time': 900, 'client_ts': now - 10},
+            {'note': 'D', 'octave': '4', 'alter': '0', 'correct': True, 'reaction_time': 700, 'client_ts': now},
+        ]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['received'], 2)
+        log = NoteRecordPackage.objects.get(learningscenario=self.scenario).log
+        self.assertEqual(log[0]['correct'], [False, True])
+
+    def test_practice_page_is_read_only_until_the_first_answer(self):
+        response = self.client.get(reverse('practice', kwargs={'learningscenario_id': self.scenario.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(NoteRecordPackage.objects.filter(learningscenario=self.scenario).exists())
+
+        token = response.context['package_token']
+        self.assertIn(f'?package={quote(token)}', response.content.decode())
+        resp = self.client.post(f'{self.url}?package={token}', content_type='application/json', data=json.dumps(
+            {'trials': [{'note': 'C', 'octave': '4', 'alter': '0', 'correct': True, 'client_ts': ms(timezone.now())}]}))
+        self.assertEqual(resp.status_code, 200)
+        package = NoteRecordPackage.objects.get(learningscenario=self.scenario)
+        self.assertEqual(package.created, self.scenario.read_package_token(token))
+
+    def test_invalid_batches_are_rejected(self):
+        for payload in [{}, {'trials': []}, {'trials': [{'note': 'C', 'octave': '4'}]}]:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        self.assertFalse(NoteRecordPackage.objects.filter(learningscenario=self.scenario).exists())
+
+    def test_invalid_trials_are_skipped_and_reported(self):
+        now = ms(timezone.now())
+        resp = self.post({'trials': [
+            {'note': 'C', 'octave': '4', 'correct': True, 'client_ts': now - 20},
+            {'note': 'H', 'octave': '4', 'client_ts': now - 10},
+            {'note': 'C', 'octave': '4', 'correct': False},
+            {'note': 'C', 'octave': '4', 'correct': True, 'client_ts': now},
+        ]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['received'], 2)
+        self.assertEqual([item['index'] for item in resp.json()['rejected']], [1, 2])
+        log = NoteRecordPackage.objects.get(learningscenario=self.scenario).log
+        self.assertEqual(log[0]['correct'], [True, True])
+
+    def test_other_users_scenarios_are_not_found(self):
+        self.client.force_login(UserFactory())
+        resp = self.post({'trials': [{'note': 'C', 'octave': '4', 'client_ts': ms(timezone.now())}]})
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from notes import partitions
+from notes.factories import LearningScenarioFactory
+from notes.models import LearningScenario, NoteRecordPackage
+
+
+class TestPartitionHelpers(TestCase):
+    def test_names_and_months(self):
+        self.assertEqual(partitions.partition_name(date(2025, 3, 1)), 'notes_noterecordpackage_y2025m03')
+        self.assertEqual(partitions._add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(partitions._add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partitions._bound(date(2025, 3, 1)), '2025-03-01T00:00:00+00:00')
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite behaviour')
+    def test_nothing_to_do_without_postgresql(self):
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(partitions.ensure_partitions(), [])
+        self.assertEqual(partitions.drop_empty_partitions(before=date.today()), [])
+        self.assertFalse(partitions.partition_table())
+
+
+class TestBoundedPackageQueries(TestCase):
+    def setUp(self):
+        self.scenario = LearningScenarioFactory()
+        LearningScenario.objects.filter(id=self.scenario.id).update(created=timezone.now() - timedelta(days=5))
+        self.scenario.refresh_from_db()
+
+    def package(self, days_ago):
+        package = NoteRecordPackage.objects.create(learningscenario=self.scenario)
+        NoteRecordPackage.objects.filter(id=package.id).update(created=timezone.now() - timedelta(days=days_ago))
+        return package
+
+    def test_last_practiced_is_the_newest_package(self):
+        self.assertEqual(self.scenario.last_practiced(), "Never")
+        self.package(0)
+        # created later, but dated earlier
+        self.package(3)
+        self.assertEqual(self.scenario.last_practiced(), "Today")
+
+    def test_add_history(self):
+        self.package(0)
+        self.package(1)
+        self.package(3)
+        LearningScenario.add_history([self.scenario])
+        self.assertEqual(self.scenario.streak_count, 2)
+        self.assertEqual(sum(self.scenario.practice_history.values()), 3)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+class TestPartitionedTable(TestCase):
+    def test_partition_and_prune(self):
+        scenario = LearningScenarioFactory()
+        old = NoteRecordPackage.objects.create(learningscenario=scenario)
+        NoteRecordPackage.objects.filter(id=old.id).update(created=datetime(2024, 1, 10, tzinfo=dt_timezone.utc))
+        self.assertTrue(partitions.partition_table())
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(NoteRecordPackage.objects.get(id=old.id).learningscenario_id, scenario.id)
+        self.assertGreater(NoteRecordPackage.objects.create(learningscenario=scenario).id, old.id)
+
+        NoteRecordPackage.objects.filter(id=old.id).delete()
+        self.assertIn('notes_noterecordpackage_y2024m01',
+                      partitions.drop_empty_partitions(before=date(2024, 2, 1)))
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from notes import progress, tools
+from notes.factories import LearningScenarioFactory
+from notes.models import NoteRecordPackage
+from notes.rollup import rollup_packages
+
+
+def _item(note, octave, alter, correct, rts):
+    return {'note': note, 'octave': octave, 'alter': alter, 'correct': correct, 'reaction_time_log': rts,
+            'n': len(correct)}
+
+
+# What PROGRESS_SQL returns for the packages below (checked on PostgreSQL 16), worked out by hand:
+# on 1 March, 4 of 8 answers right with reaction times 0 (the None), 400, 500 ... 1200
+SQL_ROWS = [
+    ('date', '2025-03-01', 4, 8, 650.0),
+    ('date', '2025-03-02', 2, 2, 650.5),
+    ('date', '2025-03-03', 0, 0, None),
+    ('date', '2025-03-04', 0, 0, None),
+    ('item', 'B3b', 0, 2, 600.0),
+    ('item', 'C4', 3, 4, 550.0),
+    ('item', 'D5', 2, 2, 650.5),
+    ('item', 'F4#', 1, 2, 850.0),
+]
+
+
+class TestProgressBackends(TestCase):
+    def setUp(self):
+        scenario = LearningScenarioFactory()
+        logs = [
+            (datetime(2025, 3, 1, 9, tzinfo=dt_timezone.utc), [
+                _item('C', '4', '0', [True, False, True], [500, 700, 600]),
+                _item('F', '4', '1', [False, True], [900, 800]),
+            ]),
+            (datetime(2025, 3, 1, 23, tzinfo=dt_timezone.utc), [
+                # more reaction times than results: only the paired ones count
+                _item('C', '4', '0', [True], [400, 1000]),
+                # no results recorded at all: every reaction time counts as a wrong answer
+                _item('B', '3', '-1', [], [1200, None]),
+            ]),
+            (datetime(2025, 3, 2, 8, tzinfo=dt_timezone.utc), [_item('D', '5', '0', [True, True], [650, 651])]),
+            (datetime(2025, 3, 3, 8, tzinfo=dt_timezone.utc), []),
+            (datetime(2025, 3, 4, 8, tzinfo=dt_timezone.utc), None),
+        ]
+        for created, log in logs:
+            package = NoteRecordPackage.objects.create(learningscenario=scenario, log=log)
+            NoteRecordPackage.objects.filter(id=package.id).update(created=created)
+        self.packages = NoteRecordPackage.objects.filter(learningscenario=scenario)
+
+    def test_python_backend_is_the_sqlite_default(self):
+        if progress.sql_available():
+            self.skipTest('PostgreSQL')
+        expected = rollup_packages(self.packages).chart_data('by_note', sort_items=tools.sort_notes)
+        self.assertEqual(progress.progress_chart_data(self.packages), expected)
+
+    def test_sql_rows_give_the_same_payload(self):
+        self.assertEqual(progress.rollup_from_rows(SQL_ROWS).chart_data('by_note', sort_items=tools.sort_notes),
+                         progress.progress_chart_data(self.packages, backend='python'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_progress_sql_rows(self):
+        query = self.packages.values_list('created', 'log').order_by()
+        sql, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(progress.PROGRESS_SQL % {'packages': sql}, params)
+            self.assertEqual(sorted(cursor.fetchall()), SQL_ROWS)
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_sql_backend_matches_python(self):
+        self.assertEqual(progress.progress_chart_data(self.packages, backend='sql'),
+                         progress.progress_chart_data(self.packages, backend='python'))
@@ -0,0 +1,81 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from notes import serialisation
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import LearningScenario, NoteRecordPackage
+from notes.serialisation import PayloadError, TrialPost
+
+
+class TestDumpsLoads(TestCase):
+    def test_round_trip(self):
+        data = {'notes': [{'note': 'C', 'octave': '4', 'correct': [True, False]}], 'n': 3}
+        self.assertEqual(serialisation.loads(serialisation.dumps(data)), data)
+
+    def test_loads_invalid_json_raises_payload_error(self):
+        with self.assertRaises(PayloadError):
+            serialisation.loads(b'{not json')
+
+    def test_json_script_escapes_html(self):
+        html = serialisation.json_script({'a': '</script><b>&'}, 'my-id')
+        self.assertIn('id="my-id"', html)
+        self.assertNotIn('</script><b>', html)
+        self.assertIn('\\u003C/script\\u003E', html)
+
+
+class TestTrialPost(TestCase):
+    def test_defaults_match_add_result(self):
+        trial = TrialPost.from_dict({'note': 'E', 'octave': '4'})
+        self.assertEqual(trial.as_dict(),
+                         {'note': 'E', 'octave': '4', 'alter': '0', 'correct': False, 'reaction_time': 0,
+                          'client_ts': None})
+
+    def test_numbers_are_normalised(self):
+        trial = TrialPost.from_dict({'note': 'F', 'octave': 4, 'alter': 1, 'correct': None,
+                                     'reaction_time': '812.6'})
+        self.assertEqual(trial.octave, '4')
+        self.assertEqual(trial.alter, '1')
+        self.assertIsNone(trial.correct)
+        self.assertEqual(trial.reaction_time, 812)
+
+    def test_invalid_payloads(self):
+        bad = [
+            [],
+            {'octave': '4'},
+            {'note': 'H', 'octave': '4'},
+            {'note': 'C', 'octave': 'four'},
+            {'note': 'C', 'octave': '4', 'alter': '3'},
+            {'note': 'C', 'octave': '4', 'correct': 'yes'},
+            {'note': 'C', 'octave': '4', 'reaction_time': 'slow'},
+            {'note': 'C', 'octave': '4', 'reaction_time': -5},
+        ]
+        for payload in bad:
+            with self.subTest(payload=payload), self.assertRaises(PayloadError):
+                TrialPost.from_dict(payload)
+
+
+class TestPracticeDataValidation(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+        ls = LearningScenarioFactory(user=self.user)
+        self.package, _progress = LearningScenario.progress_latest_serialised(ls.id)
+        self.url = reverse('practice-data', kwargs={'package_id': self.package.id})
+
+    def test_invalid_trial_is_rejected(self):
+        resp = self.client.post(self.url, data=json.dumps({'note': 'Z', 'octave': '4'}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
+        self.assertFalse(NoteRecordPackage.objects.get(id=self.package.id).log)
+
+    def test_valid_trial_is_stored(self):
+        resp = self.client.post(self.url, data=json.dumps({'note': 'C', 'alter': '0', 'octave': '4',
+                                                           'reaction_time': 640, 'correct': True}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        log = NoteRecordPackage.objects.get(id=self.package.id).log
+        self.assertEqual(log[0]['reaction_time_log'], [640])
+        self.assertEqual(log[0]['correct'], [True])
@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.transposition import Transposition, stem_direction, transposition_table
+
+
+class TestTransposition(TestCase):
+    def test_untransposed_keeps_spelling(self):
+        t = Transposition('Bb', 'Bb')
+        self.assertEqual(t.shown('Bb/4'), 'Bb/4')
+        self.assertEqual(Transposition('Bb', '').shown('Eb/5'), 'Eb/5')
+
+    def test_transposed_uses_sharps(self):
+        t = Transposition('Bb', 'C')
+        self.assertEqual(t.semitones, -2)
+        self.assertEqual(t.shown('C/4'), 'A#/3')
+        self.assertEqual(t.shown('Fbb/4'), 'C#/4')
+
+    def test_accidentals_cross_octaves(self):
+        # keyAdjust's string arithmetic showed these as A/5, A#/3 and A#/3 (E## read as C)
+        t = Transposition('Bb', 'C')
+        self.assertEqual(t.shown('Cb/5'), 'A/4')
+        self.assertEqual(t.shown('B#/4'), 'A#/4')
+        self.assertEqual(t.shown('E##/4'), 'E/4')
+
+    def test_octave_shift_only_moves_drawn_note(self):
+        t = Transposition('Bb', 'C', octave_shift=-1)
+        self.assertEqual(t.shown('D/5'), 'C/5')
+        self.assertEqual(t.drawn('D/5'), 'C/4')
+
+    def test_bass_clef_is_not_transposed(self):
+        self.assertEqual(Transposition('Bb', 'C', clef='bass').shown('C/3'), 'C/3')
+
+    def test_written_and_concert(self):
+        self.assertEqual(Transposition('Bb', 'Bb').written_and_concert('C/4'), ('C/4', 'A#/3'))
+        self.assertEqual(Transposition('C').written_and_concert('E/4'), ('E/4', 'E/4'))
+
+    def test_stem_direction(self):
+        self.assertEqual(stem_direction('B/4', 'treble'), -1)
+        self.assertEqual(stem_direction('A/4', 'treble'), 1)
+        self.assertEqual(stem_direction('D/3', 'bass'), -1)
+        self.assertEqual(stem_direction('C#/3', 'bass'), 1)
+
+
+class TestTranspositionTable(TestCase):
+    def test_table_covers_instrument_range(self):
+        table = transposition_table('Trumpet', 'Bb', 'C', 1, 'treble')
+        self.assertEqual(table['shift'], -2)
+        self.assertEqual(table['notes']['C/4'], ['A#/3', 'A#/4', 1])
+        self.assertIn('F#/3', table['notes'])
+        self.assertIn('Gb/3', table['notes'])
+        self.assertNotIn('C/2', table['notes'])
+        self.assertIs(table, transposition_table('Trumpet', 'Bb', 'C', 1, 'treble'))
+
+    def test_emitted_to_practice_page(self):
+        user = UserFactory()
+        self.client.force_login(user)
+        ls = LearningScenarioFactory(user=user)
+        response = self.client.get(reverse('practice', kwargs={'learningscenario_id': ls.id}))
+        self.assertContains(response, 'id="transposition-table"')
+        self.assertIn('C/4', response.context['transposition']['notes'])
@@ -0,0 +1,174 @@
+import json
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+import redis
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from notes import progress, trial_buffer
+from notes.factories import LearningScenarioFactory, UserFactory
+from notes.models import LearningScenario, NoteRecordPackage
+
+
+def ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def trial(when, note='C', correct=True, rt=500, octave='4'):
+    return {'note': note, 'octave': octave, 'alter': '0', 'correct': correct, 'reaction_time': rt, 'client_ts': ms(when)}
+
+
+def redis_available():
+    try:
+        return trial_buffer._client().ping()
+    except redis.RedisError:
+        return False
+
+
+class TestMergingUnflushedTrials(TestCase):
+    """The parts that don't need Redis: folding queued trials into what learners see."""
+
+    def setUp(self):
+        self.scenario = LearningScenarioFactory()
+        self.scenario.created = timezone.now() - timedelta(days=10)
+        self.scenario.save()
+
+    def test_apply_pending_only_takes_trials_from_the_window(self):
+        package = NoteRecordPackage(learningscenario=self.scenario, created=timezone.now() - timedelta(hours=1))
+        trial_buffer.apply_pending(package, [
+            trial(timezone.now() - timedelta(hours=3), rt=100),
+            trial(timezone.now() - timedelta(minutes=5), rt=200),
+            trial(timezone.now(), note='D', rt=300),
+        ], since=package.created)
+
+        self.assertEqual([item['reaction_time_log'] for item in package.log], [[200], [300]])
+        self.assertIsNone(package.pk)
+
+    def test_ingest_entries_keeps_each_pages_package_date(self):
+        opened = (timezone.now() - timedelta(hours=2)).replace(microsecond=0)
+        entries = [(trial(opened + timedelta(minutes=1)), opened), (trial(opened + timedelta(minutes=2)), opened),
+                   (trial(timezone.now() - timedelta(days=3)), None)]
+
+        self.assertEqual(trial_buffer.ingest_entries(self.scenario, entries), 3)
+
+        packages = NoteRecordPackage.objects.filter(learningscenario=self.scenario).order_by('created')
+        self.assertEqual([p.log[0]['n'] for p in packages], [1, 2])
+        self.assertEqual(packages[1].created, opened)
+
+    def test_a_failed_batch_writes_nothing(self):
+        opened = (timezone.now() - timedelta(hours=2)).replace(microsecond=0)
+        entries = [(trial(timezone.now() - timedelta(days=3)), None), (trial(opened + timedelta(minutes=1)), opened)]
+        ingest_trials = LearningScenario.ingest_trials
+        calls = []
+
+        def second_group_fails(scenario, trials, opened=None, **kwargs):
+            calls.append(opened)
+            if len(calls) == 2:
+                raise DatabaseError("lost the connection")
+            return ingest_trials(scenario, trials, opened, **kwargs)
+
+        with mock.patch.object(LearningScenario, 'ingest_trials', second_group_fails):
+            with self.assertRaises(DatabaseError):
+                trial_buffer.ingest_entries(self.scenario, entries)
+
+        # the first group was rolled back with the second, so a retry can't write it twice
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(NoteRecordPackage.objects.filter(learningscenario=self.scenario).exists())
+
+    @override_settings(TRIAL_WRITE_BEHIND=True)
+    def test_one_failed_scenario_doesnt_stop_the_rest(self):
+        client = mock.Mock()
+        client.smembers.return_value = {b'1', b'2', b'3'}
+
+        def flush(learningscenario_id):
+            if learningscenario_id == 2:
+                raise DatabaseError("lost the connection")
+            return 10
+
+        with mock.patch.object(trial_buffer, '_client', return_value=client), \
+                mock.patch.object(trial_buffer, 'flush', side_effect=flush) as flushed, \
+                self.assertLogs('notes.trial_buffer', 'ERROR'):
+            self.assertEqual(trial_buffer.flush_all(), 20)
+        self.assertEqual(sorted(call.args[0] for call in flushed.call_args_list), [1, 2, 3])
+
+    def test_the_flush_lock_is_renewed_for_every_batch(self):
+        client = mock.MagicMock()
+        lock = client.lock.return_value.__enter__.return_value
+        entry = trial_buffer._encode(trial(timezone.now() - timedelta(days=3)), None)
+        client.lrange.side_effect = [[entry], [entry], []]
+        client.llen.return_value = 0
+        with mock.patch.object(trial_buffer, '_client', return_value=client):
+            self.assertEqual(trial_buffer.flush(self.scenario.id), 2)
+        self.assertEqual(lock.reacquire.call_count, 3)
+
+        # a lock that has expired (another run may hold it now) stops the flush before it writes
+        client.lrange.reset_mock(side_effect=True)
+        lock.reacquire.side_effect = redis.exceptions.LockNotOwnedError("expired")
+        with mock.patch.object(trial_buffer, '_client', return_value=client):
+            with self.assertRaises(redis.exceptions.LockNotOwnedError):
+                trial_buffer.flush(self.scenario.id)
+        client.lrange.assert_not_called()
+
+    def test_pending_trials_are_counted_in_the_progress_chart(self):
+        NoteRecordPackage.objects.create(learningscenario=self.scenario, log=[
+            {'note': 'C', 'octave': '4', 'alter': '0', 'correct': [True], 'reaction_time_log': [400], 'n': 1}])
+        packages = NoteRecordPackage.objects.filter(learningscenario=self.scenario)
+
+        data = progress.progress_chart_data(packages, pending=[trial(timezone.now(), correct=False, rt=600)])
+
+        self.assertEqual(data['by_note']['labels'], ['C4'])
+        self.assertEqual(data['by_note']['accuracy'], [50.0])
+        self.assertEqual(data['by_note']['reaction_time'], [500])
+
+    def test_nothing_is_pending_when_write_behind_is_off(self):
+        self.assertEqual(trial_buffer.pending_trials(self.scenario.id), [])
+        self.assertEqual(trial_buffer.flush_all(), 0)
+
+
+@skipUnless(redis_available(), "needs a Redis server at TRIAL_BUFFER_URL")
+@override_settings(TRIAL_WRITE_BEHIND=True)
+class TestWriteBehind(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+        self.scenario = LearningScenarioFactory(user=self.user)
+        self.scenario.created = timezone.now() - timedelta(days=10)
+        self.scenario.save()
+
+    def tearDown(self):
+        trial_buffer._client().delete(trial_buffer._key(self.scenario.id))
+        trial_buffer._client().srem(trial_buffer.PENDING_KEY, self.scenario.id)
+
+    def post(self, trials):
+        return self.client.post(reverse('practice-data-batch', args=[self.scenario.id]),
+                                json.dumps({'trials': trials}), content_type='application/json')
+
+    def test_posts_are_queued_not_written(self):
+        response = self.post([trial(timezone.now())])
+
+        self.assertEqual(response.json(), {'success': True, 'received': 1, 'buffered': True})
+        self.assertFalse(NoteRecordPackage.objects.filter(learningscenario=self.scenario).exists())
+        self.assertEqual(len(trial_buffer.pending_trials(self.scenario.id)), 1)
+
+    def test_practice_page_sees_queued_trials(self):
+        self.scenario.notes = ['C 0 4']
+        self.scenario.save()
+        self.post([trial(timezone.now(), rt=321)])
+
+        package, progress_notes = LearningScenario.progress_latest_serialised(self.scenario.id, create=False)
+
+        self.assertIsNone(package.pk)
+        self.assertEqual([item['reaction_time_log'] for item in progress_notes], [[321]])
+
+    def test_flush_writes_and_empties_the_queue(self):
+        self.post([trial(timezone.now() - timedelta(minutes=2)), trial(timezone.now() - timedelta(minutes=1))])
+
+        self.assertEqual(trial_buffer.flush(self.scenario.id), 2)
+
+        package = NoteRecordPackage.objects.get(learningscenario=self.scenario)
+        self.assertEqual(package.log[0]['n'], 2)
+        self.assertEqual(trial_buffer.pending_trials(self.scenario.id), [])
+        self.assertNotIn(str(self.scenario.id).encode(), trial_buffer._client().smembers(trial_buffer.PENDING_KEY))
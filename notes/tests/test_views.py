@@ -1,11 +1,16 @@
-from datetime import datetime
+import base64
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from asgiref.sync import sync_to_async
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.utils import timezone
 
 from notes.factories import LearningScenarioFactory, UserFactory
-from notes.models import LearningScenario
+from notes.instrument_data import fingering_index
+from notes.models import LearningScenario, NoteRecordPackage
+from notes.transposition import transposition_table
 from notes.views import common_context
 
 
@@ -39,6 +44,29 @@ class TestPagesWork(TestCase):
                 self.assertTrue(item in response.context)
                 self.assertTrue(len(str(response.context[item])) > 0)
 
+    def test_practice_try_rejects_made_up_settings(self):
+        kwargs = {'instrument': 'Trumpet', 'clef': 'Treble', 'key': 'Bb', 'level': 'Beginner', 'octave': 0,
+                  'signatures': '0'}
+        self.client.get(reverse('practice-try-sigs', kwargs=kwargs))
+        cached = transposition_table.cache_info().currsize, fingering_index.cache_info().currsize
+        for bogus in ({'key': 'H'}, {'clef': 'Sideways'}, {'octave': 40}, {'octave': -7}):
+            response = self.client.get(reverse('practice-try-sigs', kwargs={**kwargs, **bogus}))
+            self.assertEqual(response.status_code, 404, bogus)
+        abs_kwargs = {**kwargs, 'absolute_pitch': 'Qflat'}
+        self.assertEqual(self.client.get(reverse('practice-try-sigs-abs', kwargs=abs_kwargs)).status_code, 404)
+        self.assertEqual((transposition_table.cache_info().currsize, fingering_index.cache_info().currsize), cached)
+
+    def test_practice_managers_are_static(self):
+        ls = LearningScenarioFactory(user=self.user, level='Beginner')
+        response = self.client.get(reverse('practice', kwargs={'learningscenario_id': ls.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['practice_config']['level'], 'beginner')
+        html = response.content.decode()
+        self.assertIn('id="practice-config"', html)
+        for manager in ['config', 'stave_manager', 'session_manager', 'learning_manager']:
+            self.assertIn(f'js/practice/{manager}.js', html)
+        # the managers' code is no longer inlined into the page
+        self.assertNotIn('const stave_manager', html)
 
     def test_learning_home(self):
         url = reverse('notes-home')
@@ -51,6 +79,31 @@ class TestPagesWork(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue('learningscenarios' in response.context)
 
+    def test_learning_home_size_does_not_grow_with_age(self):
+        self.client.force_login(self.user)
+        scenario = LearningScenarioFactory(user=self.user)
+
+        def page_size(days_old):
+            LearningScenario.objects.filter(id=scenario.id).update(created=timezone.now() - timedelta(days=days_old))
+            return len(self.client.get(reverse('notes-home')).content)
+
+        # a bit per day: three years adds about 180 bytes of base64, not a thousand elements
+        self.assertLess(page_size(3 * 365) - page_size(7), 250)
+
+    def test_add_history_sends_a_bitset(self):
+        scenario = LearningScenarioFactory(user=self.user)
+        LearningScenario.objects.filter(id=scenario.id).update(created=timezone.now() - timedelta(days=5))
+        scenario.refresh_from_db()
+        for days_ago in (0, 3):
+            package = NoteRecordPackage.objects.create(learningscenario=scenario)
+            NoteRecordPackage.objects.filter(id=package.id).update(created=timezone.now() - timedelta(days=days_ago))
+        LearningScenario.add_history([scenario])
+        # six days, oldest first: days 2 and 5 practised
+        self.assertEqual(scenario.practice_days, 6)
+        self.assertEqual(base64.b64decode(scenario.practice_bits), bytes([0b100100]))
+        self.assertEqual(list(scenario.practice_history.values()), [False, False, True, False, False, True])
+        self.assertEqual(next(iter(scenario.practice_history)), scenario.created.date().isoformat())
+
     def test_new_learning_scenario(self):
         url = reverse('new-learning-scenario')
         response = self.client.get(url)
@@ -75,3 +128,61 @@ class TestPagesWork(TestCase):
         self.assertTrue(response.status_code, 200)
         for item in ['form', 'learningscenario_pk', 'instruments_info', 'new']:
             self.assertTrue(item in response.context)
+
+
+class TestPracticeTryManifestCaching(TestCase):
+    def setUp(self):
+        self.url = reverse('practice-try-manifest-sigs',
+                           kwargs={'instrument': 'Trumpet', 'clef': 'Treble', 'key': 'Bflat', 'level': 'Beginner',
+                                   'octave': 0, 'signatures': '0'})
+
+    def test_manifest_is_cacheable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(response.json()['name'], 'Trumpet Practice - Beginner (Bb)')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_start_url_is_absolute_and_stable(self):
+        first = self.client.get(self.url).json()
+        second = self.client.get(self.url).json()
+        self.assertEqual(first, second)
+        self.assertTrue(first['start_url'].startswith('http://testserver/practice-try/'))
+        self.assertEqual(first['start_url'], first['scope'])
+
+
+class TestAsyncEndpoints(TestCase):
+    """The practice endpoints are async views; exercise them through the ASGI request path."""
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.learningscenario = LearningScenarioFactory(user=self.user)
+        self.package, _progress = LearningScenario.progress_latest_serialised(self.learningscenario.id)
+
+    async def test_practice_data(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('practice-data', kwargs={'package_id': self.package.id})
+        response = await self.async_client.post(url, data={'note': 'G', 'octave': '4', 'reaction_time': 500,
+                                                           'correct': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        await self.package.arefresh_from_db()
+        self.assertEqual(self.package.log[0]['reaction_time_log'], [500])
+
+    async def test_practice_data_requires_login(self):
+        url = reverse('practice-data', kwargs={'package_id': self.package.id})
+        response = await self.async_client.post(url, data={'note': 'G', 'octave': '4'},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+
+    async def test_progress_data(self):
+        await sync_to_async(self.package.add_result)({'note': 'C', 'octave': '4', 'alter': '0', 'correct': True,
+                                                      'reaction_time': 700})
+        url = reverse('progress_data', kwargs={'learningscenario_id': self.learningscenario.id})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['by_note']['labels'], ['C4'])
+        self.assertEqual(data['over_time']['accuracy'], [100.0])
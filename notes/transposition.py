@@ -0,0 +1,108 @@
+"""
+Transposition from written notes (relative_key) to displayed notes (absolute_pitch, octave_shift),
+built on the integer pitches in notes.pitch.
+
+This is what keyAdjust in js/stave_manager.js does note by note. The practice page now receives
+`transposition_table(...)` and just looks notes up; keyAdjust's string arithmetic is only the
+fallback for notes outside the table. The table reads Cb, B# and double accidentals at their real
+pitch, where keyAdjust was an octave out or read them as C (see notes.pitch.parse_pitch).
+"""
+import functools
+from dataclasses import dataclass
+
+from notes import pitch
+from notes.instrument_data import fingering_index
+
+ACCIDENTALS = ('bb', 'b', '', '#', '##')
+SCALE_ORDER = 'CDEFGAB'
+# (note, octave) of the middle stave line, as in calcStemDirection
+STEM_CENTRES = {'treble': ('B', 4), 'bass': ('D', 3)}
+STEM_UP, STEM_DOWN = 1, -1
+
+# Used when the instrument has no fingering data to take a written range from (C/2..C/7)
+DEFAULT_RANGE = (36, 96)
+
+
+def stem_direction(note: str, clef: str) -> int:
+    """calcStemDirection: stems go down from the middle line up."""
+    centre_note, centre_octave = STEM_CENTRES['bass' if clef == 'bass' else 'treble']
+    name, octave = note.split('/')
+    octave = int(octave)
+    if octave != centre_octave:
+        return STEM_DOWN if octave > centre_octave else STEM_UP
+    return STEM_DOWN if SCALE_ORDER.index(name[0]) >= SCALE_ORDER.index(centre_note) else STEM_UP
+
+
+def _with_octave_shift(note: str, octave_shift: int) -> str:
+    if not octave_shift:
+        return note
+    name, octave = note.split('/')
+    return f'{name}/{int(octave) + octave_shift}'
+
+
+@dataclass(frozen=True)
+class Transposition:
+    relative_key: str
+    absolute_pitch: str = ''
+    octave_shift: int = 0
+    clef: str = 'treble'
+
+    @classmethod
+    def for_scenario(cls, learningscenario) -> 'Transposition':
+        return cls(relative_key=learningscenario.relative_key,
+                   absolute_pitch=learningscenario.get_absolute_pitch(),
+                   octave_shift=learningscenario.octave_shift or 0,
+                   clef=str(learningscenario.clef).lower())
+
+    @property
+    def semitones(self) -> int:
+        # keyAdjust leaves bass clef alone
+        if self.clef == 'bass':
+            return 0
+        return pitch.key_shift(self.relative_key, self.absolute_pitch)
+
+    def shown(self, written: str) -> str:
+        """The note keyAdjust shows for `written` (sharps when transposed, spelling kept otherwise)."""
+        if not self.semitones:
+            return written
+        return pitch.pitch_name(pitch.parse_pitch(written) + self.semitones)
+
+    def drawn(self, written: str) -> str:
+        """The note put on the stave: `shown` moved by octave_shift."""
+        return _with_octave_shift(self.shown(written), self.octave_shift)
+
+    def concert_pitch(self, written: str) -> int:
+        """Sounding pitch of `written` for an instrument in relative_key (nearest octave, as keyAdjust)."""
+        return pitch.parse_pitch(written) + pitch.key_shift(self.relative_key, 'C')
+
+    def written_and_concert(self, written: str) -> tuple[str, str]:
+        """For reports: ('Bb/4', 'G#/4')-style pairs."""
+        return written, pitch.pitch_name(self.concert_pitch(written))
+
+
+def _written_range(instrument: str) -> tuple[int, int]:
+    index = fingering_index(instrument)
+    if index is None:
+        return DEFAULT_RANGE
+    return index.lowest, index.lowest + len(index.fingerings) - 1
+
+
+# bounded as a backstop; practice_try 404s keys, clefs and octaves that aren't ours
+@functools.lru_cache(maxsize=256)
+def transposition_table(instrument: str, relative_key: str, absolute_pitch: str = '', octave_shift: int = 0,
+                        clef: str = 'treble') -> dict:
+    """Every spelling of every written note in the instrument's range -> [shown, drawn, stem direction].
+
+    Built once per combination and shared between requests, so treat it as read-only.
+    """
+    transposition = Transposition(relative_key, absolute_pitch, octave_shift, clef)
+    lowest, highest = _written_range(instrument)
+    notes = {}
+    for octave in range(lowest // 12 - 2, highest // 12 + 1):
+        for letter in SCALE_ORDER:
+            for accidental in ACCIDENTALS:
+                written = f'{letter}{accidental}/{octave}'
+                if lowest <= pitch.parse_pitch(written) <= highest:
+                    shown = transposition.shown(written)
+                    notes[written] = [shown, _with_octave_shift(shown, octave_shift), stem_direction(shown, clef)]
+    return {'shift': transposition.semitones, 'octave_shift': octave_shift, 'notes': notes}
@@ -0,0 +1,126 @@
+"""
+Write-behind buffer for practice answers (TRIAL_WRITE_BEHIND, needs Redis).
+
+With it on, practice_data_batch appends the posted trials to a Redis list per learning scenario
+and answers straight away; the database isn't touched on the request path. Every minute
+notes.tasks.flush_trial_buffer moves each scenario's buffered trials into the database in
+batches through the normal bulk path (LearningScenario.ingest_trials), each batch in one
+transaction, and only trims them from the list once that has committed: a failed flush leaves
+nothing of its batch written and is retried, rather than lost or written twice. A scenario is
+flushed under a Redis lock that is renewed before each batch, so a long backlog can't outlast
+it and have the next run write batches that haven't been trimmed yet; if the lock has been lost
+anyway the flush stops. One scenario's failure doesn't stop the others being flushed.
+
+Until they are flushed, buffered trials are merged into what the practice page and the
+progress chart read (`apply_pending`, `pending_trials`), so nobody sees stale progress.
+"""
+import functools
+import logging
+from datetime import datetime, timezone as dt_timezone
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+
+from config import metrics
+from notes import serialisation
+
+FLUSH_BATCH = 500
+LOCK_SECONDS = 60
+PENDING_KEY = 'trial-buffer:pending'
+
+logger = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return settings.TRIAL_WRITE_BEHIND
+
+
+@functools.lru_cache(maxsize=1)
+def _client():
+    import redis
+
+    return redis.Redis.from_url(settings.TRIAL_BUFFER_URL)
+
+
+def _key(learningscenario_id: int) -> str:
+    return f'trial-buffer:ls:{learningscenario_id}'
+
+
+def _encode(trial: dict, opened: datetime | None) -> bytes:
+    return serialisation.dumps({'trial': trial, 'opened': int(opened.timestamp() * 1000) if opened else None})
+
+
+def _decode(raw: bytes) -> tuple[dict, datetime | None]:
+    entry = serialisation.loads(raw)
+    opened = entry.get('opened')
+    return entry['trial'], datetime.fromtimestamp(opened / 1000, tz=dt_timezone.utc) if opened else None
+
+
+def buffer_trials(learningscenario_id: int, trials: list[dict], opened: datetime | None = None):
+    """Queue trials (each with a client_ts) for the scenario; `opened` as for ingest_trials."""
+    pipe = _client().pipeline()
+    pipe.rpush(_key(learningscenario_id), *[_encode(trial, opened) for trial in trials])
+    pipe.sadd(PENDING_KEY, learningscenario_id)
+    pipe.execute()
+    metrics.record_trials('buffered', len(trials))
+
+
+def pending_trials(learningscenario_id: int) -> list[dict]:
+    """The scenario's trials that are buffered but not yet in the database, oldest first."""
+    if not enabled():
+        return []
+    return [_decode(raw)[0] for raw in _client().lrange(_key(learningscenario_id), 0, -1)]
+
+
+def apply_pending(package, trials: list[dict], since: datetime):
+    """Fold buffered trials answered since `since` into the package's log, without saving it."""
+    since_ms = int(since.timestamp() * 1000)
+    for trial in trials:
+        if trial['client_ts'] >= since_ms:
+            package._apply_result(trial)
+
+
+def ingest_entries(learningscenario, entries: list[tuple[dict, datetime | None]]) -> int:
+    """Write decoded buffer entries to the database, all or none of them; trials from one practice
+    page go together."""
+    with transaction.atomic():
+        for opened, group in groupby(entries, key=lambda entry: entry[1]):
+            # counted (as buffered) when they were queued
+            learningscenario.ingest_trials([trial for trial, _ in group], opened, metrics_path=None)
+    return len(entries)
+
+
+def flush(learningscenario_id: int) -> int:
+    """Move one scenario's buffered trials into the database; returns how many were written."""
+    from notes.models import LearningScenario
+
+    client = _client()
+    key = _key(learningscenario_id)
+    written = 0
+    with client.lock(f'{key}:flush', timeout=LOCK_SECONDS) as lock:
+        learningscenario = LearningScenario.objects.filter(id=learningscenario_id).first()
+        # back to a full LOCK_SECONDS for each batch; raises LockNotOwnedError if it has expired
+        while lock.reacquire() and (raw := client.lrange(key, 0, FLUSH_BATCH - 1)):
+            if learningscenario is not None:
+                written += ingest_entries(learningscenario, [_decode(r) for r in raw])
+            # only drop what has been written (new trials are appended at the other end)
+            client.ltrim(key, len(raw), -1)
+        client.srem(PENDING_KEY, learningscenario_id)
+        if client.llen(key):
+            # something arrived after the last read; leave it for the next flush
+            client.sadd(PENDING_KEY, learningscenario_id)
+    return written
+
+
+def flush_all() -> int:
+    if not enabled():
+        return 0
+    written = 0
+    for learningscenario_id in _client().smembers(PENDING_KEY):
+        try:
+            written += flush(int(learningscenario_id))
+        except Exception:
+            # still queued, so the next run retries it
+            logger.exception("Flushing buffered trials for learning scenario %s failed", int(learningscenario_id))
+    return written
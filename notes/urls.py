@@ -9,6 +9,10 @@ urlpatterns = [
     path('test-js/', TemplateView.as_view(template_name='notes/test_js.html'), name='test-js'),
 
     path('progress-data/<int:learningscenario_id>/', views.progress_data_view, name='progress_data'),
+    path('cohort-analytics/<int:cohort_id>/', views.cohort_analytics_view, name='cohort-analytics'),
+    path('export/trials/', views.export_trials, name='export-trials'),
+    path('import/trials/<int:learningscenario_id>/', views.import_trials_view, name='import-trials'),
+    path('export/<int:export_id>/', views.trial_export_view, name='trial-export'),
     path("practice/", views.notes_home, name="notes-home"),
     path("new-learning-scenario/", views.new_learningscenario, name='new-learning-scenario'),
     path("edit-learning-scenario/<int:pk>/", views.edit_learningscenario, name='edit-learning-scenario'),
@@ -19,6 +23,9 @@ urlpatterns = [
     path("practice-sound/<int:learningscenario_id>/", views.practice, name='practice-sound', kwargs={'sound': True}),
 
     path("practice-data/<int:package_id>/", views.practice_data, name='practice-data'),
+    path("practice-data-batch/<int:learningscenario_id>/", views.practice_data_batch, name='practice-data-batch'),
+    path("fingering-index/<str:instrument>/<str:key>/<str:absolute_pitch>/<str:digest>.json",
+         views.fingering_index_view, name='fingering-index'),
 
 
     path('practice-demo/', views.practice_demo, name='practice-demo'),
@@ -1,31 +1,46 @@
+import functools
+import hashlib
 import json
 from datetime import timedelta, datetime
-from statistics import median  # Python 3.4+ has a built-in median function
 
 from django.conf import settings
 from django.contrib import messages
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import render, redirect
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, render, redirect
 from django.urls import reverse
+from django.utils.cache import add_never_cache_headers, patch_cache_control
 from django.utils.timezone import now
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django_htmx.http import HttpResponseClientRefresh
 from zoneinfo import available_timezones, ZoneInfo
 
 from pushover_complete import PushoverAPI
 
-from notes import tools
+from config.replica import replica_view
+from notes import export, importer, progress, serialisation, tools, trial_buffer
 from notes.forms import LearningScenarioForm
-from notes.instrument_data import instrument_infos, instruments, get_instrument_defaults
+from notes.instrument_data import instrument_infos, instruments, get_instrument_defaults, fingering_index
+from notes.cohort import cohort_analytics
 from notes.models import LearningScenario, NoteRecordPackage, LevelChoices, InstrumentKeys, ClefChoices, \
-    BlankAbsolutePitch, FIFTHS_TO_VEXFLOW_MAJOR
+    BlankAbsolutePitch, FIFTHS_TO_VEXFLOW_MAJOR, Cohort, ExportFormat, ExportStatus, TrialExport, User
+from notes.serialisation import FastJsonResponse, PayloadError
+from notes.tasks import build_export
+from notes.transposition import transposition_table
 from notes.tools import generate_notes, compile_notes_per_skilllevel, convert_note_slash_to_db, toCamelCase
 
 PRACTICE_TRY = 'practice-try'
+MANIFEST_MAX_AGE = 60 * 60 * 24
+# fingering index URLs carry a content hash, so a given URL never changes
+FINGERING_INDEX_MAX_AGE = 60 * 60 * 24 * 365
 
 
 @login_required
+@replica_view
 def notes_home(request):
     if request.htmx:
         action = request.POST.get('action')
@@ -134,15 +149,67 @@ def common_context(instrument_name: str, clef: str, sound: bool | None = None):
     }
 
 
+def practice_config(context: dict) -> dict:
+    """The few page settings the static practice managers (js/practice/*.js) read from #practice-config."""
+    try:
+        octave = int(context.get('octave') or 0)
+    except (TypeError, ValueError):
+        octave = 0
+    return {
+        'key': context.get('key') or '',
+        'absolute_pitch': context.get('absolute_pitch') or '',
+        'clef': context['clef'],
+        'octave': octave,
+        'level': (context.get('level') or '').lower(),
+        'response_count': context['response_count'],
+    }
+
+
+def fingering_index_url(instrument: str, clef: str, key: str, absolute_pitch: str) -> str:
+    """Hashed URL of the fingering index matching what keyAdjust displays for these settings."""
+    if clef.lower() == 'bass' or not absolute_pitch:
+        # keyAdjust leaves bass clef and un-transposed notes alone
+        absolute_pitch = key
+    index = fingering_index(instrument, key, absolute_pitch)
+    if index is None:
+        return ''
+    return reverse('fingering-index', kwargs={'instrument': index.slug,
+                                              'key': tools.normalize_and_slug(key)[1],
+                                              'absolute_pitch': tools.normalize_and_slug(absolute_pitch)[1],
+                                              'digest': index.digest})
+
+
+def fingering_index_view(request, instrument: str, key: str, absolute_pitch: str, digest: str):
+    key = tools.normalize_accidentals(key)
+    absolute_pitch = tools.normalize_accidentals(absolute_pitch)
+    # checked before the (cached) index is built, so made-up URLs don't fill the cache
+    if key not in InstrumentKeys.values or absolute_pitch not in InstrumentKeys.values:
+        raise Http404(f"Unknown key: {key} / {absolute_pitch}")
+    index = fingering_index(instrument, key, absolute_pitch)
+    if index is None:
+        raise Http404(f"Instrument not found: {instrument}")
+    if digest != index.digest:
+        # instrument data changed since the page was rendered; send it to the current file
+        response = redirect(fingering_index_url(instrument, '', key, absolute_pitch))
+        add_never_cache_headers(response)
+        return response
+    response = HttpResponse(index.content, content_type='application/json')
+    patch_cache_control(response, public=True, max_age=FINGERING_INDEX_MAX_AGE, immutable=True)
+    return response
+
+
 def practice(request, learningscenario_id: int, sound: bool = False):
-    package, serialised_notes = LearningScenario.progress_latest_serialised(learningscenario_id)
+    # A pure read: a new package is only written once the first answer comes in (see
+    # LearningScenario.ingest_trials), identified until then by the signed package token.
+    package, serialised_notes = LearningScenario.progress_latest_serialised(learningscenario_id, create=False)
 
-    instrument_name: str = package.learningscenario.instrument_name
     learningscenario: LearningScenario = LearningScenario.objects.get(id=learningscenario_id)
+    instrument_name: str = learningscenario.instrument_name
     context = {
         'learningscenario_id': learningscenario_id,
         'ux': learningscenario.ux,
         'package_id': package.id,
+        'package_token': learningscenario.package_token(package.created),
         'key': learningscenario.relative_key,
         'progress': serialised_notes,
         'sound': sound,
@@ -151,7 +218,12 @@ def practice(request, learningscenario_id: int, sound: bool = False):
         'octave': learningscenario.octave_shift,
     }
 
-    context.update(common_context(instrument_name=instrument_name, clef=package.learningscenario.clef, sound=sound))
+    context.update(common_context(instrument_name=instrument_name, clef=learningscenario.clef, sound=sound))
+    context['fingering_index_url'] = fingering_index_url(instrument_name, context['clef'], context['key'],
+                                                         context['absolute_pitch'])
+    context['transposition'] = transposition_table(instrument_name, context['key'], context['absolute_pitch'],
+                                                   learningscenario.octave_shift or 0, context['clef'])
+    context['practice_config'] = practice_config(context)
 
     return render(request, 'notes/practice.html', context=context)
 
@@ -168,9 +240,13 @@ def practice_demo(request):
     return redirect(url)
 
 
-def practice_try_manifest(request, instrument: str, clef: str, key: str, absolute_pitch: str = "", level: str = "",
-                          octave: int = 0, signatures: str = ""):
-    """Generate dynamic PWA manifest for practice-try pages"""
+@functools.lru_cache(maxsize=2048)
+def _build_practice_try_manifest(start_url: str, instrument: str, clef: str, key: str, level: str):
+    """Render a practice-try manifest once per configuration; returns (content, etag).
+
+    The practice-try URL space is finite (instrument x clef x key x level x ...), so after a short
+    warm-up every manifest request is a dict lookup.
+    """
     # Handle key formatting for display
     display_key = key
     if 'sharp' in key:
@@ -183,19 +259,6 @@ def practice_try_manifest(request, instrument: str, clef: str, key: str, absolut
     if display_key and display_key != instrument.capitalize():
         app_name += f" ({display_key})"
 
-    # CRITICAL: Use STABLE, ABSOLUTE paths to prevent Android from treating updates as new apps
-    # Android PWA stability requires that id, start_url, and scope remain constant across sessions
-    # Using request.build_absolute_uri() ensures full URL with scheme and domain
-
-    # Build the base path without /manifest.json
-    base_path = request.path.replace('/manifest.json', '')
-    if not base_path.endswith('/'):
-        base_path += '/'
-
-    # Create absolute URLs for stability
-    start_url = request.build_absolute_uri(base_path)
-    scope = request.build_absolute_uri(base_path)
-
     # The id should be a unique, stable identifier for this specific practice configuration
     # Using the absolute URL ensures Android recognizes it as the same app across sessions
     app_id = start_url
@@ -206,7 +269,7 @@ def practice_try_manifest(request, instrument: str, clef: str, key: str, absolut
         "description": f"Practice {instrument} reading in {clef} clef at {level} level",
         "id": app_id,
         "start_url": start_url,
-        "scope": scope,
+        "scope": start_url,
         "display": "standalone",
         "orientation": "any",
         "background_color": "#ffffff",
@@ -226,8 +289,37 @@ def practice_try_manifest(request, instrument: str, clef: str, key: str, absolut
             }
         ]
     }
+    content = serialisation.dumps(manifest_data)
+    return content, hashlib.sha256(content).hexdigest()[:16]
+
+
+def _practice_try_manifest(request, instrument: str, clef: str, key: str, level: str):
+    # CRITICAL: Use STABLE, ABSOLUTE paths to prevent Android from treating updates as new apps
+    # Android PWA stability requires that id, start_url, and scope remain constant across sessions
+    # Using request.build_absolute_uri() ensures full URL with scheme and domain
+
+    # Build the base path without /manifest.json
+    base_path = request.path.replace('/manifest.json', '')
+    if not base_path.endswith('/'):
+        base_path += '/'
+
+    start_url = request.build_absolute_uri(base_path)
+    return _build_practice_try_manifest(start_url, instrument, clef, key, level)
 
-    return JsonResponse(manifest_data)
+
+def _practice_try_manifest_etag(request, instrument: str, clef: str, key: str, absolute_pitch: str = "",
+                                level: str = "", octave: int = 0, signatures: str = ""):
+    return _practice_try_manifest(request, instrument, clef, key, level)[1]
+
+
+@transaction.non_atomic_requests
+@condition(etag_func=_practice_try_manifest_etag)
+@cache_control(public=True, max_age=MANIFEST_MAX_AGE)
+async def practice_try_manifest(request, instrument: str, clef: str, key: str, absolute_pitch: str = "", level: str = "",
+                          octave: int = 0, signatures: str = ""):
+    """Serve the dynamic PWA manifest for practice-try pages"""
+    content, _etag = _practice_try_manifest(request, instrument, clef, key, level)
+    return HttpResponse(content, content_type='application/json')
 
 
 def practice_try(request, instrument: str, clef: str, key: str, absolute_pitch: str = "", level: str = "",
@@ -245,16 +337,26 @@ def practice_try(request, instrument: str, clef: str, key: str, absolute_pitch:
 
     selected_signatures = tools.compute_signatures(signatures)
 
+    # the fingering index and transposition table are cached per combination of these, so anything
+    # made up stops here instead of adding cache entries
+    try:
+        octave_shift = int(octave)
+    except (TypeError, ValueError):
+        octave_shift = 0
+    if ((key and key.capitalize() not in InstrumentKeys.values)
+            or (absolute_pitch and absolute_pitch.capitalize() not in InstrumentKeys.values)
+            or clef.capitalize() not in ClefChoices.values
+            or not -3 <= octave_shift <= 3):
+        raise Http404("Unknown key, clef or octave")
+
     from notes.instrument_data import resolve_instrument
     canonical_instrument = resolve_instrument(instrument)
     if not canonical_instrument:
-        from django.http import Http404
         raise Http404(f"Instrument not found: {instrument}")
 
     try:
         serialised_notes = tools.generate_serialised_notes(canonical_instrument, level)
     except KeyError:
-        from django.http import Http404
         raise Http404
 
     instrument_info = instrument_infos[canonical_instrument]
@@ -300,6 +402,11 @@ def practice_try(request, instrument: str, clef: str, key: str, absolute_pitch:
     }
 
     context.update(common_context(instrument_name=canonical_instrument, clef=clef))
+    context['fingering_index_url'] = fingering_index_url(canonical_instrument, context['clef'], context['key'],
+                                                         context['absolute_pitch'])
+    context['transposition'] = transposition_table(canonical_instrument, context['key'], context['absolute_pitch'],
+                                                   octave_shift, context['clef'])
+    context['practice_config'] = practice_config(context)
 
     rt_per_sl = compile_notes_per_skilllevel([{'note': n['note'], 'alter': n['alter'], 'octave': n['octave']}
                                               for n in serialised_notes])
@@ -332,147 +439,156 @@ def practice_start(request):
     return render(request, 'notes/practice_start.html', context=context)
 
 
-@login_required
-def practice_data(request, package_id: int):
-    json_data = json.loads(request.body)
-    package: NoteRecordPackage = NoteRecordPackage.objects.get(id=package_id)
-    package.add_result(json_data)
-    return JsonResponse({'success': True})
-
-
-
+# The practice endpoints below are async: under ASGI (see config/gunicorn.py) a worker keeps
+# serving other requests while these wait on the database. ATOMIC_REQUESTS can't wrap async
+# views, hence non_atomic_requests; multi-query writes open their own transaction instead.
 
+@transaction.non_atomic_requests
+@login_required
+async def practice_data(request, package_id: int):
+    try:
+        trial = serialisation.decode_trial(request.body)
+    except PayloadError as e:
+        return FastJsonResponse({'success': False, 'error': str(e)}, status=400)
+    await sync_to_async(NoteRecordPackage.append_results)(package_id, [trial.as_dict()])
+    return FastJsonResponse({'success': True})
 
 
+@transaction.non_atomic_requests
+@login_required
+@require_POST
+async def practice_data_batch(request, learningscenario_id: int):
+    """Bulk ingest for the offline trial queue: {"trials": [{..., "client_ts": <ms>}, ...]}.
 
+    Invalid trials are skipped and listed in the reply's "rejected"; 400 only if none are valid.
 
-def progress_data_view(request, learningscenario_id):
+    ?package=<token> (see LearningScenario.package_token) dates a package this batch creates at
+    the moment its practice page was opened; an invalid token is ignored. With TRIAL_WRITE_BEHIND
+    the trials are only queued (notes.trial_buffer) and written by a background task.
+    """
+    user = await request.auser()
+    learningscenario = await aget_object_or_404(LearningScenario, id=learningscenario_id, user=user)
+    try:
+        trials, rejected = serialisation.decode_trial_batch(request.body)
+    except PayloadError as e:
+        return FastJsonResponse({'success': False, 'error': str(e)}, status=400)
+    # trials from the practice page carry a token for the package it would have created
+    opened = learningscenario.read_package_token(request.GET['package']) if request.GET.get('package') else None
+    if trial_buffer.enabled():
+        await sync_to_async(trial_buffer.buffer_trials)(learningscenario.id, [trial.as_dict() for trial in trials],
+                                                        opened)
+        return FastJsonResponse({'success': True, 'received': len(trials), 'rejected': rejected, 'buffered': True})
+    packages = await sync_to_async(learningscenario.ingest_trials)([trial.as_dict() for trial in trials], opened)
+    return FastJsonResponse({'success': True, 'received': len(trials), 'rejected': rejected,
+                             'packages': [p.id for p in packages]})
+
+
+@transaction.non_atomic_requests
+@replica_view
+async def progress_data_view(request, learningscenario_id):
     # 1. Decide the time window
     earliest_date = now() - timedelta(days=30)  # last 30 days as example
 
-    # 2. Retrieve all NoteRecordPackage items for this learning scenario in that range
+    # 2. Aggregate this learning scenario's packages in that range (in SQL where possible)
     packages = NoteRecordPackage.objects.filter(
         learningscenario__id=learningscenario_id,
         created__gte=earliest_date
     )
 
-    # 3. Prepare structures for grouping stats
-    over_time_labels = []
-    over_time_accuracy = []
-    over_time_reaction = []
-
-    by_note_labels = []
-    by_note_accuracy = []
-    by_note_reaction = []
-
-    # Instead of sum/count for reaction times, keep a list of all reaction times
-    grouped_by_date = {}
-    grouped_by_note = {}
-
-    for package in packages:
-        date_key = package.created.strftime("%Y-%m-%d")
-        # Initialize date bucket
-        if date_key not in grouped_by_date:
-            grouped_by_date[date_key] = {
-                "sum_correct": 0,
-                "sum_total": 0,
-                "reaction_times": []
-            }
-        # Skip if no log
-        if not isinstance(package.log, list):
-            continue
-        # Iterate over each note item in the package log
-        for item in package.log:
-            note_name = f"{item.get('note', '')}{item.get('octave', '')}"
-            alter = item.get('alter')
-            if alter == '1':
-                note_name += '#'
-            elif alter == '-1':
-                note_name += 'b'
-            # Ensure note bucket exists
-            if note_name not in grouped_by_note:
-                grouped_by_note[note_name] = {
-                    "sum_correct": 0,
-                    "sum_total": 0,
-                    "reaction_times": []
-                }
-            correct_list = item.get('correct', []) or []
-            rt_list = item.get('reaction_time_log', []) or []
-            # Use paired data points only
-            n = min(len(correct_list), len(rt_list)) if (correct_list and rt_list) else len(rt_list)
-            for i in range(n):
-                grouped_by_date[date_key]["sum_total"] += 1
-                if i < len(correct_list) and correct_list[i]:
-                    grouped_by_date[date_key]["sum_correct"] += 1
-                grouped_by_date[date_key]["reaction_times"].append(int(rt_list[i]) if rt_list[i] is not None else 0)
-
-                grouped_by_note[note_name]["sum_total"] += 1
-                if i < len(correct_list) and correct_list[i]:
-                    grouped_by_note[note_name]["sum_correct"] += 1
-                grouped_by_note[note_name]["reaction_times"].append(int(rt_list[i]) if rt_list[i] is not None else 0)
-
-    # Optionally, if you need a custom-sorted approach to notes
-    grouped_by_note_sorted = tools.sort_notes(grouped_by_note)
-
-    # 3b. Convert grouped data into lists for Chart.js
-    # Over time
-    for date_key in sorted(grouped_by_date.keys()):
-        over_time_labels.append(date_key)
-        correct = grouped_by_date[date_key]["sum_correct"]
-        total = grouped_by_date[date_key]["sum_total"]
-
-        # Accuracy is still sum(correct)/sum(total)
-        if total > 0:
-            accuracy_pct = (correct / total) * 100
-        else:
-            accuracy_pct = 0
-        over_time_accuracy.append(round(accuracy_pct, 1))
+    pending = await sync_to_async(trial_buffer.pending_trials)(learningscenario_id)
+    pending = [trial for trial in pending if trial['client_ts'] >= earliest_date.timestamp() * 1000]
+    return FastJsonResponse(await sync_to_async(progress.progress_chart_data)(packages, pending=pending))
 
-        # Reaction time is now the median of all reaction times recorded that day
-        reaction_times = grouped_by_date[date_key]["reaction_times"]
-        if reaction_times:
-            med_reaction = median(reaction_times)
-        else:
-            med_reaction = 0
-        over_time_reaction.append(round(med_reaction, 1))
 
-    # By note
-    for note_key in grouped_by_note_sorted:
-        by_note_labels.append(note_key)
+@login_required
+def export_trials(request):
+    """Every trial as CSV (streamed) or Parquet: ?format=csv|parquet&learningscenario=<id>.
 
-        correct = grouped_by_note_sorted[note_key]["sum_correct"]
-        total = grouped_by_note_sorted[note_key]["sum_total"]
+    Staff can export another learner's history with ?user=<id>. Big histories are built in the
+    background; the response is then 202 with a URL to poll.
+    """
+    export_format = request.GET.get('format', ExportFormat.CSV)
+    if export_format not in ExportFormat.values:
+        return FastJsonResponse({'success': False, 'error': f'Unknown format: {export_format}'}, status=400)
+    if export_format == ExportFormat.PARQUET and not export.parquet_available():
+        return FastJsonResponse({'success': False, 'error': 'Parquet export is not available'}, status=400)
+
+    user = request.user
+    if request.GET.get('user') and request.user.is_staff:
+        user = get_object_or_404(User, id=request.GET['user'])
+    learningscenario = None
+    if request.GET.get('learningscenario'):
+        learningscenario = get_object_or_404(LearningScenario, id=request.GET['learningscenario'], user=user)
+
+    if export.history_size(user, learningscenario) > export.INLINE_EXPORT_PACKAGES:
+        trial_export = TrialExport.objects.create(user=user, requested_by=request.user,
+                                                  learningscenario=learningscenario, format=export_format)
+        transaction.on_commit(lambda: build_export(trial_export.id))
+        return FastJsonResponse({'id': trial_export.id, 'status': trial_export.status,
+                                 'url': reverse('trial-export', args=[trial_export.id])}, status=202)
+
+    trial_export = TrialExport(user=user, learningscenario=learningscenario, format=export_format, created=now())
+    rows = export.history_rows(user, learningscenario)
+    if export_format == ExportFormat.CSV:
+        content = export.iter_csv(rows)
+    elif not isinstance(request, ASGIRequest):
+        return FileResponse(export.export_to_tempfile(rows, export_format), as_attachment=True,
+                            filename=trial_export.filename(), content_type=export.CONTENT_TYPES[export_format])
+    else:
+        content = export.iter_file(export.export_to_tempfile(rows, export_format))
+    if isinstance(request, ASGIRequest):
+        # Django would read a sync iterator into a list before sending any of it
+        content = export.aiter_sync(content)
+    response = StreamingHttpResponse(content, content_type=export.CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{trial_export.filename()}"'
+    return response
 
-        # Accuracy
-        if total > 0:
-            accuracy_pct = (correct / total) * 100
-        else:
-            accuracy_pct = 0
-        by_note_accuracy.append(round(accuracy_pct, 1))
 
-        # Median reaction time per note
-        reaction_times = grouped_by_note_sorted[note_key]["reaction_times"]
-        if reaction_times:
-            med_reaction = median(reaction_times)
-        else:
-            med_reaction = 0
-        by_note_reaction.append(round(med_reaction, 1))
-
-    # Assembling JSON for Chart.js
-    data = {
-        "over_time": {
-            "labels": over_time_labels,
-            "accuracy": over_time_accuracy,
-            "reaction_time": over_time_reaction
-        },
-        "by_note": {
-            "labels": by_note_labels,
-            "accuracy": by_note_accuracy,
-            "reaction_time": by_note_reaction
-        }
-    }
+@login_required
+def trial_export_view(request, export_id: int):
+    """Status of a background export, with a download link once it is done (requester or staff only)."""
+    exports = TrialExport.objects.all() if request.user.is_staff else TrialExport.objects.filter(
+        requested_by=request.user)
+    trial_export = get_object_or_404(exports, id=export_id)
+    if request.GET.get('download') and trial_export.status == ExportStatus.DONE:
+        return FileResponse(trial_export.file.open('rb'), as_attachment=True, filename=trial_export.filename(),
+                            content_type=export.CONTENT_TYPES[trial_export.format])
+    data = {'id': trial_export.id, 'status': trial_export.status, 'error': trial_export.error}
+    if trial_export.status == ExportStatus.DONE:
+        data['download'] = reverse('trial-export', args=[trial_export.id]) + '?download=1'
+    return FastJsonResponse(data)
+
+
+@login_required
+@require_POST
+def import_trials_view(request, learningscenario_id: int):
+    """Upload a JSON Lines / CSV trial file as `trials`; returns the import report."""
+    learningscenario = get_object_or_404(LearningScenario, id=learningscenario_id, user=request.user)
+    upload = request.FILES.get('trials')
+    if upload is None:
+        return FastJsonResponse({'success': False, 'error': 'No file uploaded'}, status=400)
+    file_format = request.POST.get('format') or None
+    if file_format is not None and file_format not in importer.FORMATS:
+        return FastJsonResponse({'success': False, 'error': f'Unknown format: {file_format}'}, status=400)
+    if upload.size > importer.MAX_UPLOAD_BYTES:
+        return FastJsonResponse({'success': False, 'error': f'File is larger than '
+                                 f'{importer.MAX_UPLOAD_BYTES // (1024 * 1024)} MB; import it in parts'}, status=413)
+    try:
+        report = importer.import_file(learningscenario, upload.file, upload.name, file_format)
+    except PayloadError as e:
+        return FastJsonResponse({'success': False, 'error': str(e)}, status=400)
+    return FastJsonResponse({'success': True, **report.as_dict()})
+
 
-    return JsonResponse(data, safe=True)
+@login_required
+@replica_view
+def cohort_analytics_view(request, cohort_id: int):
+    """Per-note difficulty, median reaction times and mastery curve across a cohort (owner/staff only)."""
+    cohort = get_object_or_404(Cohort, id=cohort_id)
+    if not cohort.visible_to(request.user):
+        raise Http404
+    data = cohort_analytics(cohort)
+    return FastJsonResponse({'cohort': cohort.name, **data})
 
 
 @login_required
@@ -1,3 +1,3 @@
 #!/bin/bash
 set -e
-gunicorn config.wsgi:application --log-file -
+gunicorn -c config/gunicorn.py --log-file -
@@ -0,0 +1,115 @@
+"""
+Python mirror of static/sightreadingspeed/js/music_theory.js (the parts passage generation needs).
+
+Keep the tables in step with the JS: the server-side generator and the page must agree on what
+a key, a pitch range and a rhythmic cell mean.
+"""
+
+CHROMATIC_SCALE = [
+    f'{name}/{octave}'
+    for octave in range(2, 7)
+    for name in ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+] + ['C/7']
+
+KEY_SIG_TO_VEXFLOW = {
+    'sharps': {0: 'C', 1: 'G', 2: 'D', 3: 'A', 4: 'E', 5: 'B', 6: 'F#'},
+    'flats': {0: 'C', 1: 'F', 2: 'Bb', 3: 'Eb', 4: 'Ab', 5: 'Db', 6: 'Gb'},
+}
+
+KEY_SCALES = {
+    'C': ['C', 'D', 'E', 'F', 'G', 'A', 'B'],
+    'G': ['G', 'A', 'B', 'C', 'D', 'E', 'F#'],
+    'D': ['D', 'E', 'F#', 'G', 'A', 'B', 'C#'],
+    'A': ['A', 'B', 'C#', 'D', 'E', 'F#', 'G#'],
+    'E': ['E', 'F#', 'G#', 'A', 'B', 'C#', 'D#'],
+    'B': ['B', 'C#', 'D#', 'E', 'F#', 'G#', 'A#'],
+    'F#': ['F#', 'G#', 'A#', 'B', 'C#', 'D#', 'E#'],
+    'F': ['F', 'G', 'A', 'Bb', 'C', 'D', 'E'],
+    'Bb': ['Bb', 'C', 'D', 'Eb', 'F', 'G', 'A'],
+    'Eb': ['Eb', 'F', 'G', 'Ab', 'Bb', 'C', 'D'],
+    'Ab': ['Ab', 'Bb', 'C', 'Db', 'Eb', 'F', 'G'],
+    'Db': ['Db', 'Eb', 'F', 'Gb', 'Ab', 'Bb', 'C'],
+    'Gb': ['Gb', 'Ab', 'Bb', 'Cb', 'Db', 'Eb', 'F'],
+}
+
+DURATION_BEATS = {'w': 4, 'h': 2, 'q': 1, '8': 0.5, '16': 0.25}
+
+# Rhythmic cell banks (cells sum exactly to one bar)
+RHYTHMIC_CELLS = {
+    '4/4': [
+        ['q', 'q', 'q', 'q'],
+        ['h', 'q', 'q'],
+        ['q', 'h', 'q'],
+        ['q', 'q', 'h'],
+        ['h', 'h'],
+        ['w'],
+        ['8', '8', 'q', 'q', 'q'],
+        ['q', '8', '8', 'q', 'q'],
+        ['q', 'q', '8', '8', 'q'],
+        ['16', '16', '16', '16', 'q', 'q', 'q'],
+        ['q', '16', '16', '16', '16', 'q', 'q'],
+        ['q', 'q', '16', '16', '16', '16', 'q'],
+        ['q', 'q', 'q', '16', '16', '16', '16'],
+        ['8', '16', '16', 'q', 'q', 'q'],
+        ['q', '8', '16', '16', 'q', 'q'],
+        ['q', 'q', '8', '16', '16', 'q'],
+    ],
+    '3/4': [
+        ['q', 'q', 'q'],
+        ['h', 'q'],
+        ['q', 'h'],
+        ['8', '8', 'q', 'q'],
+        ['q', '8', '8', 'q'],
+        ['16', '16', '16', '16', 'q', 'q'],
+        ['q', '16', '16', '16', '16', 'q'],
+        ['q', 'q', '16', '16', '16', '16'],
+    ],
+    '2/4': [
+        ['q', 'q'],
+        ['h'],
+        ['8', '8', 'q'],
+        ['q', '8', '8'],
+        ['16', '16', '16', '16', 'q'],
+        ['q', '16', '16', '16', '16'],
+        ['8', '16', '16', 'q'],
+    ],
+}
+
+NOTE_SEMITONES = {
+    'C': 0, 'C#': 1, 'Db': 1, 'D': 2, 'D#': 3, 'Eb': 3,
+    'E': 4, 'Fb': 4, 'F': 5, 'E#': 5, 'F#': 6, 'Gb': 6,
+    'G': 7, 'G#': 8, 'Ab': 8, 'A': 9, 'A#': 10, 'Bb': 10,
+    'B': 11, 'Cb': 11, 'B#': 0,
+}
+
+
+def pitch_to_midi(pitch: str) -> int:
+    """'C/4' -> 60, 'C#/4' -> 61, 'A/4' -> 69"""
+    name, octave = pitch.split('/')
+    octave = int(octave)
+    if name == 'Cb':
+        octave -= 1
+    if name == 'B#':
+        octave += 1
+    return (octave + 1) * 12 + NOTE_SEMITONES.get(name, 0)
+
+
+def get_scale_for_key_signature(key_sig_type: str, key_sig_count: int) -> list[str]:
+    key = KEY_SIG_TO_VEXFLOW[key_sig_type][key_sig_count]
+    return list(KEY_SCALES.get(key, KEY_SCALES['C']))
+
+
+def get_allowed_pitches(key_sig_type: str, key_sig_count: int, min_note: str, max_note: str) -> list[str]:
+    """Scale pitches between min_note and max_note, sorted by MIDI number so stepwise motion works."""
+    min_midi = pitch_to_midi(min_note)
+    max_midi = pitch_to_midi(max_note)
+    pitches = [f'{name}/{octave}'
+               for octave in range(2, 8)
+               for name in get_scale_for_key_signature(key_sig_type, key_sig_count)
+               if min_midi <= pitch_to_midi(f'{name}/{octave}') <= max_midi]
+    return sorted(pitches, key=pitch_to_midi)
+
+
+def get_valid_rhythmic_cells(time_signature: str, durations) -> list[list[str]]:
+    return [cell for cell in RHYTHMIC_CELLS.get(time_signature, [])
+            if all(duration in durations for duration in cell)]
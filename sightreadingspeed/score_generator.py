@@ -0,0 +1,150 @@
+"""
+Seeded, vectorised version of static/sightreadingspeed/js/score_generator.js.
+
+Same model as the JS: each bar picks a rhythmic cell, each note moves from the previous pitch by
+a step (70%), a skip of a third (20%) or a repeat (10%, nudged to a step where the range allows),
+clamped to the allowed pitches, and the final note is replaced by the tonic nearest the middle
+of the range. Unlike the JS, the output is a pure function of (settings, seed, count), so a
+passage can be shared, reproduced, analysed server-side and cached by a CDN.
+
+Passages are generated side by side: all random draws happen up front and the walk advances
+every passage one note-slot at a time through a precomputed transition table, so the Python
+loop runs once per note-slot of a passage rather than once per note.
+"""
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+from sightreadingspeed import music_theory
+
+# Bump whenever the output for a given (settings, seed) changes, so cached passages are not reused
+GENERATOR_VERSION = 1
+
+TIME_SIGNATURES = ('4/4', '3/4', '2/4')
+KEY_SIG_TYPES = ('sharps', 'flats')
+
+# delta applied to the pitch index, and the cumulative probability of each move
+MOVE_DELTAS = np.array([1, -1, 2, -2, 0])
+MOVE_CDF = np.array([0.35, 0.70, 0.80, 0.90])
+
+
+def _clamp_int(value, default: int, lowest: int, highest: int) -> int:
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = default
+    return min(highest, max(lowest, value))
+
+
+@dataclass(frozen=True)
+class PassageSettings:
+    """The generation-relevant subset of settings_manager.js DEFAULTS, sanitised the same way."""
+    min_note: str = 'C/4'
+    max_note: str = 'G/5'
+    durations: tuple[str, ...] = ('q',)
+    time_signature: str = '4/4'
+    num_bars: int = 16
+    key_sig_type: str = 'sharps'
+    key_sig_count: int = 0
+
+    @classmethod
+    def from_query(cls, params) -> 'PassageSettings':
+        defaults = cls()
+        durations = params.get('durations', '')
+        durations = tuple(sorted({d for d in durations.split(',') if d in music_theory.DURATION_BEATS}))
+
+        min_note = params.get('min_note', defaults.min_note)
+        max_note = params.get('max_note', defaults.max_note)
+        time_signature = params.get('time_signature', defaults.time_signature)
+        key_sig_type = params.get('key_sig_type', defaults.key_sig_type)
+        return cls(
+            min_note=min_note if min_note in music_theory.CHROMATIC_SCALE else defaults.min_note,
+            max_note=max_note if max_note in music_theory.CHROMATIC_SCALE else defaults.max_note,
+            durations=durations or defaults.durations,
+            time_signature=time_signature if time_signature in TIME_SIGNATURES else defaults.time_signature,
+            num_bars=_clamp_int(params.get('num_bars'), defaults.num_bars, 4, 100),
+            key_sig_type=key_sig_type if key_sig_type in KEY_SIG_TYPES else defaults.key_sig_type,
+            key_sig_count=_clamp_int(params.get('key_sig_count'), defaults.key_sig_count, 0, 6),
+        )
+
+    def cache_key(self) -> str:
+        return (f'{self.min_note}|{self.max_note}|{",".join(self.durations)}|{self.time_signature}|'
+                f'{self.num_bars}|{self.key_sig_type}|{self.key_sig_count}')
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data['durations'] = list(self.durations)
+        return data
+
+    def pitches(self) -> list[str]:
+        return music_theory.get_allowed_pitches(self.key_sig_type, self.key_sig_count, self.min_note, self.max_note)
+
+    def cells(self) -> list[list[str]]:
+        return music_theory.get_valid_rhythmic_cells(self.time_signature, self.durations)
+
+
+def _transition_table(n_pitches: int) -> np.ndarray:
+    """table[current_index, move] -> next pitch index, with the JS clamping and repeat avoidance."""
+    current = np.arange(n_pitches)[:, None]
+    nxt = np.clip(current + MOVE_DELTAS, 0, n_pitches - 1)
+    if n_pitches > 1:
+        nudged = np.clip(current + np.where(MOVE_DELTAS >= 0, 1, -1), 0, n_pitches - 1)
+        nxt = np.where(nxt == current, nudged, nxt)
+    return nxt
+
+
+@dataclass(frozen=True)
+class Passages:
+    pitches: list[str]
+    cells: list[list[str]]
+    cell_index: np.ndarray  # (count, num_bars)
+    pitch_index: np.ndarray  # (count, num_bars, longest cell); slots past the end of a cell are unused
+
+    def __len__(self):
+        return len(self.cell_index)
+
+    def bars(self, i: int) -> list[dict]:
+        """Passage i in the shape score_generator.generate returns: [{'notes': [{pitch, duration}]}]"""
+        pitches, cells = self.pitches, self.cells
+        return [{'notes': [{'pitch': pitches[p], 'duration': d} for p, d in zip(bar_pitches, cells[c])]}
+                for c, bar_pitches in zip(self.cell_index[i].tolist(), self.pitch_index[i].tolist())]
+
+
+def generate_batch(settings: PassageSettings, seed: int, count: int = 1) -> Passages | None:
+    """Generate `count` passages from one seed; None when the settings leave no pitches or cells."""
+    pitches = settings.pitches()
+    cells = settings.cells()
+    if not pitches or not cells:
+        return None
+
+    rng = np.random.default_rng(seed)
+    num_bars = settings.num_bars
+    cell_lengths = np.array([len(cell) for cell in cells])
+    width = int(cell_lengths.max())
+
+    cell_index = rng.integers(len(cells), size=(count, num_bars))
+    moves = np.searchsorted(MOVE_CDF, rng.random((num_bars * width, count)), side='right')
+    # slot k of bar b only holds a note when the bar's cell has more than k notes
+    in_cell = (np.arange(width) < cell_lengths[cell_index][..., None]).reshape(count, -1).T
+
+    table = _transition_table(len(pitches))
+    walk = np.empty((num_bars * width, count), dtype=np.int16)
+    current = np.full(count, len(pitches) // 2)
+    for slot in range(num_bars * width):
+        current = np.where(in_cell[slot], table[current, moves[slot]], current)
+        walk[slot] = current
+    pitch_index = walk.T.reshape(count, num_bars, width)
+
+    # End on the tonic closest to the middle of the range
+    key_root = music_theory.get_scale_for_key_signature(settings.key_sig_type, settings.key_sig_count)[0]
+    tonics = [i for i, pitch in enumerate(pitches) if pitch.split('/')[0] == key_root]
+    if tonics:
+        last_slot = cell_lengths[cell_index[:, -1]] - 1
+        pitch_index[np.arange(count), -1, last_slot] = tonics[len(tonics) // 2]
+
+    return Passages(pitches=pitches, cells=cells, cell_index=cell_index, pitch_index=pitch_index)
+
+
+def generate(settings: PassageSettings, seed: int) -> list[dict]:
+    passages = generate_batch(settings, seed, 1)
+    return passages.bars(0) if passages else []
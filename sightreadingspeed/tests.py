@@ -0,0 +1,65 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from sightreadingspeed import music_theory
+from sightreadingspeed.score_generator import PassageSettings, generate, generate_batch
+
+
+class TestScoreGenerator(TestCase):
+    def setUp(self):
+        self.settings = PassageSettings.from_query({'durations': 'q,h,8,16', 'num_bars': '12'})
+
+    def test_same_seed_same_passage(self):
+        self.assertEqual(generate(self.settings, 42), generate(self.settings, 42))
+        self.assertNotEqual(generate(self.settings, 42), generate(self.settings, 43))
+
+    def test_bars_are_valid(self):
+        pitches = self.settings.pitches()
+        cells = self.settings.cells()
+        for bars in (generate_batch(self.settings, 5, 50).bars(i) for i in range(50)):
+            self.assertEqual(len(bars), 12)
+            for bar in bars:
+                self.assertIn([note['duration'] for note in bar['notes']], cells)
+            # steps and skips only (the final tonic is placed, not walked to)
+            walked = [pitches.index(note['pitch']) for bar in bars for note in bar['notes']][:-1]
+            self.assertTrue(all(abs(b - a) <= 2 for a, b in zip(walked, walked[1:])))
+            # ends on the tonic closest to the middle of the range (C4..G5 in C -> C5)
+            self.assertEqual(bars[-1]['notes'][-1]['pitch'], 'C/5')
+
+    def test_allowed_pitches_match_js(self):
+        self.assertEqual(music_theory.get_allowed_pitches('flats', 1, 'C/4', 'C/5'),
+                         ['C/4', 'D/4', 'E/4', 'F/4', 'G/4', 'A/4', 'Bb/4', 'C/5'])
+
+    def test_settings_are_sanitised(self):
+        settings = PassageSettings.from_query({'num_bars': '1000', 'time_signature': '7/8', 'min_note': 'H/4',
+                                               'durations': 'x'})
+        self.assertEqual(settings.num_bars, 100)
+        self.assertEqual(settings.time_signature, '4/4')
+        self.assertEqual(settings.min_note, 'C/4')
+        self.assertEqual(settings.durations, ('q',))
+
+    def test_no_valid_cells(self):
+        settings = PassageSettings.from_query({'durations': 'w', 'time_signature': '3/4'})
+        self.assertEqual(generate(settings, 1), [])
+
+
+class TestPassagesEndpoint(TestCase):
+    def test_missing_seed_redirects_to_seeded_url(self):
+        response = self.client.get(reverse('sightreadingspeed:passages'), {'num_bars': 8})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('seed=', response['Location'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_seeded_passages_are_cacheable(self):
+        url = reverse('sightreadingspeed:passages')
+        response = self.client.get(url, {'seed': 9, 'count': 3, 'num_bars': 8})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        data = response.json()
+        self.assertEqual(len(data['passages']), 3)
+        self.assertEqual(len(data['passages'][0]), 8)
+
+        again = self.client.get(url, {'seed': 9, 'count': 3, 'num_bars': 8}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        other = self.client.get(url, {'seed': 9, 'count': 3, 'num_bars': 9})
+        self.assertNotEqual(other['ETag'], response['ETag'])
@@ -6,4 +6,5 @@ app_name = "sightreadingspeed"
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("passages/", views.passages, name="passages"),
 ]
@@ -1,5 +1,68 @@
-from django.shortcuts import render
+import hashlib
+import secrets
+
+from django.shortcuts import redirect, render
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.views.decorators.http import condition
+
+from notes.serialisation import FastJsonResponse
+from sightreadingspeed.score_generator import GENERATOR_VERSION, PassageSettings, generate_batch
+
+# A passage is fully determined by (generator version, settings, seed, count), so it never changes
+PASSAGE_MAX_AGE = 60 * 60 * 24 * 365
+MAX_SEED = 2 ** 32
+MAX_PASSAGES = 500
 
 
 def index(request):
     return render(request, "sightreadingspeed/index.html")
+
+
+def _passage_params(request):
+    """(settings, seed, count) from the query string; seed is None when missing or invalid."""
+    settings = PassageSettings.from_query(request.GET)
+    try:
+        seed = int(request.GET["seed"])
+        if not 0 <= seed < MAX_SEED:
+            seed = None
+    except (KeyError, ValueError):
+        seed = None
+    try:
+        count = min(MAX_PASSAGES, max(1, int(request.GET.get("count", 1))))
+    except ValueError:
+        count = 1
+    return settings, seed, count
+
+
+def _passage_etag(request):
+    settings, seed, count = _passage_params(request)
+    if seed is None:
+        return None
+    key = f"{GENERATOR_VERSION}|{settings.cache_key()}|{seed}|{count}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+@condition(etag_func=_passage_etag)
+def passages(request):
+    """Passages as JSON, in the bar format score_generator.js produces.
+
+    Query parameters are the generation settings from settings_manager.js (durations comma
+    separated), plus `seed` and `count`. Without a seed we redirect to a freshly seeded URL, so
+    every response body is cacheable and shareable.
+    """
+    settings, seed, count = _passage_params(request)
+    if seed is None:
+        params = request.GET.copy()
+        params["seed"] = secrets.randbelow(MAX_SEED)
+        response = redirect(f"{request.path}?{params.urlencode()}")
+        add_never_cache_headers(response)
+        return response
+
+    generated = generate_batch(settings, seed, count)
+    response = FastJsonResponse({
+        "seed": seed,
+        "settings": settings.as_dict(),
+        "passages": [generated.bars(i) for i in range(count)] if generated else [],
+    })
+    patch_cache_control(response, public=True, max_age=PASSAGE_MAX_AGE, immutable=True)
+    return response
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import IntonationSummary
+
+
+@admin.register(IntonationSummary)
+class IntonationSummaryAdmin(admin.ModelAdmin):
+    list_display = ('created', 'user', 'status', 'duration', 'cents', 'stability')
+    list_filter = ('status',)
+    search_fields = ('user__email',)
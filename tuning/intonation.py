@@ -0,0 +1,237 @@
+"""
+Intonation analysis of uploaded recordings: how far, in cents, each note sits from equal temperament.
+
+Recordings are memory-mapped and pushed through tuning.pitch.PitchTracker a chunk at a time, and
+the per-note statistics are kept as running sums, so memory use does not depend on how long the
+recording is. Only WAV (PCM or float) and raw 16-bit little-endian mono PCM are understood.
+"""
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from notes.pitch import pitch_name
+from tuning import pitch
+
+CHUNK_FRAMES = 1 << 16
+# a run of the same note shorter than this (~50ms at 48kHz, hop 240) is a transition, not a note
+MIN_NOTE_HOPS = 10
+HISTOGRAM_BIN_CENTS = 5
+HISTOGRAM_EDGES = np.arange(-50, 50 + HISTOGRAM_BIN_CENTS, HISTOGRAM_BIN_CENTS)
+A4_HZ, MIN_A4, MAX_A4 = 440.0, 400.0, 480.0
+# anything else is a corrupt header or a made-up rate (which would also skew `seconds`)
+MIN_SAMPLE_RATE, MAX_SAMPLE_RATE = 8000, 192000
+
+_WAVE_PCM, _WAVE_FLOAT, _WAVE_EXTENSIBLE = 1, 3, 0xFFFE
+
+
+class RecordingError(ValueError):
+    """Raised when an upload is not audio we can read."""
+
+
+def check_sample_rate(sample_rate: int):
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise RecordingError(f'Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz.')
+
+
+@dataclass(frozen=True)
+class Recording:
+    sample_rate: int
+    channels: int
+    frames: int
+    data: np.ndarray  # (frames, channels) or, for 24-bit, (frames, channels, 3) bytes
+    scale: float
+    offset: float = 0.0
+
+    @property
+    def seconds(self) -> float:
+        return self.frames / self.sample_rate
+
+    @classmethod
+    def open(cls, source, sample_rate=None) -> 'Recording':
+        """Map a WAV file (path or bytes). Anything else is treated as raw s16le mono at `sample_rate`."""
+        if isinstance(source, (str, Path)):
+            buffer = lambda dtype, offset, count: np.memmap(source, dtype=dtype, mode='r', offset=offset,
+                                                            shape=(count,))
+            with open(source, 'rb') as f:
+                def read(offset, count):
+                    f.seek(offset)
+                    return f.read(count)
+
+                return cls._open(read, Path(source).stat().st_size, buffer, sample_rate)
+        read = lambda offset, count: bytes(source[offset:offset + count])
+        buffer = lambda dtype, offset, count: np.frombuffer(source, dtype=dtype, offset=offset, count=count)
+        return cls._open(read, len(source), buffer, sample_rate)
+
+    @classmethod
+    def _open(cls, read, size, buffer, sample_rate):
+        header = read(0, 12)
+        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+            return cls._open_wav(read, size, buffer)
+        if not sample_rate:
+            raise RecordingError('Not a WAV file; give a sample rate to upload raw 16-bit PCM.')
+        check_sample_rate(int(sample_rate))
+        frames = size // 2
+        if not frames:
+            raise RecordingError('Recording is empty.')
+        return cls(sample_rate=int(sample_rate), channels=1, frames=frames,
+                   data=buffer('<i2', 0, frames).reshape(frames, 1), scale=1 / 32768)
+
+    @classmethod
+    def _open_wav(cls, read, file_size, buffer):
+        """Walk the chunk headers (seeking past LIST, bext, iXML... however big) to fmt and data."""
+        fmt = None
+        position = 12
+        while position + 8 <= file_size:
+            chunk_id, size = struct.unpack('<4sI', read(position, 8))
+            body = position + 8
+            if chunk_id == b'fmt ':
+                fields = read(body, min(size, 40))
+                if len(fields) < 16:
+                    raise RecordingError('WAV header is corrupt.')
+                fmt = struct.unpack_from('<HHIIHH', fields)
+                if fmt[0] == _WAVE_EXTENSIBLE and len(fields) >= 26:
+                    fmt = (struct.unpack_from('<H', fields, 24)[0],) + fmt[1:]
+            elif chunk_id == b'data':
+                if fmt is None:
+                    break
+                # streaming writers leave the size at 0xFFFFFFFF; trust the file instead
+                return cls._from_fmt(fmt, body, min(size, file_size - body), buffer)
+            position = body + size + (size & 1)
+        raise RecordingError('WAV file has no readable fmt/data chunks.')
+
+    @classmethod
+    def _from_fmt(cls, fmt, offset, size, buffer):
+        audio_format, channels, sample_rate, _byte_rate, block_align, bits = fmt
+        if not channels or not sample_rate or not block_align:
+            raise RecordingError('WAV header is corrupt.')
+        check_sample_rate(sample_rate)
+        frames = size // block_align
+        if frames <= 0:
+            raise RecordingError('Recording is empty.')
+        count = frames * channels
+        if audio_format == _WAVE_FLOAT and bits in (32, 64):
+            data = buffer(f'<f{bits // 8}', offset, count).reshape(frames, channels)
+            return cls(sample_rate, channels, frames, data, scale=1.0)
+        if audio_format != _WAVE_PCM:
+            raise RecordingError(f'Unsupported WAV encoding ({audio_format}).')
+        if bits == 8:
+            data = buffer('u1', offset, count).reshape(frames, channels)
+            return cls(sample_rate, channels, frames, data, scale=1 / 128, offset=-128)
+        if bits in (16, 32):
+            data = buffer(f'<i{bits // 8}', offset, count).reshape(frames, channels)
+            return cls(sample_rate, channels, frames, data, scale=1 / 2 ** (bits - 1))
+        if bits == 24:
+            data = buffer('u1', offset, count * 3).reshape(frames, channels, 3)
+            return cls(sample_rate, channels, frames, data, scale=1 / 2 ** 31)
+        raise RecordingError(f'Unsupported WAV bit depth ({bits}).')
+
+    def chunks(self, size: int = CHUNK_FRAMES):
+        """Mono float32 blocks of up to `size` frames; only one block is ever read into memory."""
+        for start in range(0, self.frames, size):
+            block = np.asarray(self.data[start:start + size])
+            if block.ndim == 3:
+                # 24-bit: shift the three bytes into the top of an int32
+                block = (block.astype(np.int32) << np.array([8, 16, 24])).sum(axis=2, dtype=np.int32)
+            samples = (block.astype(np.float32) + self.offset) * self.scale
+            yield samples.mean(axis=1) if self.channels > 1 else samples[:, 0]
+
+
+@dataclass
+class _Run:
+    midi: int
+    n: int
+    total: float
+    squares: float
+    histogram: np.ndarray
+
+
+class IntonationAccumulator:
+    """Running per-note cents statistics over a stream of PitchEstimates."""
+
+    def __init__(self, a4: float = A4_HZ, hop_seconds: float = 0.005, min_note_hops: int = MIN_NOTE_HOPS):
+        self.a4 = a4
+        self.hop_seconds = hop_seconds
+        self.min_note_hops = min_note_hops
+        self.hops = 0
+        self.notes = {}  # midi -> [events, n, total, squares]
+        self.histogram = np.zeros(len(HISTOGRAM_EDGES) - 1, dtype=np.int64)
+        self._run = None
+
+    def add(self, estimates: pitch.PitchEstimates):
+        if not len(estimates):
+            return
+        self.hops += len(estimates)
+        voiced = estimates.voiced()
+        with np.errstate(divide='ignore'):
+            semitones = 69 + 12 * np.log2(np.where(voiced, estimates.hz, 1) / self.a4)
+        midi = np.where(voiced, np.round(semitones), -1).astype(int)
+        cents = 100 * (semitones - midi)
+
+        boundaries = np.flatnonzero(np.diff(midi)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(midi)]):
+            values = cents[start:end]
+            run = _Run(int(midi[start]), int(end - start), float(values.sum()), float((values ** 2).sum()),
+                       np.histogram(values, HISTOGRAM_EDGES)[0])
+            if self._run is not None and self._run.midi == run.midi:
+                self._run.n += run.n
+                self._run.total += run.total
+                self._run.squares += run.squares
+                self._run.histogram += run.histogram
+            else:
+                self._close_run()
+                self._run = run
+
+    def _close_run(self):
+        run, self._run = self._run, None
+        if run is None or run.midi < 0 or run.n < self.min_note_hops:
+            return
+        stats = self.notes.setdefault(run.midi, [0, 0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += run.n
+        stats[2] += run.total
+        stats[3] += run.squares
+        self.histogram += run.histogram
+
+    def summary(self) -> dict:
+        self._close_run()
+        notes = []
+        n = total = squares = 0
+        for midi, (events, count, note_total, note_squares) in sorted(self.notes.items()):
+            mean = note_total / count
+            notes.append({
+                'note': pitch_name(midi),
+                'midi': midi,
+                'events': events,
+                'seconds': round(count * self.hop_seconds, 2),
+                'cents': round(float(mean), 1),
+                'stability': round(_std(note_squares, mean, count), 1),
+            })
+            n += count
+            total += note_total
+            squares += note_squares
+        mean = total / n if n else None
+        return {
+            'a4': self.a4,
+            'duration': round(self.hops * self.hop_seconds, 2),
+            'voiced_seconds': round(n * self.hop_seconds, 2),
+            'cents': None if mean is None else round(float(mean), 1),
+            'stability': None if mean is None else round(_std(squares, mean, n), 1),
+            'notes': notes,
+            'histogram': {'edges': HISTOGRAM_EDGES.tolist(), 'counts': self.histogram.tolist()},
+        }
+
+
+def _std(squares, mean, n):
+    return float(np.sqrt(max(squares / n - mean ** 2, 0.0)))
+
+
+def analyse(recording: Recording, a4: float = A4_HZ, window: int = 4096, hop: int = 240,
+            picker: str = 'mpm') -> dict:
+    """Per-note cents deviation and stability (std dev in cents) plus a histogram of deviations."""
+    tracker = pitch.PitchTracker(recording.sample_rate, window, hop, picker)
+    accumulator = IntonationAccumulator(a4=a4, hop_seconds=hop / recording.sample_rate)
+    for samples in recording.chunks():
+        accumulator.add(tracker.feed(samples))
+    return accumulator.summary()
@@ -0,0 +1,101 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from tuning import pitch
+from tuning.corpus import build_corpus
+
+# An estimate "locks" once this many consecutive hops are voiced and within LOCK_CENTS
+LOCK_CENTS = 20
+LOCK_HOPS = 3
+# errors beyond this are octave/harmonic jumps rather than intonation error
+GROSS_CENTS = 100
+
+
+def _int_list(value):
+    try:
+        return [int(v) for v in value.split(",") if v]
+    except ValueError as e:
+        raise CommandError(f"Expected comma separated integers, got {value!r}") from e
+
+
+def direct_multiply_adds(window: int, sample_rate: int) -> int:
+    """Multiply-adds the worklet's direct NSDF loop spends per hop."""
+    tau_min, tau_max = pitch.lag_range(sample_rate)
+    lags = np.arange(tau_min, tau_max + 1)
+    return int(np.sum(window - lags))
+
+
+def score_tone(tone, estimates, window):
+    """(errors in cents once the window is fully inside the note, latency to lock in seconds or None)."""
+    ends = np.round(estimates.time * tone.sample_rate).astype(int)
+    truth = tone.f0_at(ends - window // 2)
+    error = pitch.cents(estimates.hz, truth)
+    good = estimates.voiced() & (truth > 0)
+
+    settled = good & (ends - window >= tone.onset)
+    locked = good & (np.abs(np.nan_to_num(error, nan=np.inf)) <= LOCK_CENTS)
+    run = np.convolve(locked, np.ones(LOCK_HOPS, dtype=int), mode="valid")
+    hits = np.flatnonzero((run == LOCK_HOPS) & (ends[:len(run)] > tone.onset))
+    latency = (ends[hits[0]] - tone.onset) / tone.sample_rate if len(hits) else None
+    return error[settled], latency
+
+
+class Command(BaseCommand):
+    help = ("Run the reference pitch tracker (tuning.pitch) over a synthetic brass corpus and report per-hop "
+            "cost, pitch error and latency-to-lock for each window/hop/picker combination.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--windows", default="2048,4096", help="comma separated window sizes (samples)")
+        parser.add_argument("--hops", default="120,240,480", help="comma separated hop sizes (samples)")
+        parser.add_argument("--pickers", default=",".join(pitch.PICKERS),
+                            help=f"comma separated lag pickers ({', '.join(pitch.PICKERS)})")
+        parser.add_argument("--sample-rate", type=int, default=48000)
+        parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+
+    def handle(self, *args, **options):
+        sample_rate = options["sample_rate"]
+        pickers = [p for p in options["pickers"].split(",") if p]
+        unknown = set(pickers) - set(pitch.PICKERS)
+        if unknown:
+            raise CommandError(f"Unknown picker(s): {', '.join(sorted(unknown))}")
+
+        corpus = build_corpus(sample_rate=sample_rate, seed=options["seed"])
+        seconds = sum(len(tone.samples) for tone in corpus) / sample_rate
+        self.stdout.write(f"{len(corpus)} tones, {seconds:.1f}s of audio at {sample_rate} Hz; "
+                          f"lock = {LOCK_HOPS} hops within {LOCK_CENTS} cents")
+        self.stdout.write(f"{'window':>6} {'hop':>5} {'picker':>6} | {'us/hop':>7} {'worklet MACs':>12} | "
+                          f"{'median c':>8} {'p95 c':>7} {'gross %':>7} | {'lock ms':>7} {'p95 ms':>7} "
+                          f"{'no lock':>7}")
+
+        for window in _int_list(options["windows"]):
+            for hop in _int_list(options["hops"]):
+                for picker in pickers:
+                    self.stdout.write(self.run_config(corpus, sample_rate, window, hop, picker))
+
+    def run_config(self, corpus, sample_rate, window, hop, picker):
+        errors, latencies = [], []
+        hops = 0
+        elapsed = 0.0
+        for tone in corpus:
+            start = time.perf_counter()
+            estimates = pitch.track(tone.samples, sample_rate, window=window, hop=hop, picker=picker)
+            elapsed += time.perf_counter() - start
+            hops += len(estimates)
+            tone_errors, latency = score_tone(tone, estimates, window)
+            errors.append(tone_errors)
+            latencies.append(latency)
+
+        errors = np.abs(np.concatenate(errors))
+        fine = errors[errors <= GROSS_CENTS]
+        locked = np.array([latency for latency in latencies if latency is not None]) * 1000
+        no_lock = latencies.count(None)
+
+        def pct(values, q):
+            return f"{np.percentile(values, q):.1f}" if len(values) else "-"
+
+        return (f"{window:>6} {hop:>5} {picker:>6} | {elapsed / max(hops, 1) * 1e6:>7.1f} "
+                f"{direct_multiply_adds(window, sample_rate) / 1e6:>11.2f}M | "
+                f"{pct(fine, 50):>8} {pct(fine, 95):>7} {100 * (len(errors) - len(fine)) / max(len(errors), 1):>7.1f} | "
+                f"{pct(locked, 50):>7} {pct(locked, 95):>7} {no_lock:>7}")
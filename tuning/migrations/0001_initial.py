@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:58
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntonationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('recording', models.FileField(blank=True, upload_to='tuning/recordings/')),
+                ('sample_rate', models.PositiveIntegerField(blank=True, null=True)),
+                ('a4', models.FloatField(default=440.0)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('voiced_seconds', models.FloatField(blank=True, null=True)),
+                ('cents', models.FloatField(blank=True, null=True)),
+                ('stability', models.FloatField(blank=True, null=True)),
+                ('notes', models.JSONField(blank=True, default=list)),
+                ('histogram', models.JSONField(blank=True, default=dict)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intonation_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'intonation summaries',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -1,3 +1,80 @@
+import logging
+
+from django.contrib.auth import get_user_model
 from django.db import models
+from model_utils.models import TimeStampedModel
+
+from tuning import intonation
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+class AnalysisStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+class IntonationSummary(TimeStampedModel):
+    """The compact result of analysing one uploaded recording (the audio itself is not kept)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='intonation_summaries')
+    status = models.CharField(max_length=10, choices=AnalysisStatus.choices, default=AnalysisStatus.PENDING)
+    # only held while a queued analysis is waiting to run
+    recording = models.FileField(upload_to='tuning/recordings/', blank=True)
+    sample_rate = models.PositiveIntegerField(null=True, blank=True)
+    a4 = models.FloatField(default=intonation.A4_HZ)
+    duration = models.FloatField(null=True, blank=True)
+    voiced_seconds = models.FloatField(null=True, blank=True)
+    cents = models.FloatField(null=True, blank=True)
+    stability = models.FloatField(null=True, blank=True)
+    notes = models.JSONField(default=list, blank=True)
+    histogram = models.JSONField(default=dict, blank=True)
+    error = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name_plural = 'intonation summaries'
+
+    def __str__(self):
+        return f"{self.user} {self.created} ({self.status})"
+
+    def analyse(self, recording: intonation.Recording):
+        """Run the analysis and store the result on this summary (not saved)."""
+        result = intonation.analyse(recording, a4=self.a4)
+        self.sample_rate = recording.sample_rate
+        for field in ('duration', 'voiced_seconds', 'cents', 'stability', 'notes', 'histogram'):
+            setattr(self, field, result[field])
+        self.status = AnalysisStatus.DONE
+        self.error = ''
+
+    def analyse_stored_recording(self):
+        """Analyse the queued upload from disk (memory-mapped), then delete it, whatever happened."""
+        try:
+            self.analyse(intonation.Recording.open(self.recording.path, self.sample_rate))
+        except intonation.RecordingError as e:
+            self.status = AnalysisStatus.FAILED
+            self.error = str(e)[:200]
+        except Exception:
+            # a bug rather than a bad upload, but the summary still mustn't stay pending for ever
+            logger.exception("Analysing recording for intonation summary %s failed", self.id)
+            self.status = AnalysisStatus.FAILED
+            self.error = 'The recording could not be analysed.'
+        finally:
+            self.recording.delete(save=False)
+            self.save()
 
-# Create your models here.
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created': self.created.isoformat(),
+            'a4': self.a4,
+            'duration': self.duration,
+            'voiced_seconds': self.voiced_seconds,
+            'cents': self.cents,
+            'stability': self.stability,
+            'notes': self.notes,
+            'histogram': self.histogram,
+            'error': self.error,
+        }
@@ -0,0 +1,212 @@
+"""
+Reference pitch detector for static/tuning/js/pitch-worklet.js, in NumPy.
+
+It does what the worklet does: 60 Hz one-pole high-pass, an RMS gate, 20% centre clipping,
+the NSDF over lags for 50 Hz-1 kHz, and parabolic interpolation around the chosen lag. The NSDF
+comes from an FFT instead of the worklet's O(N*tau) double loop, and every hop in a chunk is
+analysed in one batch. That makes it fast enough to benchmark window/hop settings offline
+(`manage.py benchmark_pitch`) and to analyse whole recordings on the server.
+
+Two lag pickers are available:
+    "global" - the highest NSDF value in range, which is what the worklet does today
+    "mpm"    - McLeod's key-maximum rule: the first peak within MPM_K of the highest one
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+MIN_HZ = 50
+MAX_HZ = 1000
+HIGHPASS_HZ = 60
+RMS_GATE = 0.005
+CLIP_RATIO = 0.2
+# tuning.html drops estimates below this clarity
+MIN_CLARITY = 0.6
+MPM_K = 0.9
+PICKERS = ("global", "mpm")
+
+# The high-pass recurrence is solved in blocks of this many samples (a**-block stays small)
+_HIGHPASS_BLOCK = 256
+
+
+@dataclass(frozen=True)
+class PitchEstimates:
+    """One row per hop. `time` is the end of the analysis window, in seconds since the stream start."""
+    time: np.ndarray
+    hz: np.ndarray
+    clarity: np.ndarray
+    rms_db: np.ndarray
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def empty(cls):
+        return cls(*(np.empty(0) for _ in range(4)))
+
+    @classmethod
+    def concatenate(cls, parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(p, f) for p in parts]) for f in ("time", "hz", "clarity", "rms_db")))
+
+    def voiced(self):
+        """Mask of hops the tuning page would plot."""
+        return (self.hz > 0) & (self.clarity >= MIN_CLARITY)
+
+
+def highpass_coefficient(sample_rate: float) -> float:
+    rc = 1 / (2 * np.pi * HIGHPASS_HZ)
+    dt = 1 / sample_rate
+    return rc / (rc + dt)
+
+
+def highpass(x: np.ndarray, alpha: float, state=(0.0, 0.0)):
+    """y[n] = alpha * (y[n-1] + x[n] - x[n-1]), vectorised; returns (y, (last_x, last_y)) for streaming."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.empty_like(x)
+    last_x, last_y = state
+    powers = alpha ** np.arange(1, _HIGHPASS_BLOCK + 1)
+    for start in range(0, len(x), _HIGHPASS_BLOCK):
+        block = x[start:start + _HIGHPASS_BLOCK]
+        p = powers[:len(block)]
+        d = np.diff(block, prepend=last_x)
+        # y[n] = alpha**(n+1) * (y[-1] + sum_{k<=n} alpha**-k * d[k])
+        y_block = p * (last_y + np.cumsum(d * (alpha / p)))
+        y[start:start + len(block)] = y_block
+        last_x, last_y = block[-1], y_block[-1]
+    return y, (last_x, last_y)
+
+
+def lag_range(sample_rate: float) -> tuple[int, int]:
+    return int(sample_rate // MAX_HZ), int(sample_rate // MIN_HZ)
+
+
+def nsdf(frames: np.ndarray, tau_max: int) -> np.ndarray:
+    """Normalised square difference function of each row of `frames`, for lags 0..tau_max.
+
+    nsdf[tau] = 2 * sum(x[i] x[i+tau]) / sum(x[i]^2 + x[i+tau]^2), the same quantity the worklet
+    computes directly.
+    """
+    frames = np.atleast_2d(frames)
+    n = frames.shape[1]
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    spectrum = np.fft.rfft(frames, size, axis=1)
+    acf = np.fft.irfft(spectrum * spectrum.conj(), size, axis=1)[:, :tau_max + 1]
+
+    energy = np.concatenate([np.zeros((len(frames), 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+    tau = np.arange(tau_max + 1)
+    m = energy[:, n - tau] + (energy[:, [n]] - energy[:, tau])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(m > 0, 2 * acf / m, 0.0)
+
+
+def _centre_clip(frames: np.ndarray) -> np.ndarray:
+    threshold = np.abs(frames).max(axis=1, keepdims=True) * CLIP_RATIO
+    return np.where(np.abs(frames) >= threshold, frames, 0.0)
+
+
+def _pick_global(values: np.ndarray, tau_min: int) -> np.ndarray:
+    return tau_min + np.argmax(values[:, tau_min:], axis=1)
+
+
+def _pick_mpm(values: np.ndarray, tau_min: int) -> np.ndarray:
+    picked = _pick_global(values, tau_min)
+    for row, curve in enumerate(values):
+        # key maxima: the highest point between each positive-going and negative-going zero crossing
+        positive = curve[tau_min:] > 0
+        edges = np.flatnonzero(np.diff(positive.astype(np.int8))) + 1
+        if positive[0]:
+            edges = np.concatenate([[0], edges])
+        if positive[-1]:
+            edges = np.concatenate([edges, [len(positive)]])
+        starts, ends = edges[0::2] + tau_min, edges[1::2] + tau_min
+        peaks = [start + int(np.argmax(curve[start:end])) for start, end in zip(starts, ends) if end > start]
+        if not peaks:
+            continue
+        threshold = MPM_K * max(curve[p] for p in peaks)
+        picked[row] = next(p for p in peaks if curve[p] >= threshold)
+    return picked
+
+
+def estimate(frames: np.ndarray, sample_rate: float, picker: str = "global"):
+    """(hz, clarity) for each row of `frames` (already high-passed); 0 Hz where there is no pitch."""
+    tau_min, tau_max = lag_range(sample_rate)
+    values = nsdf(_centre_clip(frames), tau_max)
+    tau = (_pick_mpm if picker == "mpm" else _pick_global)(values, tau_min)
+
+    rows = np.arange(len(values))
+    clarity = np.maximum(0.0, values[rows, tau])
+    # parabolic interpolation, skipped at the edge of the lag range as in the worklet
+    inner = (tau > 0) & (tau < tau_max)
+    y1 = values[rows, np.maximum(tau - 1, 0)]
+    y2 = values[rows, tau]
+    y3 = values[rows, np.minimum(tau + 1, tau_max)]
+    denom = 2 * (2 * y2 - y1 - y3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where(inner & (denom != 0), (y3 - y1) / denom, 0.0)
+    tau = tau + delta
+    hz = np.where(tau > 0, sample_rate / tau, 0.0)
+    return hz, clarity
+
+
+class PitchTracker:
+    """Streaming tracker: feed it chunks of any length and get an estimate every `hop` samples.
+
+    Equivalent to PitchProcessor.process() in the worklet, except that the hops in a chunk are
+    analysed together.
+    """
+
+    def __init__(self, sample_rate: float, window: int = 4096, hop: int = 240, picker: str = "global"):
+        if picker not in PICKERS:
+            raise ValueError(f"picker must be one of {PICKERS}")
+        self.sample_rate = sample_rate
+        self.window = window
+        self.hop = hop
+        self.picker = picker
+        self._alpha = highpass_coefficient(sample_rate)
+        self._hp_state = (0.0, 0.0)
+        # the worklet starts with a zeroed buffer, so early windows include silence
+        self._history = np.zeros(window)
+        self._samples_seen = 0
+
+    def feed(self, samples) -> PitchEstimates:
+        filtered, self._hp_state = highpass(samples, self._alpha, self._hp_state)
+        stream = np.concatenate([self._history, filtered])
+        start = self._samples_seen
+        self._samples_seen += len(filtered)
+        self._history = stream[-self.window:]
+
+        # hops end after samples hop, 2*hop, ... (1-based frame counter, as in the worklet)
+        first = -(-(start + 1) // self.hop) * self.hop
+        ends = np.arange(first, self._samples_seen + 1, self.hop)
+        if not len(ends):
+            return PitchEstimates.empty()
+
+        # `stream` starts `window` samples before `start`, so the window ending at e begins at e - start
+        frames = np.lib.stride_tricks.sliding_window_view(stream, self.window)[ends - start]
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        hz = np.zeros(len(frames))
+        clarity = np.zeros(len(frames))
+        loud = rms > RMS_GATE
+        if loud.any():
+            hz[loud], clarity[loud] = estimate(frames[loud], self.sample_rate, self.picker)
+        return PitchEstimates(
+            time=ends / self.sample_rate,
+            hz=hz,
+            clarity=clarity,
+            rms_db=20 * np.log10(np.maximum(rms, 1e-9)),
+        )
+
+
+def track(samples, sample_rate: float, window: int = 4096, hop: int = 240, picker: str = "global",
+          chunk: int = 1 << 16) -> PitchEstimates:
+    """Run a PitchTracker over a whole signal, `chunk` samples at a time."""
+    tracker = PitchTracker(sample_rate, window, hop, picker)
+    return PitchEstimates.concatenate(tracker.feed(samples[i:i + chunk]) for i in range(0, len(samples), chunk))
+
+
+def cents(hz, reference_hz):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 1200 * np.log2(np.asarray(hz) / np.asarray(reference_hz))
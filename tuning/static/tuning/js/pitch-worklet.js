@@ -75,7 +75,7 @@ class PitchProcessor extends AudioWorkletProcessor {
     if (tau>0 && tau<tauMax) {
       const y1 = nsdf[tau-1], y2 = nsdf[tau], y3 = nsdf[tau+1];
       const denom = (2*(2*y2 - y1 - y3));
-      if (denom !== 0) { const delta = (y1 - y3)/denom; tau = tau + delta; }
+      if (denom !== 0) { const delta = (y3 - y1)/denom; tau = tau + delta; }
     }
     const clarity = Math.max(0, maxVal);
     const freq = tau>0 ? fs / tau : 0;
@@ -0,0 +1,11 @@
+from huey.contrib.djhuey import db_task
+
+from tuning.models import AnalysisStatus, IntonationSummary
+
+
+@db_task()
+def analyse_recording(summary_id: int):
+    summary = IntonationSummary.objects.filter(id=summary_id, status=AnalysisStatus.PENDING).first()
+    if summary is None:
+        return
+    summary.analyse_stored_recording()
@@ -1,3 +1,237 @@
-from django.test import TestCase
+import struct
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from huey.contrib.djhuey import HUEY
+
+from notes.factories import UserFactory
+from tuning import intonation, pitch
+from tuning.corpus import brass_tone, build_corpus
+from tuning.models import IntonationSummary
+
+
+class TestPitchReference(TestCase):
+    sample_rate = 48000
+
+    def test_nsdf_matches_direct_loop(self):
+        rng = np.random.default_rng(1)
+        frame = rng.standard_normal(512)
+        tau_max = 200
+        expected = []
+        for tau in range(tau_max + 1):
+            acf = np.sum(frame[:512 - tau] * frame[tau:])
+            m = np.sum(frame[:512 - tau] ** 2) + np.sum(frame[tau:] ** 2)
+            expected.append(2 * acf / m)
+        np.testing.assert_allclose(pitch.nsdf(frame, tau_max)[0], expected, atol=1e-9)
+
+    def test_highpass_matches_recurrence(self):
+        x = np.random.default_rng(2).standard_normal(1000)
+        alpha = pitch.highpass_coefficient(self.sample_rate)
+        expected = np.empty_like(x)
+        last_x = last_y = 0.0
+        for i, v in enumerate(x):
+            last_y = alpha * (last_y + v - last_x)
+            last_x = v
+            expected[i] = last_y
+        np.testing.assert_allclose(pitch.highpass(x, alpha)[0], expected, atol=1e-9)
+
+    def test_clean_tone(self):
+        tone = brass_tone(58, self.sample_rate, noise_db=-80)  # Bb3, 233 Hz
+        estimates = pitch.track(tone.samples, self.sample_rate, picker="mpm")
+        settled = estimates.voiced() & (estimates.time * self.sample_rate - 4096 > tone.onset)
+        errors = pitch.cents(estimates.hz[settled], 233.08)
+        self.assertGreater(settled.sum(), 50)
+        self.assertLess(np.median(np.abs(errors)), 5)
+
+    def test_silence_is_unvoiced(self):
+        estimates = pitch.track(np.zeros(self.sample_rate // 2), self.sample_rate)
+        self.assertFalse(estimates.voiced().any())
+
+    def test_chunking_does_not_change_estimates(self):
+        samples = brass_tone(70, self.sample_rate, vibrato_cents=20, noise_db=-40).samples
+        whole = pitch.track(samples, self.sample_rate, chunk=len(samples))
+        chunked = pitch.track(samples, self.sample_rate, chunk=1000)
+        np.testing.assert_allclose(chunked.time, whole.time)
+        np.testing.assert_allclose(chunked.hz, whole.hz, atol=1e-6)
+
+    def test_unknown_picker(self):
+        with self.assertRaises(ValueError):
+            pitch.PitchTracker(self.sample_rate, picker="nope")
+
+
+class TestCorpus(TestCase):
+    def test_deterministic(self):
+        a = build_corpus(seed=3, notes=(60,), conditions=((15, -40),))
+        b = build_corpus(seed=3, notes=(60,), conditions=((15, -40),))
+        np.testing.assert_array_equal(a[0].samples, b[0].samples)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_pitch", windows="2048", hops="480", pickers="mpm", stdout=out)
+        self.assertIn("2048   480    mpm", out.getvalue())
+
+
+def _wav_bytes(samples, sample_rate=48000, sampwidth=2, channels=1):
+    import io
+    import wave
+
+    pcm = np.clip(samples, -1, 1 - 1 / 32768)
+    if sampwidth == 2:
+        frames = (pcm * 32768).astype('<i2').tobytes()
+    else:  # 24-bit
+        ints = (pcm * 2 ** 23).astype('<i4')
+        frames = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    if channels == 2:
+        step = sampwidth
+        frames = b''.join(frames[i:i + step] * 2 for i in range(0, len(frames), step))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(sample_rate)
+        w.writeframes(frames)
+    return buffer.getvalue()
+
+
+def _with_chunk_first(wav, chunk_id=b'LIST', size=10000):
+    """`wav` with a metadata chunk of `size` bytes inserted before its fmt chunk."""
+    chunk = struct.pack('<4sI', chunk_id, size) + bytes(size + (size & 1))
+    return b'RIFF' + struct.pack('<I', len(wav) - 8 + len(chunk)) + wav[8:12] + chunk + wav[12:]
+
+
+def _sharp_tone(midi=58, cents_sharp=20.0, sample_rate=48000):
+    tone = brass_tone(midi + cents_sharp / 100, sample_rate, noise_db=-80)
+    return tone.samples
+
+
+class TestIntonation(TestCase):
+    def test_reads_wav_formats(self):
+        samples = _sharp_tone()
+        for sampwidth, channels in ((2, 1), (3, 1), (2, 2)):
+            recording = intonation.Recording.open(_wav_bytes(samples, sampwidth=sampwidth, channels=channels))
+            self.assertEqual((recording.sample_rate, recording.channels), (48000, channels))
+            decoded = np.concatenate(list(recording.chunks(10000)))
+            np.testing.assert_allclose(decoded, samples, atol=1e-3)
+
+    def test_memory_mapped_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.wav') as f:
+            f.write(_wav_bytes(_sharp_tone()))
+            f.flush()
+            recording = intonation.Recording.open(f.name)
+            self.assertIsInstance(recording.data, np.memmap)
+            result = intonation.analyse(recording)
+        self.assertEqual([note['note'] for note in result['notes']], ['A#/3'])
+        self.assertAlmostEqual(result['notes'][0]['cents'], 20, delta=3)
+        self.assertLess(result['notes'][0]['stability'], 5)
+        self.assertEqual(sum(result['histogram']['counts']), round(result['voiced_seconds'] / 0.005))
+
+    def test_large_chunks_before_the_audio(self):
+        wav = _wav_bytes(_sharp_tone())
+        # a big LIST chunk, and one that leaves fmt straddling the first 4 KiB
+        for size in (100_000, 4096 - 12 - 8 - 10):
+            with self.subTest(size=size):
+                padded = _with_chunk_first(wav, size=size)
+                self.assertEqual(intonation.Recording.open(padded).frames, intonation.Recording.open(wav).frames)
+                with tempfile.NamedTemporaryFile(suffix='.wav') as f:
+                    f.write(padded)
+                    f.flush()
+                    np.testing.assert_array_equal(intonation.Recording.open(f.name).data,
+                                                  intonation.Recording.open(wav).data)
+
+    def test_truncated_fmt_chunk(self):
+        wav = _wav_bytes(_sharp_tone())
+        with self.assertRaisesMessage(intonation.RecordingError, 'corrupt'):
+            intonation.Recording.open(wav[:12] + struct.pack('<4sI', b'fmt ', 16) + wav[20:28])
+
+    def test_raw_pcm_needs_sample_rate(self):
+        pcm = (_sharp_tone() * 32767).astype('<i2').tobytes()
+        with self.assertRaises(intonation.RecordingError):
+            intonation.Recording.open(pcm)
+        self.assertEqual(intonation.Recording.open(pcm, 48000).frames, len(pcm) // 2)
+
+    def test_sample_rate_must_be_sane(self):
+        pcm = (_sharp_tone() * 32767).astype('<i2').tobytes()
+        for sample_rate in (-1, 100, 2_000_000):
+            with self.assertRaises(intonation.RecordingError):
+                intonation.Recording.open(pcm, sample_rate)
+            with self.assertRaises(intonation.RecordingError):
+                intonation.Recording.open(_wav_bytes(_sharp_tone(), sample_rate=max(sample_rate, 1)))
+
+    def test_a4_reference(self):
+        # 20 cents sharp of A=440 is 20 cents flat of A=~445
+        recording = intonation.Recording.open(_wav_bytes(_sharp_tone()))
+        result = intonation.analyse(recording, a4=440 * 2 ** (40 / 1200))
+        self.assertAlmostEqual(result['cents'], -20, delta=3)
+
+
+@override_settings(MEDIA_ROOT=tempfile.gettempdir())
+class TestAnalyseRecordingView(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+        self.url = reverse('analyse-recording')
+
+    def _upload(self, **data):
+        recording = SimpleUploadedFile('take.wav', _wav_bytes(_sharp_tone()), content_type='audio/wav')
+        return self.client.post(self.url, {'recording': recording, **data})
+
+    def test_short_recording_is_analysed_inline(self):
+        response = self._upload()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['notes'][0]['note'], 'A#/3')
+        self.assertEqual(IntonationSummary.objects.get().user, self.user)
+
+    def test_bad_uploads(self):
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        bogus = SimpleUploadedFile('take.wav', b'not audio at all')
+        self.assertEqual(self.client.post(self.url, {'recording': bogus}).status_code, 400)
+        self.assertEqual(self._upload(a4='1000').status_code, 400)
+        # raw PCM claiming 2MHz would otherwise look 40x shorter than it is
+        pcm = SimpleUploadedFile('take.raw', (_sharp_tone() * 32767).astype('<i2').tobytes())
+        response = self.client.post(self.url, {'recording': pcm, 'sample_rate': '2000000'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Sample rate', response.json()['error'])
+        # and so would a WAV header claiming it
+        wav = SimpleUploadedFile('take.wav', _wav_bytes(_sharp_tone(), sample_rate=2_000_000))
+        self.assertEqual(self.client.post(self.url, {'recording': wav}).status_code, 400)
+        self.assertFalse(IntonationSummary.objects.exists())
+
+    def test_long_recording_is_queued(self):
+        HUEY.immediate = True
+        self.addCleanup(setattr, HUEY, 'immediate', False)
+        with patch('tuning.views.INLINE_MAX_SECONDS', 0.5), self.captureOnCommitCallbacks(execute=True):
+            response = self._upload()
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()['status'], 'pending')
+        summary = IntonationSummary.objects.get()
+        self.assertEqual(summary.status, 'done')
+        self.assertFalse(summary.recording)
+        data = self.client.get(response.json()['url']).json()
+        self.assertAlmostEqual(data['cents'], 20, delta=3)
+        self.assertEqual(len(self.client.get(reverse('intonation-summaries')).json()['summaries']), 1)
+
+    def test_unexpected_errors_fail_the_summary(self):
+        summary = IntonationSummary.objects.create(
+            user=self.user, recording=SimpleUploadedFile('take.wav', _wav_bytes(_sharp_tone())))
+        path = summary.recording.path
+        with patch.object(intonation, 'analyse', side_effect=FloatingPointError('overflow')), \
+                self.assertLogs('tuning.models', 'ERROR'):
+            summary.analyse_stored_recording()
+        summary.refresh_from_db()
+        self.assertEqual(summary.status, 'failed')
+        self.assertFalse(summary.recording)
+        self.assertFalse(Path(path).exists())
+
+    def test_other_users_summaries_are_hidden(self):
+        summary = IntonationSummary.objects.create(user=UserFactory())
+        response = self.client.get(reverse('intonation-summary', args=[summary.id]))
+        self.assertEqual(response.status_code, 404)
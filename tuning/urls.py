@@ -7,6 +7,9 @@ from . import views
 urlpatterns = [
     # Test JS URL
     path('tuning/', views.tuning, name='tuning'),
+    path('tuning/analyse/', views.analyse_recording_view, name='analyse-recording'),
+    path('tuning/analyses/', views.intonation_summaries_view, name='intonation-summaries'),
+    path('tuning/analyses/<int:summary_id>/', views.intonation_summary_view, name='intonation-summary'),
 
 
 
@@ -1,6 +1,80 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from notes.serialisation import FastJsonResponse
+from tuning import intonation
+from tuning.models import AnalysisStatus, IntonationSummary
+from tuning.tasks import analyse_recording
+
+# Recordings up to this long are analysed in the request; longer ones go to the task queue
+INLINE_MAX_SECONDS = 30
+MAX_RECORDING_SECONDS = 2 * 60 * 60
+
 
 # Create your views here.
 def tuning(request):
     context = {}
     return render(request, template_name='tuning/tuning.html', context=context)
+
+
+def _bad_request(error):
+    return FastJsonResponse({'success': False, 'error': error}, status=400)
+
+
+@login_required
+@require_POST
+def analyse_recording_view(request):
+    """POST a WAV (or raw s16le PCM plus `sample_rate`) as `recording`; optional `a4` reference in Hz."""
+    upload = request.FILES.get('recording')
+    if upload is None:
+        return _bad_request('No recording uploaded.')
+    try:
+        a4 = float(request.POST.get('a4') or intonation.A4_HZ)
+        sample_rate = int(request.POST.get('sample_rate') or 0)
+    except ValueError:
+        return _bad_request('a4 and sample_rate must be numbers.')
+    if not intonation.MIN_A4 <= a4 <= intonation.MAX_A4:
+        return _bad_request(f'a4 must be between {intonation.MIN_A4:g} and {intonation.MAX_A4:g} Hz.')
+    try:
+        if sample_rate:
+            intonation.check_sample_rate(sample_rate)
+    except intonation.RecordingError as e:
+        return _bad_request(str(e))
+
+    # big uploads are already on disk and get memory-mapped; small ones are read from memory
+    source = upload.temporary_file_path() if hasattr(upload, 'temporary_file_path') else upload.read()
+    try:
+        recording = intonation.Recording.open(source, sample_rate)
+    except intonation.RecordingError as e:
+        return _bad_request(str(e))
+    if recording.seconds > MAX_RECORDING_SECONDS:
+        return _bad_request('Recording is too long.')
+
+    summary = IntonationSummary(user=request.user, a4=a4, sample_rate=sample_rate or None)
+    if recording.seconds <= INLINE_MAX_SECONDS:
+        summary.analyse(recording)
+        summary.save()
+        return FastJsonResponse(summary.as_dict())
+
+    upload.seek(0)
+    summary.recording = upload
+    summary.save()
+    transaction.on_commit(lambda: analyse_recording(summary.id))
+    data = summary.as_dict()
+    data['url'] = reverse('intonation-summary', args=[summary.id])
+    return FastJsonResponse(data, status=202)
+
+
+@login_required
+def intonation_summary_view(request, summary_id: int):
+    summary = get_object_or_404(IntonationSummary, id=summary_id, user=request.user)
+    return FastJsonResponse(summary.as_dict())
+
+
+@login_required
+def intonation_summaries_view(request):
+    summaries = IntonationSummary.objects.filter(user=request.user, status=AnalysisStatus.DONE)[:50]
+    return FastJsonResponse({'summaries': [summary.as_dict() for summary in summaries]})